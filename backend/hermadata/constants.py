@@ -168,6 +168,35 @@ class ApiErrorCode(Enum):
     existing_chip_code = "ECC"
 
 
+class SearchTotalMode(str, Enum):
+    # no count: for infinite scroll clients
+    off = "off"
+    # counted in the same statement as the page
+    exact = "exact"
+    # cached for a while when the query has no free text filters
+    estimated = "estimated"
+
+
+class ReportJobStatus(str, Enum):
+    pending = "P"
+    running = "R"
+    done = "D"
+    failed = "F"
+
+
+class DocumentTaskKind(str, Enum):
+    entry_report = "E"
+    adoption_report = "A"
+    temporary_adoption_report = "T"
+    variation_report = "V"
+
+
+class DocumentTaskStatus(str, Enum):
+    pending = "P"
+    done = "D"
+    failed = "F"
+
+
 class DocKindCode(Enum):
     comunicazione_ingresso = "CI"
     documento_ingresso = "IN"
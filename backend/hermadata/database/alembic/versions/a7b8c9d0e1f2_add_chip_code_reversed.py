@@ -0,0 +1,45 @@
+"""add animal.chip_code_reversed for chip code suffix search
+
+Revision ID: a7b8c9d0e1f2
+Revises: e3f4a5b6c7d8
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, None] = "e3f4a5b6c7d8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a stored generated column: MySQL fills it for the existing rows
+    # and keeps it in sync with chip_code
+    op.add_column(
+        "animal",
+        sa.Column(
+            "chip_code_reversed",
+            sa.String(length=100),
+            sa.Computed(
+                "reverse(replace(chip_code, '.', ''))", persisted=True
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        op.f("ix_animal_chip_code_reversed"),
+        "animal",
+        ["chip_code_reversed"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_animal_chip_code_reversed"), table_name="animal")
+    op.drop_column("animal", "chip_code_reversed")
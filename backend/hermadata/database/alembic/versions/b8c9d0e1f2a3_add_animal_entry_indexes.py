@@ -0,0 +1,53 @@
+"""add composite indexes for the animal and animal_entry hot queries
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    (
+        "ix_animal_deleted_at_created_at",
+        "animal",
+        ["deleted_at", "created_at"],
+    ),
+    (
+        "ix_animal_entry_animal_id_current",
+        "animal_entry",
+        ["animal_id", "current"],
+    ),
+    (
+        "ix_animal_entry_origin_city_code_entry_date",
+        "animal_entry",
+        ["origin_city_code", "entry_date"],
+    ),
+    (
+        "ix_animal_entry_origin_city_code_exit_date",
+        "animal_entry",
+        ["origin_city_code", "exit_date"],
+    ),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    # MySQL dropped the implicit index of the animal_id foreign key, now
+    # covered by ix_animal_entry_animal_id_current: put it back first
+    op.create_index("animal_id", "animal_entry", ["animal_id"], unique=False)
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
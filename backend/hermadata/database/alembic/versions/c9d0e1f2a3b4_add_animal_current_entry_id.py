@@ -0,0 +1,46 @@
+"""add animal current_entry_id
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c9d0e1f2a3b4"
+down_revision: Union[str, None] = "b8c9d0e1f2a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "animal",
+        sa.Column("current_entry_id", sa.Integer(), nullable=True),
+    )
+    op.create_foreign_key(
+        "fk_animal_current_entry",
+        "animal",
+        "animal_entry",
+        ["current_entry_id"],
+        ["id"],
+    )
+    op.execute(
+        """
+        UPDATE animal SET current_entry_id = (
+            SELECT MAX(animal_entry.id) FROM animal_entry
+            WHERE animal_entry.animal_id = animal.id
+            AND animal_entry.current = 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("fk_animal_current_entry", "animal", type_="foreignkey")
+    op.drop_column("animal", "current_entry_id")
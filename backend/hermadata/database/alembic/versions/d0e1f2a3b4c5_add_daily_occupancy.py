@@ -0,0 +1,73 @@
+"""add daily_occupancy
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d0e1f2a3b4c5"
+down_revision: Union[str, None] = "c9d0e1f2a3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIGITS = " UNION ALL ".join(f"SELECT {d} AS d" for d in range(10))
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_occupancy",
+        sa.Column("city_code", sa.String(length=4), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("animal_id", sa.Integer(), nullable=False),
+        sa.Column("animal_entry_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["animal_id"], ["animal.id"]),
+        sa.ForeignKeyConstraint(["animal_entry_id"], ["animal_entry.id"]),
+        sa.PrimaryKeyConstraint("city_code", "day", "animal_id"),
+    )
+    op.create_index(
+        op.f("ix_daily_occupancy_animal_entry_id"),
+        "daily_occupancy",
+        ["animal_entry_id"],
+        unique=False,
+    )
+    # one row for each day of the closed entries, from the day after the
+    # entry to the exit; the digits give up to 100000 days per entry.
+    # A day of overlapping entries belongs to the one with the lowest id
+    op.execute(
+        f"""
+        INSERT IGNORE INTO daily_occupancy
+            (city_code, day, animal_id, animal_entry_id)
+        SELECT
+            e.origin_city_code,
+            e.entry_date + INTERVAL n.n DAY,
+            e.animal_id,
+            e.id
+        FROM animal_entry e
+        JOIN (
+            SELECT d0.d + 10 * d1.d + 100 * d2.d + 1000 * d3.d
+                + 10000 * d4.d AS n
+            FROM ({DIGITS}) d0
+            CROSS JOIN ({DIGITS}) d1
+            CROSS JOIN ({DIGITS}) d2
+            CROSS JOIN ({DIGITS}) d3
+            CROSS JOIN ({DIGITS}) d4
+        ) n ON n.n BETWEEN 1 AND DATEDIFF(e.exit_date, e.entry_date)
+        WHERE e.entry_date IS NOT NULL AND e.exit_date IS NOT NULL
+        ORDER BY e.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_daily_occupancy_animal_entry_id"),
+        table_name="daily_occupancy",
+    )
+    op.drop_table("daily_occupancy")
@@ -4,9 +4,11 @@ from sqlalchemy import (
     DECIMAL,
     JSON,
     Boolean,
+    Computed,
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -20,8 +22,10 @@ from hermadata.constants import (
     AnimalFur,
     AnimalSize,
     AnimalStage,
+    DocumentTaskStatus,
     EntryType,
     ExitType,
+    ReportJobStatus,
     StructureType,
 )
 
@@ -63,6 +67,13 @@ class Animal(Base):
     chip_code: Mapped[str] = mapped_column(
         String(100), nullable=True, unique=True
     )
+    # digits of the chip code reversed: operators search by the last
+    # digits, which become an indexable prefix
+    chip_code_reversed: Mapped[str | None] = mapped_column(
+        String(100),
+        Computed("reverse(replace(chip_code, '.', ''))", persisted=True),
+        index=True,
+    )
     chip_code_set: Mapped[bool] = mapped_column(
         server_default=expression.false(), default=False
     )
@@ -101,18 +112,39 @@ class Animal(Base):
         ForeignKey("structure.id"), nullable=False
     )
 
+    # denormalized pointer to the entry with `current` set, so that the
+    # current entry is joined by primary key
+    current_entry_id: Mapped[int | None] = mapped_column(
+        ForeignKey(
+            "animal_entry.id", use_alter=True, name="fk_animal_current_entry"
+        ),
+        nullable=True,
+    )
+
     entries: Mapped[list["AnimalEntry"]] = relationship(
-        back_populates="animal"
+        back_populates="animal", foreign_keys="AnimalEntry.animal_id"
+    )
+    # the animal and its first entry reference each other:
+    # the pointer is set by an UPDATE after both are inserted
+    current_entry: Mapped["AnimalEntry | None"] = relationship(
+        foreign_keys=[current_entry_id], post_update=True
     )
     adoptions: Mapped[list["Adoption"]] = relationship(back_populates="animal")
     logs: Mapped[list["AnimalLog"]] = relationship(back_populates="animal")
 
+    __table_args__ = (
+        # search: not deleted animals, newest first
+        Index("ix_animal_deleted_at_created_at", "deleted_at", "created_at"),
+    )
+
 
 class AnimalEntry(Base):
     __tablename__ = "animal_entry"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    animal: Mapped[Animal] = relationship(back_populates="entries")
+    animal: Mapped[Animal] = relationship(
+        back_populates="entries", foreign_keys="AnimalEntry.animal_id"
+    )
 
     animal_id: Mapped[int] = mapped_column(ForeignKey("animal.id"))
 
@@ -140,6 +172,51 @@ class AnimalEntry(Base):
 
     current: Mapped[bool] = mapped_column(server_default=expression.true())
 
+    __table_args__ = (
+        # join of an animal with its current entry
+        Index("ix_animal_entry_animal_id_current", "animal_id", "current"),
+        # reports by city and date range
+        Index(
+            "ix_animal_entry_origin_city_code_entry_date",
+            "origin_city_code",
+            "entry_date",
+        ),
+        Index(
+            "ix_animal_entry_origin_city_code_exit_date",
+            "origin_city_code",
+            "exit_date",
+        ),
+        # animals present on a date, in any city
+        Index("ix_animal_entry_entry_date", "entry_date"),
+        Index("ix_animal_entry_exit_date", "exit_date"),
+    )
+
+
+class DailyOccupancy(Base):
+    """
+    One row for each day an animal spent in the shelter, for the entries
+    which have an exit: the days from the one after the entry date up
+    to the exit date. Maintained by the animal repository and rebuilt by
+    the `rebuild-daily-occupancy` command.
+    """
+
+    __tablename__ = "daily_occupancy"
+
+    # city first: reports sum the days of a city in a date range
+    city_code: Mapped[str] = mapped_column(String(4), primary_key=True)
+    day: Mapped[date] = mapped_column(Date(), primary_key=True)
+    animal_id: Mapped[int] = mapped_column(
+        ForeignKey("animal.id"), primary_key=True
+    )
+    animal_entry_id: Mapped[int] = mapped_column(
+        ForeignKey("animal_entry.id"), index=True
+    )
+
+    __table_args__ = (
+        # animals present on a date, in any city
+        Index("ix_daily_occupancy_day", "day"),
+    )
+
 
 class FurColor(Base):
     __tablename__ = "fur_color"
@@ -447,6 +524,85 @@ class Document(Base):
     )
 
 
+class ReportJob(Base):
+    """report generated in background, stored like the documents"""
+
+    __tablename__ = "report_job"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20))
+    format: Mapped[str] = mapped_column(String(20))
+    query: Mapped[dict] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(
+        String(1), default=ReportJobStatus.pending.value
+    )
+    # hash of kind, format and query while the job is pending or running,
+    # so that identical requests share the same job
+    active_key: Mapped[str | None] = mapped_column(
+        String(64), unique=True, nullable=True
+    )
+
+    storage_service: Mapped[str | None] = mapped_column(
+        String(2), nullable=True
+    )
+    key: Mapped[str | None] = mapped_column(String(40), nullable=True)
+    filename: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    created_by: Mapped[int | None] = mapped_column(
+        ForeignKey("users.id"), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(), server_default=func.now()
+    )
+    started_at: Mapped[datetime | None] = mapped_column(
+        DateTime(), nullable=True
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(
+        DateTime(), nullable=True
+    )
+
+
+class DocumentTask(Base):
+    """
+    document to generate after the commit of the transaction which
+    created the task (outbox), retried until it succeeds, from the
+    template variables of when it was created
+    """
+
+    __tablename__ = "document_task"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(1))
+    variables: Mapped[dict] = mapped_column(JSON)
+    animal_id: Mapped[int | None] = mapped_column(
+        ForeignKey("animal.id"), nullable=True
+    )
+    animal_entry_id: Mapped[int | None] = mapped_column(
+        ForeignKey("animal_entry.id"), nullable=True
+    )
+    status: Mapped[str] = mapped_column(
+        String(1), default=DocumentTaskStatus.pending.value
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(), server_default=func.now()
+    )
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(), server_default=func.now()
+    )
+    done_at: Mapped[datetime | None] = mapped_column(DateTime(), nullable=True)
+
+    __table_args__ = (
+        # tasks due for a retry
+        Index(
+            "ix_document_task_status_next_attempt_at",
+            "status",
+            "next_attempt_at",
+        ),
+    )
+
+
 class DocumentKind(Base):
     __tablename__ = "document_kind"
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -1,11 +1,23 @@
 import logging
 import os
+from threading import Lock
 from typing import Annotated
 
-from fastapi import Depends
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import Depends, Request
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    select_autoescape,
+)
+from sqlalchemy import Engine, create_engine, event, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, sessionmaker
 
 from hermadata import __version__
 from hermadata.constants import StorageType
@@ -16,12 +28,217 @@ from hermadata.storage.s3_storage import S3Storage
 logger = logging.getLogger(__name__)
 
 
-def get_session_maker():
-    engine = create_engine(**settings.db.model_dump())
+_engine: Engine | None = None
+_session_maker: sessionmaker | None = None
+_readonly_engine: Engine | None = None
+_readonly_session_maker: sessionmaker | None = None
+_replica_engine: Engine | None = None
+_replica_session_maker: sessionmaker | None = None
+_async_engine: AsyncEngine | None = None
+_async_session_maker: async_sessionmaker | None = None
+_async_replica_engine: AsyncEngine | None = None
+_async_replica_session_maker: async_sessionmaker | None = None
+_engine_lock = Lock()
 
-    SessionMaker = sessionmaker(engine)
+# clients which just wrote something read from the primary database
+# until the cookie expires, or whenever they send the header
+READ_PRIMARY_COOKIE = "hermadata_read_primary"
+READ_PRIMARY_HEADER = "X-Read-Primary"
 
-    return SessionMaker
+
+def create_db_engine(url: str | None = None, **kwargs) -> Engine:
+    """
+    Build an engine whose connection pool is configured from `DBSettings`.
+    Extra keyword arguments are passed to `create_engine`.
+    """
+    options = settings.db.engine_options()
+    options.update(kwargs)
+
+    return create_engine(url or settings.db.url, **options)
+
+
+def create_readonly_db_engine(url: str | None = None) -> Engine:
+    """
+    Build an engine for read-only sessions.
+
+    Connections run in autocommit, so that no transaction is opened and
+    no COMMIT is sent, and are flagged read only once when they're
+    opened, so that the server refuses any write.
+    """
+    engine = create_db_engine(
+        url,
+        isolation_level="AUTOCOMMIT",
+        # no transaction to roll back when a connection is returned
+        pool_reset_on_return=None,
+    )
+
+    event.listen(engine, "connect", _set_read_only)
+
+    return engine
+
+
+def create_async_readonly_db_engine(url: str | None = None) -> AsyncEngine:
+    """
+    Async counterpart of `create_readonly_db_engine`, running on the
+    aiomysql driver whatever the driver of the configured url is.
+    """
+    engine = create_async_engine(
+        make_url(url or settings.db.url).set(drivername="mysql+aiomysql"),
+        isolation_level="AUTOCOMMIT",
+        pool_reset_on_return=None,
+        **settings.db.engine_options(),
+    )
+    event.listen(engine.sync_engine, "connect", _set_read_only)
+
+    return engine
+
+
+def _set_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("SET SESSION TRANSACTION READ ONLY")
+    cursor.close()
+
+
+def init_db() -> Engine:
+    """
+    Create the process-wide engines and session factories,
+    if not done yet.
+
+    Called by the application lifespan on startup; scripts and tests
+    which don't run the lifespan get them lazily on first use.
+    """
+    global _engine, _session_maker, _readonly_engine, _readonly_session_maker
+    global _replica_engine, _replica_session_maker
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_db_engine()
+            _session_maker = sessionmaker(_engine)
+
+            _readonly_engine = create_readonly_db_engine()
+            _readonly_session_maker = sessionmaker(_readonly_engine)
+
+            if settings.db.replica_url:
+                _replica_engine = create_readonly_db_engine(
+                    settings.db.replica_url
+                )
+                _replica_session_maker = sessionmaker(_replica_engine)
+            logger.info(
+                "db engines created (pool_size=%s, max_overflow=%s)",
+                settings.db.pool_size,
+                settings.db.max_overflow,
+            )
+
+    return _engine
+
+
+def dispose_db():
+    """Close every pooled connection and drop the process-wide engines."""
+    global _engine, _session_maker, _readonly_engine, _readonly_session_maker
+    global _replica_engine, _replica_session_maker
+
+    with _engine_lock:
+        for engine in (_engine, _readonly_engine, _replica_engine):
+            if engine is not None:
+                engine.dispose()
+                logger.info("db engine %s disposed", engine.url)
+        _engine = None
+        _session_maker = None
+        _readonly_engine = None
+        _readonly_session_maker = None
+        _replica_engine = None
+        _replica_session_maker = None
+
+
+def init_async_db() -> AsyncEngine:
+    """
+    Create the process-wide async engines and session factories,
+    if not done yet. They are read only, like the sync read-only ones.
+    """
+    global _async_engine, _async_session_maker
+    global _async_replica_engine, _async_replica_session_maker
+
+    with _engine_lock:
+        if _async_engine is None:
+            _async_engine = create_async_readonly_db_engine()
+            _async_session_maker = async_sessionmaker(_async_engine)
+
+            if settings.db.replica_url:
+                _async_replica_engine = create_async_readonly_db_engine(
+                    settings.db.replica_url
+                )
+                _async_replica_session_maker = async_sessionmaker(
+                    _async_replica_engine
+                )
+            logger.info("async db engines created")
+
+    return _async_engine
+
+
+async def dispose_async_db():
+    global _async_engine, _async_session_maker
+    global _async_replica_engine, _async_replica_session_maker
+
+    for engine in (_async_engine, _async_replica_engine):
+        if engine is not None:
+            await engine.dispose()
+            logger.info("async db engine %s disposed", engine.url)
+    _async_engine = None
+    _async_session_maker = None
+    _async_replica_engine = None
+    _async_replica_session_maker = None
+
+
+def get_engine() -> Engine:
+    return _engine or init_db()
+
+
+def get_session_maker() -> sessionmaker:
+    if _session_maker is None:
+        init_db()
+
+    return _session_maker
+
+
+def reads_from_primary(request: Request) -> bool:
+    """
+    Whether the request must read from the primary database:
+    writes always do, as well as reads from clients which just wrote
+    something (read your writes).
+    """
+    return (
+        request.method not in ("GET", "HEAD")
+        or READ_PRIMARY_HEADER in request.headers
+        or READ_PRIMARY_COOKIE in request.cookies
+    )
+
+
+def get_readonly_session_maker(request: Request = None) -> sessionmaker:
+    if _readonly_session_maker is None:
+        init_db()
+
+    if (
+        _replica_session_maker is not None
+        and request is not None
+        and not reads_from_primary(request)
+    ):
+        return _replica_session_maker
+
+    return _readonly_session_maker
+
+
+def get_async_session_maker(request: Request = None) -> async_sessionmaker:
+    if _async_session_maker is None:
+        init_async_db()
+
+    if (
+        _async_replica_session_maker is not None
+        and request is not None
+        and not reads_from_primary(request)
+    ):
+        return _async_replica_session_maker
+
+    return _async_session_maker
 
 
 def get_db_session(
@@ -39,6 +256,79 @@ def get_db_session(
         session.close()
 
 
+def get_readonly_db_session(
+    SessionMaker: Annotated[sessionmaker, Depends(get_readonly_session_maker)],
+):
+    """
+    Session for endpoints which only read data.
+
+    It connects to `settings.db.replica_url` when set, otherwise to the
+    primary database. Nothing is committed: every statement runs in its
+    own read-only autocommit transaction.
+    """
+    session = SessionMaker()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+async def get_async_db_session(
+    SessionMaker: Annotated[
+        async_sessionmaker, Depends(get_async_session_maker)
+    ],
+):
+    """
+    Async read-only session, picked like the one of
+    `get_readonly_db_session`.
+    """
+    session: AsyncSession = SessionMaker()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def get_replica_db_session(
+    request: Request,
+    session: Annotated[Session, Depends(get_db_session)],
+):
+    """
+    Session for the read-only queries of a repository.
+
+    It's a replica session when a replica is configured and the request
+    doesn't need to read from the primary, otherwise it's the request
+    session itself, so that a request always sees its own writes.
+    """
+    if _replica_session_maker is None or reads_from_primary(request):
+        yield session
+        return
+
+    yield from get_readonly_db_session(_replica_session_maker)
+
+
+async def read_primary_after_write(request: Request, call_next):
+    """
+    Middleware which makes clients read from the primary database for a
+    while after a successful write, to hide the replication lag.
+    """
+    response = await call_next(request)
+
+    if (
+        settings.db.replica_url
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            "1",
+            max_age=settings.db.read_primary_after_write_seconds,
+            httponly=True,
+        )
+
+    return response
+
+
 def get_s3_storage():
     s3_storage = S3Storage(settings.storage.s3.bucket)
 
@@ -68,6 +358,10 @@ def get_jinja_env() -> Environment:
     jinja_env = Environment(
         loader=FileSystemLoader(templates_dir),
         autoescape=select_autoescape(),
+        # compiled templates, kept across restarts and shared by processes
+        bytecode_cache=FileSystemBytecodeCache(
+            settings.report.template_cache_dir
+        ),
     )
     jinja_env.globals = {
         "software_name": "Hermadata",
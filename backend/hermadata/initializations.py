@@ -3,18 +3,29 @@ from typing import Annotated
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from hermadata.constants import StorageType
 from hermadata.dependancies import (
+    get_async_db_session,
     get_db_session,
     get_jinja_env,
+    get_readonly_db_session,
+    get_readonly_session_maker,
+    get_replica_db_session,
+    get_session_maker,
     get_storage_map,
 )
+from hermadata.reports.pdf_cache import PDFCache
+from hermadata.reports.render_pool import RenderPool
 from hermadata.reports.report_generator import ReportGenerator
 from hermadata.repositories.adopter_repository import SQLAdopterRepository
 from hermadata.repositories.activity_repository import SQLActivityRepository
 from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
+from hermadata.repositories.animal.async_animal_repository import (
+    SQLAsyncAnimalRepository,
+)
 from hermadata.repositories.breed_repository import SQLBreedRepository
 from hermadata.repositories.city_repository import SQLCityRepository
 from hermadata.repositories.document_repository import SQLDocumentRepository
@@ -24,6 +35,8 @@ from hermadata.repositories.user_repository import SQLUserRepository
 from hermadata.repositories.vet_repository import SQLVetRepository
 from hermadata.services.adopter_service import AdopterService
 from hermadata.services.animal_service import AnimalService
+from hermadata.services.document_outbox import DocumentOutbox
+from hermadata.services.report_job_service import ReportJobService
 from hermadata.services.user_service import TokenData, UserService
 from hermadata.settings import settings
 from hermadata.storage.disk_storage import DiskStorage
@@ -33,10 +46,23 @@ from hermadata.storage.s3_storage import S3Storage
 # Dependency functions for repositories
 def get_animal_repository(
     session: Annotated[Session, Depends(get_db_session)],
+    read_session: Annotated[Session, Depends(get_replica_db_session)],
+) -> SQLAnimalRepository:
+    return SQLAnimalRepository()(session, read_session)
+
+
+def get_readonly_animal_repository(
+    session: Annotated[Session, Depends(get_readonly_db_session)],
 ) -> SQLAnimalRepository:
     return SQLAnimalRepository()(session)
 
 
+def get_async_animal_repository(
+    session: Annotated[AsyncSession, Depends(get_async_db_session)],
+) -> SQLAsyncAnimalRepository:
+    return SQLAsyncAnimalRepository()(session)
+
+
 def get_document_repository(
     session: Annotated[Session, Depends(get_db_session)],
     storage_map: Annotated[dict, Depends(get_storage_map)],
@@ -56,6 +82,16 @@ def get_breed_repository(
 
 def get_city_repository(
     session: Annotated[Session, Depends(get_db_session)],
+    read_session: Annotated[Session, Depends(get_replica_db_session)],
+) -> SQLCityRepository:
+    return SQLCityRepository(
+        preferred_provinces=settings.app.preferred_provinces,
+        preferred_cities=settings.app.preferred_cities,
+    )(session, read_session)
+
+
+def get_readonly_city_repository(
+    session: Annotated[Session, Depends(get_readonly_db_session)],
 ) -> SQLCityRepository:
     return SQLCityRepository(
         preferred_provinces=settings.app.preferred_provinces,
@@ -89,6 +125,13 @@ def get_user_repository(
 
 def get_activity_repository(
     session: Annotated[Session, Depends(get_db_session)],
+    read_session: Annotated[Session, Depends(get_replica_db_session)],
+) -> SQLActivityRepository:
+    return SQLActivityRepository()(session, read_session)
+
+
+def get_readonly_activity_repository(
+    session: Annotated[Session, Depends(get_readonly_db_session)],
 ) -> SQLActivityRepository:
     return SQLActivityRepository()(session)
 
@@ -108,7 +151,29 @@ storage_map = {
     StorageType.aws_s3: s3_storage,
 }
 
-report_generator = ReportGenerator(get_jinja_env())
+render_pool = (
+    RenderPool(
+        settings.report.render_workers,
+        timeout=settings.report.render_timeout_seconds,
+    )
+    if settings.report.render_workers
+    else None
+)
+
+pdf_cache = (
+    PDFCache(
+        storage_map[settings.storage.selected],
+        max_bytes=settings.report.pdf_cache_max_bytes,
+        max_age_seconds=settings.report.pdf_cache_max_age_seconds,
+        sync_seconds=settings.report.pdf_cache_sync_seconds,
+    )
+    if settings.report.pdf_cache_max_bytes
+    else None
+)
+
+report_generator = ReportGenerator(
+    get_jinja_env(), render_pool=render_pool, pdf_cache=pdf_cache
+)
 
 
 def get_animal_service(
@@ -124,9 +189,52 @@ def get_animal_service(
         document_repository=document_repository,
         report_generator=report_generator,
         storage=storage_map[settings.storage.selected],
+        deferred_documents=settings.app.deferred_documents,
+    )
+
+
+def build_animal_service(session: Session) -> AnimalService:
+    """Animal service outside of a request, e.g. in the report jobs"""
+    return AnimalService(
+        animal_repository=SQLAnimalRepository()(session),
+        document_repository=SQLDocumentRepository(
+            session=session,
+            selected_storage=settings.storage.selected,
+            storage=storage_map,
+        ),
+        report_generator=report_generator,
+        storage=storage_map[settings.storage.selected],
     )
 
 
+report_job_service = ReportJobService(
+    session_maker=get_session_maker,
+    read_session_maker=get_readonly_session_maker,
+    animal_service_factory=build_animal_service,
+    storage=storage_map,
+    selected_storage=settings.storage.selected,
+    max_workers=settings.app.report_jobs_max_workers,
+    max_pending=settings.app.report_jobs_max_pending,
+    timeout_seconds=settings.app.report_jobs_timeout_seconds,
+)
+
+
+def get_report_job_service() -> ReportJobService:
+    return report_job_service
+
+
+document_outbox = DocumentOutbox(
+    session_maker=get_session_maker,
+    animal_service_factory=build_animal_service,
+    storage=storage_map,
+    selected_storage=settings.storage.selected,
+    max_workers=settings.app.document_tasks_max_workers,
+    max_attempts=settings.app.document_tasks_max_attempts,
+    retry_seconds=settings.app.document_tasks_retry_seconds,
+    poll_seconds=settings.app.document_tasks_poll_seconds,
+)
+
+
 def get_user_service(
     user_repository: Annotated[
         SQLUserRepository, Depends(get_user_repository)
@@ -1,12 +1,30 @@
 import json
 import logging
 import logging.config
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from hermadata.dependancies import (
+    dispose_async_db,
+    dispose_db,
+    get_readonly_session_maker,
+    init_async_db,
+    init_db,
+    read_primary_after_write,
+)
 from hermadata.error_handlers import api_error_exception_handler
 from hermadata.errors import APIException
+from hermadata.initializations import (
+    document_outbox,
+    pdf_cache,
+    render_pool,
+    report_generator,
+    report_job_service,
+)
+from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
+from hermadata.repositories.animal.suggest_index import animal_suggest_index
 from hermadata.routers import (
     adopter_router,
     animal_router,
@@ -18,6 +36,7 @@ from hermadata.routers import (
     util_router,
     vet_router,
 )
+from hermadata.settings import settings
 
 logging.config.dictConfig(json.load(open("hermadata/log-configs.json")))
 
@@ -38,6 +57,11 @@ def build_app():
         allow_headers=["*"],
         expose_headers=["X-filename"],
     )
+    app.middleware("http")(read_primary_after_write)
+    if settings.db.async_enabled:
+        # must come first, to shadow the sync versions of the same routes
+        app.include_router(animal_router.async_router)
+        app.include_router(util_router.async_router)
     app.include_router(animal_router.router)
     app.include_router(util_router.router)
     app.include_router(race_router.router)
@@ -55,8 +79,31 @@ def build_app():
     return app
 
 
-def lifespan(app: FastAPI):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # a template with errors stops the startup
+    templates = report_generator.load_templates()
+    logger.info("%s report templates compiled", templates)
+    init_db()
+    with get_readonly_session_maker()() as session:
+        animal_suggest_index.load(
+            SQLAnimalRepository()(session).get_suggest_items()
+        )
+    if settings.db.async_enabled:
+        init_async_db()
+    if render_pool is not None:
+        render_pool.start()
+    if pdf_cache is not None:
+        pdf_cache.sync()
+    if settings.app.deferred_documents:
+        document_outbox.start()
     yield
+    document_outbox.stop()
+    report_job_service.shutdown()
+    if render_pool is not None:
+        render_pool.shutdown()
+    dispose_db()
+    await dispose_async_db()
 
 
 app = build_app()
@@ -1,3 +1,6 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
 from typing import Annotated, Generic, Iterable, TypeVar
 
 from pydantic import BaseModel, BeforeValidator, StringConstraints
@@ -5,6 +8,7 @@ from sqlalchemy import or_
 from sqlalchemy.orm import MappedColumn
 
 from hermadata.constants import ApiErrorCode
+from hermadata.errors import InvalidCursorException
 
 T = TypeVar("T")
 
@@ -42,8 +46,33 @@ class SearchQuery(PaginationQuery):
 
 
 class PaginationResult(BaseModel, Generic[T]):
-    total: int
+    # None when the total is not requested
+    total: int | None
     items: list[T] = []
+    # pass it as `after` to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset pagination token made of json-serializable values"""
+    data = json.dumps(
+        [v.isoformat() if isinstance(v, date) else v for v in values]
+    )
+    return urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode a token built by `encode_cursor`. Dates are returned as
+    ISO strings.
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+    except ValueError as e:
+        raise InvalidCursorException() from e
+    if not isinstance(values, list):
+        raise InvalidCursorException()
+    return values
 
 
 class AnimalEventTypeModel(BaseModel):
@@ -0,0 +1,116 @@
+"""
+Vectorized computations over animal entry intervals.
+
+An entry counts the days from the one after its entry date up to its
+exit date included, or up to the end of the period when it has no exit:
+the same rule of the animal days report. All the results of a period
+are computed in one pass over the arrays of the entries, without
+Python loops.
+"""
+
+from datetime import date
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+DAY = np.timedelta64(1, "D")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+NAT = np.datetime64("NaT", "D").astype(np.int64)
+
+
+class IntervalSummary(NamedTuple):
+    # every day of the period and the number of animals present on it
+    days: np.ndarray
+    occupancy: np.ndarray
+    # days spent in the shelter by each animal, in `animal_ids` order
+    animal_ids: np.ndarray
+    animal_days: np.ndarray
+    # first day of each month of the period and its total animal days
+    months: np.ndarray
+    month_days: np.ndarray
+
+    @property
+    def total_days(self) -> int:
+        return int(self.animal_days.sum())
+
+
+def to_day_array(dates: Sequence[date | None] | np.ndarray) -> np.ndarray:
+    """Array of days, None becomes NaT"""
+    if isinstance(dates, np.ndarray):
+        return dates.astype("datetime64[D]")
+    # much faster than letting numpy convert the date objects
+    days = np.fromiter(
+        (NAT if d is None else d.toordinal() - EPOCH_ORDINAL for d in dates),
+        dtype=np.int64,
+        count=len(dates),
+    )
+    return days.view("datetime64[D]")
+
+
+def clip(
+    entry_dates: np.ndarray,
+    exit_dates: np.ndarray,
+    from_date: date,
+    to_date: date,
+) -> tuple[np.ndarray, np.ndarray]:
+    """First and last day of each entry within the period"""
+    start = np.maximum(entry_dates + DAY, np.datetime64(from_date, "D"))
+    period_end = np.datetime64(to_date, "D")
+    end = np.where(
+        np.isnat(exit_dates),
+        period_end,
+        np.minimum(exit_dates, period_end),
+    )
+    return start, end
+
+
+def summarize(
+    animal_ids: Sequence[int] | np.ndarray,
+    entry_dates: Sequence[date] | np.ndarray,
+    exit_dates: Sequence[date | None] | np.ndarray,
+    from_date: date,
+    to_date: date,
+) -> IntervalSummary:
+    """
+    Per-animal days, daily occupancy and monthly days of the entries in
+    the period `from_date` - `to_date`, both included.
+    """
+    animal_ids = np.asarray(animal_ids, dtype=np.int64)
+    start, end = clip(
+        to_day_array(entry_dates), to_day_array(exit_dates), from_date, to_date
+    )
+    entry_days = np.maximum((end - start).astype(np.int64) + 1, 0)
+
+    ids, animal_index = np.unique(animal_ids, return_inverse=True)
+    animal_days = np.bincount(
+        animal_index, weights=entry_days, minlength=len(ids)
+    ).astype(np.int64)
+
+    period_start = np.datetime64(from_date, "D")
+    days = np.arange(period_start, np.datetime64(to_date, "D") + DAY)
+
+    # +1 on the first day of each entry, -1 on the day after the last:
+    # the running sum is the number of entries open on each day
+    counted = entry_days > 0
+    first = (start[counted] - period_start).astype(np.int64)
+    after_last = (end[counted] - period_start).astype(np.int64) + 1
+    changes = np.bincount(first, minlength=len(days) + 1) - np.bincount(
+        after_last, minlength=len(days) + 1
+    )
+    occupancy = np.cumsum(changes[:-1])
+
+    months, month_index = np.unique(
+        days.astype("datetime64[M]"), return_inverse=True
+    )
+    month_days = np.bincount(
+        month_index, weights=occupancy, minlength=len(months)
+    ).astype(np.int64)
+
+    return IntervalSummary(
+        days=days,
+        occupancy=occupancy,
+        animal_ids=ids,
+        animal_days=animal_days,
+        months=months.astype("datetime64[D]"),
+        month_days=month_days,
+    )
@@ -0,0 +1,217 @@
+"""
+Rendered PDFs, by content.
+
+The same template with the same variables gives the same document: on
+re-exits, retried tasks and regenerations after edits which don't
+change the document, `ReportGenerator` serves the PDF rendered the
+first time. Its key hashes the template name, the version of the
+template sources (all the templates, the stylesheets and the Jinja
+globals, since a template can include others) and the variables. The
+variables contain the date of the document, so it's served again on
+the same day only.
+
+The PDFs are kept in a storage, shared by the processes. Each process
+indexes them from the storage listing at startup and every
+`sync_seconds`, so that a miss costs no storage request, and the files
+of the other processes, or of before a restart, count towards
+`max_bytes`. The ones not used for `max_age_seconds` are deleted by the
+sync; the least recently used ones are deleted when the index exceeds
+`max_bytes`. Between two syncs a process doesn't see the files stored by
+the others, which may then exceed `max_bytes` by what they stored.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from jinja2 import Environment
+from pydantic import BaseModel
+
+from hermadata.reports.render_pool import STYLESHEET_PATHS, CacheStats
+from hermadata.storage.base import StorageInterface
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "pdf-cache-"
+
+
+def templates_version(
+    jinja_env: Environment,
+    stylesheet_paths: tuple[str, ...] = STYLESHEET_PATHS,
+) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(jinja_env.list_templates()):
+        source, _, _ = jinja_env.loader.get_source(jinja_env, name)
+        digest.update(name.encode())
+        digest.update(source.encode())
+    for path in stylesheet_paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    digest.update(
+        json.dumps(jinja_env.globals, sort_keys=True, default=str).encode()
+    )
+    return digest.hexdigest()
+
+
+class PDFCache:
+    def __init__(
+        self,
+        storage: StorageInterface,
+        max_bytes: int,
+        max_age_seconds: int = 86400,
+        sync_seconds: int = 300,
+    ):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sync_seconds = sync_seconds
+        # key: size and time of the last use, least recently used first
+        self._index: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._size = 0
+        self._synced_at: float | None = None
+        self._hits = 0
+        self._misses = 0
+        self._lock = Lock()
+
+    def key(self, version: str, template: str, variables: BaseModel) -> str:
+        data = json.dumps(
+            [version, template, variables.model_dump(mode="json")],
+            sort_keys=True,
+        )
+        return KEY_PREFIX + hashlib.sha256(data.encode()).hexdigest() + ".pdf"
+
+    def sync(self):
+        """Index the PDFs in the storage and delete the expired ones"""
+        with self._lock:
+            self._synced_at = time.monotonic()
+        self._sync()
+
+    def _sync_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._synced_at is not None
+                and now - self._synced_at < self.sync_seconds
+            ):
+                return
+            # the other threads don't wait for the listing
+            self._synced_at = now
+        self._sync()
+
+    def _sync(self):
+        started = time.time()
+        try:
+            files = self.storage.list_stored_files(KEY_PREFIX)
+        except Exception:
+            logger.exception("pdf cache: cannot list the storage")
+            return
+
+        with self._lock:
+            # the uses of this process are more recent than the writes
+            last_uses = {key: used for key, (_, used) in self._index.items()}
+            entries = {
+                f.key: (f.size, max(f.modified, last_uses.get(f.key, 0)))
+                for f in files
+            }
+            # stored here while listing
+            for key, (size, used) in self._index.items():
+                if used >= started:
+                    entries.setdefault(key, (size, used))
+
+            self._index = OrderedDict(
+                sorted(entries.items(), key=lambda item: item[1][1])
+            )
+            self._size = sum(size for size, _ in self._index.values())
+
+            expired = [
+                key
+                for key, (_, used) in self._index.items()
+                if used < started - self.max_age_seconds
+            ]
+            for key in expired:
+                self._forget(key)
+            evicted = expired + self._evict()
+        self._delete(evicted)
+
+        logger.info(
+            "pdf cache: %s PDFs, %s bytes, %s deleted",
+            len(self._index),
+            self._size,
+            len(evicted),
+        )
+
+    def get(self, key: str) -> bytes | None:
+        self._sync_if_due()
+        with self._lock:
+            if key not in self._index:
+                self._misses += 1
+                return None
+
+        try:
+            pdf = self.storage.retrieve_file(key)
+        except Exception:
+            logger.exception("pdf cache: cannot retrieve %s", key)
+            pdf = None
+
+        with self._lock:
+            if pdf is None:
+                self._misses += 1
+                # evicted by another process
+                self._forget(key)
+                return None
+            self._hits += 1
+            self._use(key, len(pdf))
+            evicted = self._evict()
+        self._delete(evicted)
+
+        return pdf
+
+    def put(self, key: str, pdf: bytes):
+        if len(pdf) > self.max_bytes:
+            return
+        self._sync_if_due()
+        try:
+            self.storage.store_file(key, pdf)
+        except Exception:
+            logger.exception("pdf cache: cannot store %s", key)
+            return
+
+        with self._lock:
+            self._use(key, len(pdf))
+            evicted = self._evict()
+        self._delete(evicted)
+
+    def _use(self, key: str, size: int):
+        self._forget(key)
+        self._index[key] = (size, time.time())
+        self._size += size
+
+    def _forget(self, key: str):
+        size, _ = self._index.pop(key, (0, 0))
+        self._size -= size
+
+    def _evict(self) -> list[str]:
+        evicted = []
+        while self._size > self.max_bytes:
+            key, (size, _) = self._index.popitem(last=False)
+            self._size -= size
+            evicted.append(key)
+        return evicted
+
+    def _delete(self, keys: list[str]):
+        for key in keys:
+            try:
+                self.storage.delete_file(key)
+            except Exception:
+                logger.exception("pdf cache: cannot delete %s", key)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses)
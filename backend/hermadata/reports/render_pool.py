@@ -0,0 +1,187 @@
+"""
+PDF rendering with WeasyPrint.
+
+Rendering is CPU bound and holds the GIL for hundreds of milliseconds
+per document: with a `RenderPool` it runs in worker processes, which
+import WeasyPrint and parse the stylesheet once when they start, while
+the request thread just waits for the result. Without a pool, each
+`ReportGenerator` keeps a `RenderCache` for its whole lifetime.
+
+This module only imports the standard library and WeasyPrint, so that
+the workers start quickly.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from threading import Lock
+from typing import NamedTuple
+
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+logger = logging.getLogger(__name__)
+
+STYLESHEET_PATHS = (
+    os.path.join(os.path.dirname(__file__), "static", "tailwind.css"),
+)
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class RenderCache:
+    """
+    What WeasyPrint would otherwise rebuild for every document: the
+    parsed stylesheets, shared by all the threads, and the font
+    configuration, one per thread because it wraps a Pango font map,
+    which is not thread safe.
+
+    The reports reference no image or web font, so there are no fetched
+    assets to keep.
+    """
+
+    def __init__(self, stylesheet_paths: tuple[str, ...] = STYLESHEET_PATHS):
+        self.stylesheet_paths = stylesheet_paths
+        self._stylesheets: list[CSS] | None = None
+        self._local = threading.local()
+        self._lock = Lock()
+        self._hits = {"stylesheets": 0, "font_config": 0}
+        self._misses = {"stylesheets": 0, "font_config": 0}
+
+    def _count(self, name: str, hit: bool):
+        with self._lock:
+            (self._hits if hit else self._misses)[name] += 1
+
+    def get_stylesheets(self) -> list[CSS]:
+        stylesheets = self._stylesheets
+        self._count("stylesheets", stylesheets is not None)
+        if stylesheets is None:
+            stylesheets = [CSS(filename=p) for p in self.stylesheet_paths]
+            # parsed twice at worst, by concurrent first renders
+            self._stylesheets = stylesheets
+        return stylesheets
+
+    def get_font_config(self) -> FontConfiguration:
+        font_config = getattr(self._local, "font_config", None)
+        self._count("font_config", font_config is not None)
+        if font_config is None:
+            font_config = self._local.font_config = FontConfiguration()
+        return font_config
+
+    def render(self, html: str) -> bytes:
+        target = BytesIO()
+        HTML(string=html).write_pdf(
+            target=target,
+            stylesheets=self.get_stylesheets(),
+            font_config=self.get_font_config(),
+        )
+
+        return target.getvalue()
+
+    def stats(self) -> dict[str, CacheStats]:
+        with self._lock:
+            return {
+                name: CacheStats(self._hits[name], self._misses[name])
+                for name in self._hits
+            }
+
+
+# cache of a pool worker process
+_worker_cache: RenderCache | None = None
+
+
+def _init_worker():
+    global _worker_cache
+
+    _worker_cache = RenderCache()
+    _worker_cache.get_stylesheets()
+
+
+def _render(html: str) -> tuple[bytes, int, dict[str, CacheStats]]:
+    pdf = _worker_cache.render(html)
+    # the stats of the worker travel with each result
+    return pdf, os.getpid(), _worker_cache.stats()
+
+
+def _ping(_) -> int:
+    return os.getpid()
+
+
+class RenderPool:
+    def __init__(self, workers: int, timeout: float | None = None):
+        self.workers = workers
+        self.timeout = timeout
+        # renders in the calling process, when the pool is broken
+        self.fallback_cache = RenderCache()
+        self._executor: ProcessPoolExecutor | None = None
+        # last stats received from each worker, by pid
+        self._worker_stats: dict[int, dict[str, CacheStats]] = {}
+        self._lock = Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawned, not forked: the workers must not share the
+                # threads and the database connections of the server
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def start(self):
+        """Start the workers now, instead of on the first render"""
+        pids = set(self.executor.map(_ping, range(self.workers), timeout=60))
+        logger.info("render pool started, workers %s", sorted(pids))
+
+    def render(self, html: str) -> bytes:
+        try:
+            pdf, pid, stats = self.executor.submit(_render, html).result(
+                self.timeout
+            )
+        except BrokenProcessPool:
+            # a worker died (e.g. killed for memory): start new ones for
+            # the next renders, and render this one here
+            logger.exception("render pool broken, restarting it")
+            self.shutdown()
+            return self.fallback_cache.render(html)
+
+        with self._lock:
+            self._worker_stats[pid] = stats
+        return pdf
+
+    def stats(self) -> dict[str, CacheStats]:
+        """
+        Hits and misses of the caches of the workers, as of their last
+        render, and of the fallback cache
+        """
+        totals = self.fallback_cache.stats()
+        with self._lock:
+            worker_stats = list(self._worker_stats.values())
+        for stats in worker_stats:
+            for name, (hits, misses) in stats.items():
+                total = totals[name]
+                totals[name] = CacheStats(
+                    total.hits + hits, total.misses + misses
+                )
+        return totals
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
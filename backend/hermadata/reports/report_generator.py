@@ -1,24 +1,28 @@
-import os
-from datetime import date
+import csv
+import json
+import tempfile
+from datetime import date, datetime
 from enum import Enum
-from io import BytesIO
-from typing import Annotated
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+from typing import Annotated, BinaryIO, Callable, Iterable, Literal
 
 import openpyxl
 from jinja2 import Environment
 from pydantic import (
     AfterValidator,
     BaseModel,
+    BeforeValidator,
     Field,
     PlainSerializer,
     StringConstraints,
     field_serializer,
     field_validator,
 )
-from weasyprint import CSS, HTML
 
 from hermadata.constants import (
     ENTRY_TYPE_LABELS,
+    EXCEL_MEDIA_TYPE,
     EXIT_TYPE_LABELS,
     FUR_LABELS,
     SIZE_LABELS,
@@ -26,7 +30,15 @@ from hermadata.constants import (
     AnimalSize,
     ExitType,
 )
+from hermadata.reports.intervals import IntervalSummary
+from hermadata.reports.pdf_cache import PDFCache, templates_version
+from hermadata.reports.render_pool import (
+    CacheStats,
+    RenderCache,
+    RenderPool,
+)
 from hermadata.repositories.animal.models import (
+    AnimalDaysItem,
     AnimalDaysQuery,
     AnimalDaysResult,
     AnimalEntriesItem,
@@ -34,11 +46,25 @@ from hermadata.repositories.animal.models import (
     AnimalExitsItem,
     AnimalExitsQuery,
     AnimalReportResult,
+    ExtractionQuery,
+    ReportGroupBy,
+    ReportGroupItem,
 )
 from hermadata.time_utils import get_today
 
+
+def parse_report_date(value):
+    # the variables dumped to JSON, snapshotted by the document tasks,
+    # are validated again
+    if isinstance(value, str) and "/" in value:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    return value
+
+
 ReportDate = Annotated[
-    date, PlainSerializer(lambda x: x.strftime("%d/%m/%Y"), return_type=str)
+    date,
+    BeforeValidator(parse_report_date),
+    PlainSerializer(lambda x: x.strftime("%d/%m/%Y"), return_type=str),
 ]
 
 NullableString = Annotated[
@@ -48,6 +74,7 @@ NullableString = Annotated[
 NullableInt = Annotated[
     int | None,
     Field(default=""),
+    BeforeValidator(lambda x: None if x == "" else x),
     AfterValidator(lambda x: "" if x is None else x),
 ]
 
@@ -67,9 +94,37 @@ def transform_date_to_string(raw: date) -> str:
 class ReportFormat(Enum):
     pdf = "application/pdf"
     excel = "xls"
+    csv = "csv"
+    parquet = "parquet"
+    json = "json"
+
+
+DEFAULT_EXTENSIONS: dict[ReportFormat, str] = {
+    ReportFormat.excel: "xlsx",
+    ReportFormat.csv: "csv",
+    ReportFormat.parquet: "parquet",
+    ReportFormat.json: "json",
+}
+
+MEDIA_TYPES: dict[ReportFormat, str] = {
+    ReportFormat.excel: EXCEL_MEDIA_TYPE,
+    ReportFormat.csv: "text/csv",
+    ReportFormat.parquet: "application/vnd.apache.parquet",
+    ReportFormat.json: "application/json",
+}
 
+# header of the group column of the grouped reports
+GROUP_BY_LABELS: dict[ReportGroupBy, str] = {
+    ReportGroupBy.month: "Mese",
+    ReportGroupBy.week: "Settimana",
+    ReportGroupBy.city: "Comune",
+    ReportGroupBy.structure: "Struttura",
+}
 
-DEFAULT_EXTENSIONS: dict[ReportFormat, str] = {ReportFormat.excel: "xlsx"}
+# types of the report columns, for the parquet schema
+ColumnType = Literal["string", "int", "date"]
+
+PARQUET_BATCH_SIZE = 10000
 
 
 class BaseVariables(BaseModel):
@@ -183,30 +238,71 @@ class ReportCustodyVariables(ReportDefaultVariables):
 
 
 class ReportGenerator:
-    def __init__(self, jinja_env: Environment) -> None:
+    def __init__(
+        self,
+        jinja_env: Environment,
+        render_pool: RenderPool | None = None,
+        pdf_cache: PDFCache | None = None,
+    ) -> None:
         self.jinja_env = jinja_env
+        # without a pool, the PDFs are rendered in the calling thread
+        self.render_pool = render_pool
+        self.render_cache = RenderCache()
+        self.pdf_cache = pdf_cache
+        self._templates_version: str | None = None
+
+    @property
+    def templates_version(self) -> str:
+        if self._templates_version is None:
+            self._templates_version = templates_version(self.jinja_env)
+        return self._templates_version
+
+    def load_templates(self) -> int:
+        """
+        Compile all the templates now, instead of on their first render.
+        Raise if one of them doesn't compile, return how many there are.
+        """
+        names = self.jinja_env.list_templates()
+        for name in names:
+            self.jinja_env.get_template(name)
+        return len(names)
 
     def _build_template(
         self, filename: str, variables: ReportDefaultVariables
+    ) -> bytes:
+        if self.pdf_cache is None:
+            return self._render_template(filename, variables)
+
+        key = self.pdf_cache.key(self.templates_version, filename, variables)
+        pdf = self.pdf_cache.get(key)
+        if pdf is None:
+            pdf = self._render_template(filename, variables)
+            self.pdf_cache.put(key, pdf)
+
+        return pdf
+
+    def _render_template(
+        self, filename: str, variables: ReportDefaultVariables
     ) -> bytes:
         template = self.jinja_env.get_template(filename)
 
         rendered_html = template.render(**variables.model_dump())
 
-        target = BytesIO()
+        if self.render_pool is not None:
+            return self.render_pool.render(rendered_html)
 
-        HTML(string=rendered_html).write_pdf(
-            target=target,
-            stylesheets=[
-                CSS(
-                    filename=os.path.join(
-                        os.path.dirname(__file__), "static", "tailwind.css"
-                    )
-                )
-            ],
-        )
+        return self.render_cache.render(rendered_html)
 
-        return target.getvalue()
+    def render_cache_stats(self) -> dict[str, CacheStats]:
+        """Hits and misses of the render caches and of the PDF cache"""
+        if self.render_pool is not None:
+            # the PDFs are rendered by the workers of the pool
+            stats = self.render_pool.stats()
+        else:
+            stats = self.render_cache.stats()
+        if self.pdf_cache is not None:
+            stats["pdf"] = self.pdf_cache.stats()
+        return stats
 
     def build_animal_entry_report(
         self, variables: ReportAnimalEntryVariables
@@ -231,11 +327,197 @@ class ReportGenerator:
     ) -> bytes:
         return self._build_template("variation.jinja", variables)
 
+    def _write_table(
+        self,
+        columns: list[tuple[str, ColumnType]],
+        rows: Iterable[list],
+        format: ReportFormat,
+        footer: Callable[[], list[list]] | None = None,
+    ) -> BinaryIO:
+        """
+        Write the rows to a temporary file, positioned at its start. Every
+        format is written while the rows are consumed, so memory doesn't
+        grow with their number. `footer` rows are only added to excel
+        files: csv, parquet and json are plain tables.
+        """
+        if format == ReportFormat.excel:
+            return self._write_excel(columns, rows, footer)
+        if format == ReportFormat.csv:
+            return self._write_csv(columns, rows)
+        if format == ReportFormat.parquet:
+            return self._write_parquet(columns, rows)
+        if format == ReportFormat.json:
+            return self._write_json(columns, rows)
+        raise Exception("format not supported")
+
+    def _write_excel(self, columns, rows, footer) -> BinaryIO:
+        # write-only workbooks flush the rows to a temporary file as they
+        # are appended
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append([name for name, _ in columns])
+        for row in rows:
+            ws.append(row)
+        for row in footer() if footer else []:
+            ws.append(row)
+
+        fp = tempfile.TemporaryFile()
+        wb.save(fp)
+        fp.seek(0)
+        return fp
+
+    def _write_csv(self, columns, rows) -> BinaryIO:
+        fp = tempfile.TemporaryFile()
+        text = TextIOWrapper(fp, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow([name for name, _ in columns])
+        writer.writerows(rows)
+        text.flush()
+        text.detach()
+
+        fp.seek(0)
+        return fp
+
+    def _write_json(self, columns, rows) -> BinaryIO:
+        """An array with an object for each row, keyed by column name"""
+        fp = tempfile.TemporaryFile()
+        text = TextIOWrapper(fp, encoding="utf-8")
+        names = [name for name, _ in columns]
+        text.write("[")
+        for i, row in enumerate(rows):
+            if i:
+                text.write(",")
+            json.dump(
+                dict(zip(names, row, strict=True)),
+                text,
+                ensure_ascii=False,
+                default=date.isoformat,
+            )
+        text.write("]")
+        text.flush()
+        text.detach()
+
+        fp.seek(0)
+        return fp
+
+    def _write_parquet(self, columns, rows) -> BinaryIO:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise Exception(
+                "parquet reports need pyarrow: install hermadata[parquet]"
+            ) from e
+
+        types = {"string": pa.string(), "int": pa.int64(), "date": pa.date32()}
+        schema = pa.schema([(name, types[t]) for name, t in columns])
+
+        fp = tempfile.TemporaryFile()
+        rows = iter(rows)
+        with pq.ParquetWriter(fp, schema) as writer:
+            # one row group each batch
+            while batch := list(islice(rows, PARQUET_BATCH_SIZE)):
+                writer.write_batch(
+                    pa.RecordBatch.from_arrays(
+                        [
+                            pa.array(values, type=field.type)
+                            for values, field in zip(
+                                zip(*batch, strict=True), schema, strict=True
+                            )
+                        ],
+                        schema=schema,
+                    )
+                )
+
+        fp.seek(0)
+        return fp
+
+    def write_grouped_report(
+        self,
+        name: str,
+        total_label: str,
+        query: ExtractionQuery,
+        items: Iterable[ReportGroupItem],
+        format: ReportFormat = ReportFormat.excel,
+    ) -> tuple[str, BinaryIO]:
+        """
+        Write a report with the `total_label` of each group of the query,
+        to a temporary file positioned at its start.
+        """
+        total = 0
+
+        def rows():
+            nonlocal total
+            for item in items:
+                total += item.total
+                yield [item.group, item.total]
+
+        fp = self._write_table(
+            [
+                (GROUP_BY_LABELS[query.group_by], "string"),
+                (total_label, "int"),
+            ],
+            rows(),
+            format,
+            footer=lambda: [[], ["Totale", total]],
+        )
+
+        filename = (
+            f"{name}_{query.group_by.value}"
+            f"_{query.from_date.strftime('%Y-%m-%d')}"
+            f"_{query.to_date.strftime('%Y-%m-%d')}"
+            f".{DEFAULT_EXTENSIONS[format]}"
+        )
+
+        return filename, fp
+
+    def write_animal_days_count_report(
+        self,
+        query: AnimalDaysQuery,
+        items: Iterable[AnimalDaysItem],
+        format: ReportFormat = ReportFormat.excel,
+    ) -> tuple[str, BinaryIO]:
+        """Write the report to a temporary file, positioned at its start"""
+        total_days = 0
+
+        def rows():
+            nonlocal total_days
+            for d in items:
+                total_days += d.animal_days
+                yield [d.animal_name, d.animal_chip_code, d.animal_days]
+
+        fp = self._write_table(
+            [("Nome", "string"), ("Chip", "string"), ("Giorni", "int")],
+            rows(),
+            format,
+            footer=lambda: [[], ["Totale", "", total_days]],
+        )
+
+        filename = (
+            f"giorni_cane{query.from_date.strftime('%Y-%m-%d')}"
+            f"_{query.to_date.strftime('%Y-%m-%d')}"
+            f".{DEFAULT_EXTENSIONS[format]}"
+        )
+
+        return filename, fp
+
     def generate_animal_days_count_report(
         self,
         query: AnimalDaysQuery,
         data: AnimalDaysResult,
         format: ReportFormat = ReportFormat.excel,
+    ) -> tuple[str, bytes]:
+        filename, fp = self.write_animal_days_count_report(
+            query, data.items, format
+        )
+        with fp:
+            return filename, fp.read()
+
+    def generate_occupancy_report(
+        self,
+        query: AnimalDaysQuery,
+        data: IntervalSummary,
+        format: ReportFormat = ReportFormat.excel,
     ) -> tuple[str, bytes]:
         if format != ReportFormat.excel:
             raise Exception("format not supported")
@@ -243,15 +525,25 @@ class ReportGenerator:
         wb = openpyxl.Workbook()
 
         ws = wb.active
-        ws.append(["Nome", "Chip", "Giorni"])
-        for d in data.items:
-            ws.append([d.animal_name, d.animal_chip_code, d.animal_days])
+        ws.title = "Giornaliero"
+        ws.append(["Data", "Animali presenti"])
+        for day, occupancy in zip(
+            data.days.tolist(), data.occupancy.tolist(), strict=True
+        ):
+            ws.append([day, occupancy])
+
+        ws = wb.create_sheet("Mensile")
+        ws.append(["Mese", "Giorni"])
+        for month, days in zip(
+            data.months.tolist(), data.month_days.tolist(), strict=True
+        ):
+            ws.append([month.strftime("%m/%Y"), days])
 
         ws.append([])
-        ws.append(["Totale", "", data.total_days])
+        ws.append(["Totale", data.total_days])
 
         filename = (
-            f"giorni_cane{query.from_date.strftime('%Y-%m-%d')}"
+            f"presenze_{query.from_date.strftime('%Y-%m-%d')}"
             f"_{query.to_date.strftime('%Y-%m-%d')}"
             f".{DEFAULT_EXTENSIONS[format]}"
         )
@@ -263,32 +555,25 @@ class ReportGenerator:
 
         return filename, bytes_data
 
-    def generate_animal_entries_report(
+    def write_animal_entries_report(
         self,
         query: AnimalEntriesQuery,
-        data: AnimalReportResult[AnimalEntriesItem],
+        items: Iterable[AnimalEntriesItem],
         format: ReportFormat = ReportFormat.excel,
-    ) -> tuple[str, bytes]:
-        if format != ReportFormat.excel:
-            raise Exception("format not supported")
-
-        wb = openpyxl.Workbook()
-
-        ws = wb.active
-        ws.append(
+    ) -> tuple[str, BinaryIO]:
+        """Write the report to a temporary file, positioned at its start"""
+        fp = self._write_table(
             [
-                "Tipo",
-                "Nome",
-                "Chip",
-                "Data nascita",
-                "Sesso",
-                "Data ingresso",
-                "Tipo Ingresso",
-                "Comune",
-            ]
-        )
-        for d in data.items:
-            ws.append(
+                ("Tipo", "string"),
+                ("Nome", "string"),
+                ("Chip", "string"),
+                ("Data nascita", "date"),
+                ("Sesso", "string"),
+                ("Data ingresso", "date"),
+                ("Tipo Ingresso", "string"),
+                ("Comune", "string"),
+            ],
+            (
                 [
                     d.animal_race,
                     d.animal_name,
@@ -299,7 +584,10 @@ class ReportGenerator:
                     ENTRY_TYPE_LABELS[d.entry_type],
                     d.entry_city,
                 ]
-            )
+                for d in items
+            ),
+            format,
+        )
 
         filename = (
             f"ingressi_{query.from_date.strftime('%Y-%m-%d')}"
@@ -307,38 +595,38 @@ class ReportGenerator:
             f".{DEFAULT_EXTENSIONS[format]}"
         )
 
-        fp = BytesIO()
-        wb.save(fp)
+        return filename, fp
 
-        bytes_data = fp.getvalue()
-
-        return filename, bytes_data
-
-    def generate_animal_exits_report(
+    def generate_animal_entries_report(
         self,
-        query: AnimalExitsQuery,
-        data: AnimalReportResult[AnimalExitsItem],
+        query: AnimalEntriesQuery,
+        data: AnimalReportResult[AnimalEntriesItem],
         format: ReportFormat = ReportFormat.excel,
     ) -> tuple[str, bytes]:
-        if format != ReportFormat.excel:
-            raise Exception("format not supported")
-
-        wb = openpyxl.Workbook()
+        filename, fp = self.write_animal_entries_report(
+            query, data.items, format
+        )
+        with fp:
+            return filename, fp.read()
 
-        ws = wb.active
-        ws.append(
+    def write_animal_exits_report(
+        self,
+        query: AnimalExitsQuery,
+        items: Iterable[AnimalExitsItem],
+        format: ReportFormat = ReportFormat.excel,
+    ) -> tuple[str, BinaryIO]:
+        """Write the report to a temporary file, positioned at its start"""
+        fp = self._write_table(
             [
-                "Tipo",
-                "Nome",
-                "Chip",
-                "Data nascita",
-                "Sesso",
-                "Data uscita",
-                "Tipo uscita",
-            ]
-        )
-        for d in data.items:
-            ws.append(
+                ("Tipo", "string"),
+                ("Nome", "string"),
+                ("Chip", "string"),
+                ("Data nascita", "date"),
+                ("Sesso", "string"),
+                ("Data uscita", "date"),
+                ("Tipo uscita", "string"),
+            ],
+            (
                 [
                     d.animal_race,
                     d.animal_name,
@@ -348,7 +636,10 @@ class ReportGenerator:
                     d.exit_date,
                     EXIT_TYPE_LABELS[d.exit_type],
                 ]
-            )
+                for d in items
+            ),
+            format,
+        )
 
         filename = (
             f"uscite_{query.from_date.strftime('%Y-%m-%d')}"
@@ -356,9 +647,16 @@ class ReportGenerator:
             f".{DEFAULT_EXTENSIONS[format]}"
         )
 
-        fp = BytesIO()
-        wb.save(fp)
+        return filename, fp
 
-        bytes_data = fp.getvalue()
-
-        return filename, bytes_data
+    def generate_animal_exits_report(
+        self,
+        query: AnimalExitsQuery,
+        data: AnimalReportResult[AnimalExitsItem],
+        format: ReportFormat = ReportFormat.excel,
+    ) -> tuple[str, bytes]:
+        filename, fp = self.write_animal_exits_report(
+            query, data.items, format
+        )
+        with fp:
+            return filename, fp.read()
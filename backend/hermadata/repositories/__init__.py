@@ -2,6 +2,7 @@ import logging
 from typing import Annotated, Type, TypeVar
 
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from hermadata.dependancies import get_db_session
@@ -17,11 +18,26 @@ class BaseRepository:
 
 
 class SQLBaseRepository(BaseRepository):
+    _read_session: Session | None = None
+
     # https://fastapi.tiangolo.com/advanced/advanced-dependencies/#a-callable-instance
-    def __call__(self, session: Annotated[Session, Depends(get_db_session)]):
+    def __call__(
+        self,
+        session: Annotated[Session, Depends(get_db_session)],
+        read_session: Session | None = None,
+    ):
         self.session = session
+        self._read_session = read_session
         return self
 
+    @property
+    def read_session(self) -> Session:
+        """
+        Session for the read-only queries which can tolerate replication
+        lag, e.g. searches and reports. Defaults to `session`.
+        """
+        return self._read_session or self.session
+
     def add_entity(self, model_class: Type[EntityT], **kwargs) -> EntityT:
         """
         General method to add a new entity to the database.
@@ -35,3 +51,11 @@ class SQLBaseRepository(BaseRepository):
         self.session.add(entity)
         self.session.flush()
         return entity
+
+
+class SQLAsyncBaseRepository(BaseRepository):
+    """Base of the repositories which run on an `AsyncSession`"""
+
+    def __call__(self, session: AsyncSession):
+        self.session = session
+        return self
@@ -2,7 +2,6 @@ from datetime import date, datetime
 
 from pydantic import BaseModel, ConfigDict
 from sqlalchemy import desc, func, select
-from sqlalchemy.orm import Session
 
 from hermadata.database.models import AnimalEventType, AnimalLog, User
 from hermadata.models import PaginationQuery, PaginationResult
@@ -28,10 +27,6 @@ class ActivityFilterQuery(PaginationQuery):
 
 
 class SQLActivityRepository(SQLBaseRepository):
-    def __call__(self, session: Session):
-        self.session = session
-        return self
-
     def get_activities(
         self, query: ActivityFilterQuery
     ) -> PaginationResult[ActivityModel]:
@@ -69,7 +64,7 @@ class SQLActivityRepository(SQLBaseRepository):
             .select_from(AnimalLog)
             .where(*filter_conditions)
         )
-        total = self.session.execute(count_query).scalar_one()
+        total = self.read_session.execute(count_query).scalar_one()
 
         # Pagination
         if query.from_index is not None and query.to_index is not None:
@@ -79,7 +74,7 @@ class SQLActivityRepository(SQLBaseRepository):
         # Ordering
         base_query = base_query.order_by(desc(AnimalLog.created_at))
 
-        result = self.session.execute(base_query).all()
+        result = self.read_session.execute(base_query).all()
 
         items = []
         for row in result:
@@ -1,10 +1,12 @@
 import json
 import logging
 from datetime import date, datetime, timedelta, timezone
+from typing import Iterator
 
 from pydantic import validate_call
-from sqlalchemy import and_, case, func, insert, or_, select, text, update
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import (Date, Integer, and_, func, insert, null, or_, select,
+                        text, type_coerce, union, union_all, update)
+from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.orm import aliased
 
 from hermadata.constants import (HEALTHCARE_STAGE_ENTRY_TYPES, AnimalEvent,
@@ -12,7 +14,8 @@ from hermadata.constants import (HEALTHCARE_STAGE_ENTRY_TYPES, AnimalEvent,
 from hermadata.database.models import (Adopter, Adoption, Animal,
                                        AnimalDocument, AnimalEntry,
                                        AnimalEventType, AnimalLog, Breed,
-                                       Comune, DocumentKind, FurColor,
+                                       Comune, DailyOccupancy, DocumentKind,
+                                       FurColor,
                                        MedicalActivity, MedicalActivityRecord,
                                        Race, Structure, VetServiceRecord)
 from hermadata.errors import APIException
@@ -34,13 +37,14 @@ from hermadata.repositories.animal.models import (AddMedicalRecordModel,
                                                   AnimalEntryModel, AnimalExit,
                                                   AnimalExitsItem,
                                                   AnimalExitsQuery,
-                                                  AnimalGetQuery,
                                                   AnimalLogModel, AnimalModel,
+                                                  AnimalPresentItem,
+                                                  AnimalPresentQuery,
                                                   AnimalQueryModel,
                                                   AnimalReportResult,
                                                   AnimalSearchModel,
                                                   AnimalSearchResult,
-                                                  AnimalSearchResultQuery,
+                                                  AnimalSuggestItem,
                                                   CompleteEntryModel,
                                                   ExitCheckResult,
                                                   FurColorName,
@@ -50,8 +54,30 @@ from hermadata.repositories.animal.models import (AddMedicalRecordModel,
                                                   NewAnimalLogModel,
                                                   NewAnimalModel,
                                                   NewEntryModel,
+                                                  ReportGroupItem,
                                                   UpdateAnimalEntryModel,
                                                   UpdateAnimalModel)
+from hermadata.repositories.animal.grouping import (
+    PERIOD_GROUPS,
+    add_group,
+    split_days,
+)
+from hermadata.repositories.animal.occupancy import (
+    rebuild_daily_occupancy,
+    refresh_entry_occupancy,
+)
+from hermadata.repositories.animal.statements import (
+    SearchStatements,
+    animal_entry_from_row,
+    current_entry_id,
+    current_entry_join,
+    animal_model_from_row,
+    build_animal_entries_statement,
+    build_fur_colors_statement,
+    build_get_statement,
+    util_element_from_row,
+)
+from hermadata.repositories.animal.suggest_index import stage_suggest_update
 from hermadata.time_utils import get_now, get_today
 
 logger = logging.getLogger(__name__)
@@ -214,6 +240,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             origin_city_code=data.rescue_city_code,
             without_chip=data.without_chip,
         )
+        animal.current_entry = animal_entry
         event_log = AnimalLog(
             animal=animal,
             event=AnimalEvent.create.value,
@@ -224,6 +251,7 @@ class SQLAnimalRepository(SQLBaseRepository):
         self.session.add(animal_entry)
         self.session.add(event_log)
         self.session.flush()
+        self._stage_suggest_update(animal.id)
         return code
 
     def add_entry(
@@ -237,8 +265,7 @@ class SQLAnimalRepository(SQLBaseRepository):
 
         last_entry_id, exit_date = self.session.execute(
             select(AnimalEntry.id, AnimalEntry.exit_date).where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
             )
         ).first()
 
@@ -262,12 +289,10 @@ class SQLAnimalRepository(SQLBaseRepository):
             )
         self.session.execute(
             update(AnimalEntry)
-            .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
-            )
+            .where(AnimalEntry.id == last_entry_id)
             .values(current=False)
         )
+        refresh_entry_occupancy(self.session, last_entry_id)
 
         # Update in_shelter_from if applicable
         # If healthcare_stage is True, don't set in_shelter_from
@@ -285,7 +310,7 @@ class SQLAnimalRepository(SQLBaseRepository):
         )
 
         self.session.add(new_entry)
-        new_entry_id = new_entry.id
+        animal.current_entry = new_entry
         event_log = AnimalLog(
             animal_id=animal_id,
             event=AnimalEvent.new_entry.value,
@@ -294,14 +319,14 @@ class SQLAnimalRepository(SQLBaseRepository):
         )
         self.session.add(event_log)
         self.session.flush()
+        self._stage_suggest_update(animal_id)
 
-        return new_entry_id
+        return new_entry.id
 
     def check_complete_entry_needed(self, animal_id: int) -> bool:
         check = self.session.execute(
             select(AnimalEntry.id).where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
                 AnimalEntry.entry_date.is_(None),
             )
         )
@@ -313,66 +338,11 @@ class SQLAnimalRepository(SQLBaseRepository):
         query: AnimalQueryModel,
         allowed_city_codes: list[str] | None = None,
     ) -> AnimalModel:
-        where = []
-        if query.id is not None:
-            where.append(Animal.id == query.id)
-        if query.code is not None:
-            where.append(Animal.code == query.code)
-        if query.rescue_date is not None:
-            where.append(Animal.rescue_date == query.rescue_date)
-
-        if query.rescue_city_code is not None:
-            where.append(Animal.rescue_city_code == query.rescue_city_code)
-
-        where.append(Animal.deleted_at.is_(None))
-
-        if allowed_city_codes:
-            where.append(AnimalEntry.origin_city_code.in_(allowed_city_codes))
-
         result = self.session.execute(
-            select(
-                Animal.code,
-                Animal.race_id,
-                AnimalEntry.origin_city_code.label("rescue_city_code"),
-                Animal.breed_id,
-                Animal.chip_code,
-                Animal.chip_code_set,
-                Animal.name,
-                Animal.birth_date,
-                AnimalEntry.entry_date,
-                AnimalEntry.entry_type,
-                Animal.sex,
-                Animal.sterilized,
-                Animal.notes,
-                Animal.img_path,
-                Animal.fur,
-                Animal.color,
-                Animal.size,
-                AnimalEntry.exit_date,
-                AnimalEntry.exit_type,
-                Animal.in_shelter_from,
-                case(
-                    (Animal.in_shelter_from.is_not(None), False),
-                    else_=True,
-                ).label("healthcare_stage"),
-                AnimalEntry.without_chip,
-                Animal.structure_id,
-            )
-            .where(*where)
-            .join(
-                AnimalEntry,
-                and_(
-                    Animal.id == AnimalEntry.animal_id,
-                    AnimalEntry.current.is_(True),
-                ),
-            )
+            build_get_statement(query, allowed_city_codes)
         ).one()
 
-        data = AnimalModel.model_validate(
-            AnimalGetQuery(*result)._asdict(),
-            from_attributes=True,
-        )
-        return data
+        return animal_model_from_row(result)
 
     def get_adoption(self, animal_id: int):
         result = self.session.execute(
@@ -398,82 +368,15 @@ class SQLAnimalRepository(SQLBaseRepository):
         Return the minimum data set of a list of
         animals which match the search query.
         """
+        search = SearchStatements(query, allowed_city_codes)
 
-        where = query.as_where_clause()
-
-        if allowed_city_codes:
-            where.append(AnimalEntry.origin_city_code.in_(allowed_city_codes))
-
-        total = self.session.execute(
-            select(func.count("*"))
-            .select_from(Animal)
-            .join(
-                AnimalEntry,
-                and_(
-                    Animal.id == AnimalEntry.animal_id,
-                    AnimalEntry.current.is_(True),
-                ),
-            )
-            .where(*where)
-        ).scalar_one()
-        stmt = (
-            select(
-                Animal.id,
-                Animal.code,
-                Animal.name,
-                Animal.chip_code,
-                Animal.race_id,
-                AnimalEntry.entry_date,
-                AnimalEntry.origin_city_code,
-                Comune.name,
-                Comune.provincia,
-                AnimalEntry.entry_type,
-                AnimalEntry.exit_date,
-                AnimalEntry.exit_type,
-                Animal.in_shelter_from,
-                case(
-                    (Animal.in_shelter_from.is_not(None), False),
-                    else_=True,
-                ).label("healthcare_stage"),
-                AnimalEntry.without_chip,
-                Animal.structure_id,
-            )
-            .select_from(Animal)
-            .join(
-                Adoption,
-                and_(
-                    Adoption.animal_id == Animal.id,
-                    Adoption.returned_at.is_(None),
-                ),
-                isouter=True,
-            )
-            .join(
-                AnimalEntry,
-                and_(
-                    Animal.id == AnimalEntry.animal_id,
-                    AnimalEntry.current.is_(True),
-                ),
-            )
-            .join(Comune, Comune.id == AnimalEntry.origin_city_code)
-            .where(*where)
-            .order_by(query.as_order_by_clause())
-        )
-        if query.from_index is not None:
-            stmt = stmt.offset(query.from_index)
-        if query.to_index is not None:
-            stmt = stmt.limit(query.to_index - query.from_index or 0)
-
-        result = self.session.execute(stmt).all()
+        rows = self.read_session.execute(search.stmt).all()
 
-        response = [
-            AnimalSearchResult.model_validate(
-                AnimalSearchResultQuery(*r)._asdict(),
-                from_attributes=True,
-            )
-            for r in result
-        ]
+        total = None
+        if search.needs_count(rows):
+            total = self.read_session.execute(search.count_stmt).scalar_one()
 
-        return PaginationResult(items=response, total=total)
+        return search.page(rows, total)
 
     def generate_code(
         self, race_id: str, rescue_city_code: str, rescue_date: date = None
@@ -531,6 +434,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             .where(AnimalEntry.id == entry_id)
             .values(entry_date=data.entry_date)
         )
+        refresh_entry_occupancy(self.session, entry_id)
         event_log = AnimalLog(
             animal_id=animal_id,
             event=AnimalEvent.entry_complete.value,
@@ -549,6 +453,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             .values(deleted_at=get_now())
         )
         self.session.flush()
+        self._stage_suggest_update(animal_id)
 
     def move_to_structure(
         self,
@@ -623,52 +528,10 @@ class SQLAnimalRepository(SQLBaseRepository):
 
     def get_animal_entries(self, animal_id: int) -> list[AnimalEntryModel]:
         entries_data = self.session.execute(
-            select(
-                AnimalEntry,
-                Animal.name,
-                Animal.race_id,
-                Race.name,
-                Comune.name,
-            )
-            .select_from(AnimalEntry)
-            .join(Animal, AnimalEntry.animal_id == Animal.id)
-            .join(Race, Animal.race_id == Race.id)
-            .join(Comune, Comune.id == AnimalEntry.origin_city_code)
-            .where(
-                AnimalEntry.animal_id == animal_id,
-                Animal.deleted_at.is_(None),
-            )
-            .order_by(AnimalEntry.entry_date.desc())
+            build_animal_entries_statement(animal_id)
         ).all()
 
-        results = []
-        for (
-            animal_entry,
-            animal_name,
-            animal_race_id,
-            animal_race,
-            origin_city_name,
-        ) in entries_data:
-            animal_entry: AnimalEntry
-            result = AnimalEntryModel(
-                id=animal_entry.id,
-                animal_id=animal_entry.animal_id,
-                animal_name=animal_name,
-                entry_date=animal_entry.entry_date,
-                exit_date=animal_entry.exit_date,
-                entry_type=animal_entry.entry_type,
-                exit_type=animal_entry.exit_type,
-                origin_city_code=animal_entry.origin_city_code,
-                origin_city_name=origin_city_name,
-                animal_race=animal_race,
-                animal_race_id=animal_race_id,
-                entry_notes=animal_entry.entry_notes,
-                exit_notes=animal_entry.exit_notes,
-                without_chip=animal_entry.without_chip,
-            )
-            results.append(result)
-
-        return results
+        return [animal_entry_from_row(r) for r in entries_data]
 
     def update_animal_entry(
         self, entry_id: int, updates: UpdateAnimalEntryModel
@@ -684,6 +547,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             .where(AnimalEntry.id == entry_id)
             .values(**values)
         )
+        refresh_entry_occupancy(self.session, entry_id)
 
         # Add event log for tracking changes
         event_log = AnimalLog(
@@ -753,6 +617,8 @@ class SQLAnimalRepository(SQLBaseRepository):
         )
         self.session.add(event_log)
         self.session.flush()
+        if updates.name is not None:
+            self._stage_suggest_update(id)
         return result.rowcount
 
     def move_to_shelter(
@@ -765,8 +631,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             select(AnimalEntry)
             .join(Animal, AnimalEntry.animal_id == Animal.id)
             .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
                 Animal.deleted_at.is_(None),
             )
         ).scalar_one_or_none()
@@ -866,8 +731,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             )
             .join(Animal, Animal.id == AnimalEntry.animal_id)
             .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
                 Animal.deleted_at.is_(None),
             )
         ).first()
@@ -903,6 +767,7 @@ class SQLAnimalRepository(SQLBaseRepository):
     ):
         check = self.session.execute(
             select(
+                AnimalEntry.id,
                 Animal.race_id,
                 AnimalEntry.entry_date,
                 AnimalEntry.exit_date,
@@ -910,15 +775,14 @@ class SQLAnimalRepository(SQLBaseRepository):
             .join(Animal, Animal.id == AnimalEntry.animal_id)
             .join(Race, Race.id == Animal.race_id)
             .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
                 Animal.deleted_at.is_(None),
             )
         ).first()
         if not check:
             raise AnimalNotPresentException
 
-        race_code, entry_date, exit_date = check
+        entry_id, race_code, entry_date, exit_date = check
         if not entry_date:
             raise EntryNotCompleteException
         if exit_date:
@@ -953,16 +817,14 @@ class SQLAnimalRepository(SQLBaseRepository):
         self.session.add(animal_log)
         self.session.execute(
             update(AnimalEntry)
-            .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
-            )
+            .where(AnimalEntry.id == entry_id)
             .values(
                 exit_date=data.exit_date,
                 exit_type=data.exit_type,
                 exit_notes=data.notes,
             )
         )
+        refresh_entry_occupancy(self.session, entry_id)
         self.session.flush()
 
     def new_adoption(self, data: NewAdoption) -> AdoptionModel:
@@ -976,18 +838,17 @@ class SQLAnimalRepository(SQLBaseRepository):
         if existing_adoption:
             raise ExistingAdoptionException
 
-        current_entry_id = self.session.execute(
+        entry_id = self.session.execute(
             select(AnimalEntry.id)
             .join(Animal, Animal.id == AnimalEntry.animal_id)
             .where(
-                AnimalEntry.animal_id == data.animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(data.animal_id),
                 AnimalEntry.exit_date.is_(None),
                 Animal.deleted_at.is_(None),
             )
         ).scalar()
 
-        if not current_entry_id:
+        if not entry_id:
             raise Exception(
                 f"animal {data.animal_id} has no current"
                 " entry with null exit date"
@@ -996,7 +857,7 @@ class SQLAnimalRepository(SQLBaseRepository):
         adoption = Adoption(
             animal_id=data.animal_id,
             adopter_id=data.adopter_id,
-            animal_entry_id=current_entry_id,
+            animal_entry_id=entry_id,
             completed_at=datetime.now(tz=timezone.utc),
             location_address=data.location_address,
             location_city_code=data.location_city_code,
@@ -1008,68 +869,280 @@ class SQLAnimalRepository(SQLBaseRepository):
         return result
 
     def count_animal_days(self, query: AnimalDaysQuery) -> AnimalDaysResult:
-        entries = self.session.execute(
+        items = list(self.iter_animal_days(query))
+
+        result = AnimalDaysResult(
+            total_days=sum(i.animal_days for i in items),
+            items=items,
+        )
+
+        return result
+
+    def iter_animal_days(
+        self, query: AnimalDaysQuery
+    ) -> Iterator[AnimalDaysItem]:
+        """Days of each animal, streamed from the database"""
+        closed_days = (
+            select(
+                DailyOccupancy.animal_id,
+                func.count().label("days"),
+            )
+            .where(
+                DailyOccupancy.day.between(query.from_date, query.to_date),
+            )
+            .group_by(DailyOccupancy.animal_id)
+        )
+        # open entries are not in daily_occupancy: they are clipped to
+        # the query period starting from the next day after the entry
+        open_days = select(
+            AnimalEntry.animal_id,
+            (
+                func.datediff(
+                    query.to_date,
+                    func.greatest(
+                        func.adddate(AnimalEntry.entry_date, 1),
+                        query.from_date,
+                    ),
+                )
+                + 1
+            ).label("days"),
+        ).where(
+            AnimalEntry.entry_date.is_not(None),
+            AnimalEntry.entry_date <= query.to_date,
+            AnimalEntry.exit_date.is_(None),
+        )
+        if query.city_code:
+            closed_days = closed_days.where(
+                DailyOccupancy.city_code == query.city_code
+            )
+            open_days = open_days.where(
+                AnimalEntry.origin_city_code == query.city_code
+            )
+        days = union_all(closed_days, open_days).subquery()
+
+        rows = self.read_session.execute(
             select(
-                Animal.id,
                 Animal.name,
                 Animal.chip_code,
+                func.sum(days.c.days),
+            )
+            .select_from(days)
+            .join(Animal, Animal.id == days.c.animal_id)
+            .where(Animal.deleted_at.is_(None))
+            .group_by(Animal.id)
+            .order_by(Animal.id)
+            .execution_options(yield_per=1000)
+        )
+
+        for animal_name, animal_chip_code, animal_days in rows:
+            yield AnimalDaysItem(
+                animal_name=animal_name,
+                animal_chip_code=animal_chip_code,
+                animal_days=animal_days,
+            )
+
+    def group_animal_days(
+        self, query: AnimalDaysQuery
+    ) -> list[ReportGroupItem]:
+        """
+        Days of the animals in each group, in one statement. The days of
+        the open entries are split among the periods here.
+        """
+        closed_days, key, label = add_group(
+            select()
+            .select_from(DailyOccupancy)
+            .join(Animal, Animal.id == DailyOccupancy.animal_id),
+            query.group_by,
+            DailyOccupancy.day,
+            DailyOccupancy.city_code,
+        )
+        closed_days = (
+            closed_days.add_columns(
+                key.label("key"),
+                label.label("label"),
+                func.count().label("days"),
+                type_coerce(null(), Date).label("entry_date"),
+            )
+            .where(
+                DailyOccupancy.day.between(query.from_date, query.to_date),
+                Animal.deleted_at.is_(None),
+            )
+            .group_by(key, label)
+        )
+        open_entries, key, label = add_group(
+            select()
+            .select_from(AnimalEntry)
+            .join(Animal, Animal.id == AnimalEntry.animal_id),
+            query.group_by,
+            AnimalEntry.entry_date,
+            AnimalEntry.origin_city_code,
+        )
+        open_entries = open_entries.add_columns(
+            key.label("key"),
+            label.label("label"),
+            type_coerce(null(), Integer).label("days"),
+            AnimalEntry.entry_date,
+        ).where(
+            AnimalEntry.entry_date.is_not(None),
+            AnimalEntry.entry_date <= query.to_date,
+            AnimalEntry.exit_date.is_(None),
+            Animal.deleted_at.is_(None),
+        )
+        if query.city_code:
+            closed_days = closed_days.where(
+                DailyOccupancy.city_code == query.city_code
+            )
+            open_entries = open_entries.where(
+                AnimalEntry.origin_city_code == query.city_code
+            )
+
+        totals: dict[tuple, int] = {}
+        for key, label, days, entry_date in self.read_session.execute(
+            union_all(closed_days, open_entries)
+        ):
+            if entry_date is None:
+                totals[key, label] = totals.get((key, label), 0) + days
+                continue
+            # open entries count from the day after the entry
+            from_date = max(entry_date + timedelta(days=1), query.from_date)
+            if query.group_by in PERIOD_GROUPS:
+                for period, days in split_days(
+                    query.group_by, from_date, query.to_date
+                ):
+                    totals[period, period] = (
+                        totals.get((period, period), 0) + days
+                    )
+            elif from_date <= query.to_date:
+                totals[key, label] = (
+                    totals.get((key, label), 0)
+                    + (query.to_date - from_date).days
+                    + 1
+                )
+
+        return [
+            ReportGroupItem(group=label, total=total)
+            for (_, label), total in sorted(
+                totals.items(), key=lambda i: (i[0][1] or "", str(i[0][0]))
+            )
+        ]
+
+    def get_entry_intervals(
+        self, query: AnimalDaysQuery
+    ) -> tuple[list[int], list[date], list[date | None]]:
+        """
+        Animal ids, entry and exit dates of the entries of the city
+        which overlap the query period, as columns.
+        """
+        stmt = (
+            select(
+                AnimalEntry.animal_id,
                 AnimalEntry.entry_date,
                 AnimalEntry.exit_date,
             )
+            .join(Animal, Animal.id == AnimalEntry.animal_id)
             .where(
                 AnimalEntry.entry_date.is_not(None),
                 AnimalEntry.entry_date <= query.to_date,
                 or_(
                     AnimalEntry.exit_date.is_(None),
-                    AnimalEntry.exit_date > query.from_date,
+                    AnimalEntry.exit_date >= query.from_date,
                 ),
-                AnimalEntry.origin_city_code == query.city_code,
                 Animal.deleted_at.is_(None),
             )
-            .join(Animal, Animal.id == AnimalEntry.animal_id)
-        ).all()
+        )
+        if query.city_code:
+            stmt = stmt.where(AnimalEntry.origin_city_code == query.city_code)
+        rows = self.read_session.execute(stmt).all()
 
-        result_map: dict[int, AnimalDaysItem] = {}
+        animal_ids, entry_dates, exit_dates = (
+            tuple(map(list, zip(*rows, strict=True))) if rows else ([], [], [])
+        )
+        return animal_ids, entry_dates, exit_dates
 
-        for (
-            animal_id,
-            animal_name,
-            animal_chip_code,
-            animal_entry_date,
-            animal_exit_date,
-        ) in entries:
-            result_map.setdefault(
-                animal_id,
-                AnimalDaysItem(
-                    animal_name=animal_name,
-                    animal_chip_code=animal_chip_code,
-                    animal_days=0,
-                ),
+    def get_present(
+        self,
+        query: AnimalPresentQuery,
+        allowed_city_codes: list[str] | None = None,
+    ) -> list[AnimalPresentItem]:
+        """
+        Entries of the animals present in the query window, from the
+        entry date to the exit date included.
+        """
+        from_date, to_date = query.window()
+
+        # every entry overlapping the window is found with an index:
+        # the ones starting in the window, the ones started before and
+        # still open, and the closed ones through their occupancy days
+        starting = select(AnimalEntry.id).where(
+            AnimalEntry.entry_date.between(from_date, to_date)
+        )
+        still_open = select(AnimalEntry.id).where(
+            AnimalEntry.entry_date < from_date,
+            AnimalEntry.exit_date.is_(None),
+        )
+        closed = select(DailyOccupancy.animal_entry_id).where(
+            DailyOccupancy.day.between(from_date, to_date)
+        )
+        if query.city_code is not None:
+            starting = starting.where(
+                AnimalEntry.origin_city_code == query.city_code
+            )
+            still_open = still_open.where(
+                AnimalEntry.origin_city_code == query.city_code
             )
+            closed = closed.where(DailyOccupancy.city_code == query.city_code)
+        entry_ids = union(starting, still_open, closed).subquery()
 
-            # we start from the next day after the entry
-            entry = max(animal_entry_date + timedelta(days=1), query.from_date)
+        stmt = (
+            select(
+                Animal.id,
+                Animal.code,
+                Animal.name,
+                Animal.chip_code,
+                Animal.race_id,
+                Animal.structure_id,
+                AnimalEntry.id.label("entry_id"),
+                AnimalEntry.entry_date,
+                AnimalEntry.entry_type,
+                AnimalEntry.origin_city_code,
+                AnimalEntry.exit_date,
+                AnimalEntry.exit_type,
+            )
+            .select_from(entry_ids)
+            .join(AnimalEntry, AnimalEntry.id == entry_ids.c.id)
+            .join(Animal, Animal.id == AnimalEntry.animal_id)
+            .where(Animal.deleted_at.is_(None))
+            .order_by(AnimalEntry.entry_date, AnimalEntry.id)
+        )
+        if query.structure_id is not None:
+            stmt = stmt.where(Animal.structure_id == query.structure_id)
+        if allowed_city_codes:
+            stmt = stmt.where(
+                AnimalEntry.origin_city_code.in_(allowed_city_codes)
+            )
 
-            exit = (
-                animal_exit_date
-                and min(animal_exit_date, query.to_date)
-                or query.to_date
-            ) + timedelta(days=1)
+        return [
+            AnimalPresentItem.model_validate(r._asdict())
+            for r in self.read_session.execute(stmt)
+        ]
 
-            delta: timedelta = exit - entry
+    def rebuild_daily_occupancy(self) -> int:
+        """Regenerate `daily_occupancy` from the animal entries"""
+        return rebuild_daily_occupancy(self.session)
 
-            result_map[animal_id].animal_days += delta.days
+    def count_animal_entries(
+        self, query: AnimalEntriesQuery
+    ) -> AnimalReportResult[AnimalEntriesItem]:
+        items = list(self.iter_animal_entries(query))
 
-        result = AnimalDaysResult(
-            total_days=sum(r.animal_days for r in result_map.values()),
-            items=list(result_map.values()),
+        return AnimalReportResult[AnimalEntriesItem](
+            items=items, total=len(items)
         )
 
-        return result
-
-    def count_animal_entries(
+    def iter_animal_entries(
         self, query: AnimalEntriesQuery
-    ) -> AnimalReportResult[AnimalEntriesItem]:
+    ) -> Iterator[AnimalEntriesItem]:
+        """Entries of the query period, streamed from the database"""
         stmt = (
             select(
                 Animal.id,
@@ -1098,39 +1171,82 @@ class SQLAnimalRepository(SQLBaseRepository):
         if query.entry_type:
             stmt = stmt.where(AnimalEntry.entry_type == query.entry_type)
 
-        entries = self.session.execute(stmt).all()
-
-        result = AnimalReportResult[AnimalEntriesItem](
-            items=[
-                AnimalEntriesItem(
-                    animal_race=animal_race,
-                    animal_chip_code=animal_chip_code,
-                    animal_name=animal_name,
-                    animal_sex=animal_sex,
-                    animal_birth_date=animal_birth_date,
-                    entry_date=animal_entry_date,
-                    entry_type=entry_type,
-                    entry_city=entry_city,
-                )
-                for (
-                    animal_id,
-                    animal_race,
-                    animal_name,
-                    animal_birth_date,
-                    animal_sex,
-                    animal_chip_code,
-                    animal_entry_date,
-                    entry_type,
-                    entry_city,
-                ) in entries
-            ],
-            total=len(entries),
+        entries = self.read_session.execute(
+            stmt.execution_options(yield_per=1000)
         )
-        return result
+
+        for (
+            _animal_id,
+            animal_race,
+            animal_name,
+            animal_birth_date,
+            animal_sex,
+            animal_chip_code,
+            animal_entry_date,
+            entry_type,
+            entry_city,
+        ) in entries:
+            yield AnimalEntriesItem(
+                animal_race=animal_race,
+                animal_chip_code=animal_chip_code,
+                animal_name=animal_name,
+                animal_sex=animal_sex,
+                animal_birth_date=animal_birth_date,
+                entry_date=animal_entry_date,
+                entry_type=entry_type,
+                entry_city=entry_city,
+            )
+
+    def group_animal_entries(
+        self, query: AnimalEntriesQuery
+    ) -> list[ReportGroupItem]:
+        """Entries of the query period in each group, in one statement"""
+        stmt, key, label = add_group(
+            select()
+            .select_from(AnimalEntry)
+            .join(Animal, Animal.id == AnimalEntry.animal_id),
+            query.group_by,
+            AnimalEntry.entry_date,
+            AnimalEntry.origin_city_code,
+        )
+        stmt = stmt.where(
+            AnimalEntry.entry_date.is_not(None),
+            AnimalEntry.entry_date <= query.to_date,
+            AnimalEntry.entry_date >= query.from_date,
+            Animal.deleted_at.is_(None),
+        )
+        if query.city_code:
+            stmt = stmt.where(AnimalEntry.origin_city_code == query.city_code)
+
+        if query.entry_type:
+            stmt = stmt.where(AnimalEntry.entry_type == query.entry_type)
+
+        return self._group_report_items(stmt, key, label)
+
+    def _group_report_items(self, stmt, key, label) -> list[ReportGroupItem]:
+        rows = self.read_session.execute(
+            stmt.add_columns(label, func.count())
+            .group_by(key, label)
+            .order_by(label, key)
+        )
+
+        return [
+            ReportGroupItem(group=group, total=total) for group, total in rows
+        ]
 
     def count_animal_exits(
         self, query: AnimalExitsQuery
     ) -> AnimalReportResult[AnimalExitsItem]:
+        items = list(self.iter_animal_exits(query))
+
+        return AnimalReportResult[AnimalExitsItem](
+            items=items, total=len(items)
+        )
+
+    def iter_animal_exits(
+        self, query: AnimalExitsQuery
+    ) -> Iterator[AnimalExitsItem]:
+        """Exits of the query period, streamed from the database"""
         stmt = (
             select(
                 Animal.id,
@@ -1157,33 +1273,55 @@ class SQLAnimalRepository(SQLBaseRepository):
         if query.exit_type:
             stmt = stmt.where(AnimalEntry.exit_type == query.exit_type)
 
-        exits = self.session.execute(stmt).all()
-
-        result = AnimalReportResult[AnimalExitsItem](
-            items=[
-                AnimalExitsItem(
-                    animal_race=animal_race,
-                    animal_chip_code=animal_chip_code,
-                    animal_name=animal_name,
-                    animal_sex=animal_sex,
-                    animal_birth_date=animal_birth_date,
-                    exit_date=animal_exit_date,
-                    exit_type=exit_type,
-                )
-                for (
-                    animal_id,
-                    animal_race,
-                    animal_name,
-                    animal_birth_date,
-                    animal_sex,
-                    animal_chip_code,
-                    animal_exit_date,
-                    exit_type,
-                ) in exits
-            ],
-            total=len(exits),
+        exits = self.read_session.execute(
+            stmt.execution_options(yield_per=1000)
         )
-        return result
+
+        for (
+            _animal_id,
+            animal_race,
+            animal_name,
+            animal_birth_date,
+            animal_sex,
+            animal_chip_code,
+            animal_exit_date,
+            exit_type,
+        ) in exits:
+            yield AnimalExitsItem(
+                animal_race=animal_race,
+                animal_chip_code=animal_chip_code,
+                animal_name=animal_name,
+                animal_sex=animal_sex,
+                animal_birth_date=animal_birth_date,
+                exit_date=animal_exit_date,
+                exit_type=exit_type,
+            )
+
+    def group_animal_exits(
+        self, query: AnimalExitsQuery
+    ) -> list[ReportGroupItem]:
+        """Exits of the query period in each group, in one statement"""
+        stmt, key, label = add_group(
+            select()
+            .select_from(AnimalEntry)
+            .join(Animal, Animal.id == AnimalEntry.animal_id),
+            query.group_by,
+            AnimalEntry.exit_date,
+            AnimalEntry.origin_city_code,
+        )
+        stmt = stmt.where(
+            AnimalEntry.exit_date.is_not(None),
+            AnimalEntry.exit_date <= query.to_date,
+            AnimalEntry.exit_date >= query.from_date,
+            Animal.deleted_at.is_(None),
+        )
+        if query.city_code:
+            stmt = stmt.where(AnimalEntry.origin_city_code == query.city_code)
+
+        if query.exit_type:
+            stmt = stmt.where(AnimalEntry.exit_type == query.exit_type)
+
+        return self._group_report_items(stmt, key, label)
 
     def add_vet_service_record(self, animal_id, data: AddMedicalRecordModel):
         # Verify animal exists and is not deleted
@@ -1284,217 +1422,197 @@ class SQLAnimalRepository(SQLBaseRepository):
 
         return result
 
-    def _get_structure_report_variables(
-        self, animal_id: int
-    ) -> StructureVariables | None:
+    def _get_report_variables_rows(self, animal_ids: list[int]) -> dict:
+        """
+        What the adoption and variation reports show about the current
+        entry of the animals, in one statement: animal, exit, adoption,
+        adopter and structure. The columns of the variables models are
+        labeled `<model>__<field>`.
+        """
+        origin_comune = aliased(Comune)
+        location_comune = aliased(Comune)
+        residence_comune = aliased(Comune)
+        birth_comune = aliased(Comune)
         structure_comune = aliased(Comune)
-        data = self.session.execute(
-            select(
-                Structure.name,
-                Structure.address,
-                structure_comune.name.label("city"),
-            )
-            .select_from(Animal)
-            .join(Structure, Animal.structure_id == Structure.id)
-            .join(
-                structure_comune,
-                Structure.city_id == structure_comune.id,
-                isouter=True,
-            )
-            .where(Animal.id == animal_id)
-        ).one_or_none()
 
-        if data is None:
-            return None
-
-        return StructureVariables(
-            name=data.name,
-            address=data.address,
-            city=data.city,
-        )
-
-    def _get_animal_data_report_variables(
-        self, animal_id: int
-    ) -> AnimalVariables:
-        data = self.session.execute(
+        rows = self.session.execute(
             select(
-                Animal.name,
-                Animal.chip_code,
-                Breed.name.label("breed"),
-                Animal.sex,
-                self.animal_birth_date_to_age.label("age"),
-                Animal.fur.label("fur_type"),
-                FurColor.name.label("fur_color"),
-                Comune.name.label("origin_city"),
-                AnimalEntry.entry_date,
-                Animal.birth_date,
-                Animal.size,
+                Animal.id,
+                AnimalEntry.exit_date,
+                AnimalEntry.exit_type,
+                AnimalEntry.exit_notes,
+                Adoption.id.label("adoption_id"),
+                Adoption.location_address,
+                location_comune.name.label("location_city"),
+                location_comune.provincia.label("location_province"),
+                Animal.name.label("animal__name"),
+                Animal.chip_code.label("animal__chip_code"),
+                Breed.name.label("animal__breed"),
+                Animal.sex.label("animal__sex"),
+                self.animal_birth_date_to_age.label("animal__age"),
+                Animal.fur.label("animal__fur_type"),
+                FurColor.name.label("animal__fur_color"),
+                origin_comune.name.label("animal__origin_city"),
+                AnimalEntry.entry_date.label("animal__entry_date"),
+                Animal.birth_date.label("animal__birth_date"),
+                Animal.size.label("animal__size"),
+                Adopter.id.label("adopter_id"),
+                Adopter.name.label("adopter__name"),
+                Adopter.surname.label("adopter__surname"),
+                Adopter.fiscal_code.label("adopter__fiscal_code"),
+                Adopter.birth_date.label("adopter__birth_date"),
+                residence_comune.name.label("adopter__residence_city"),
+                birth_comune.name.label("adopter__birth_city"),
+                Adopter.phone.label("adopter__phone"),
+                Adopter.document_number.label("adopter__document_number"),
+                Structure.id.label("structure_id"),
+                Structure.name.label("structure__name"),
+                Structure.address.label("structure__address"),
+                structure_comune.name.label("structure__city"),
             )
             .select_from(Animal)
+            .join(AnimalEntry, current_entry_join())
             .join(
-                AnimalEntry,
-                and_(
-                    AnimalEntry.animal_id == Animal.id,
-                    AnimalEntry.current.is_(True),
-                ),
+                origin_comune, AnimalEntry.origin_city_code == origin_comune.id
             )
-            .join(Comune, AnimalEntry.origin_city_code == Comune.id)
-            .join(Breed, Breed.id == Animal.breed_id, isouter=True)
             .join(Race, Race.id == Animal.race_id)
+            .join(Breed, Breed.id == Animal.breed_id, isouter=True)
             .join(FurColor, FurColor.id == Animal.color, isouter=True)
-            .where(
-                Animal.id == animal_id,
-                Animal.deleted_at.is_(None),
-            )
-        ).one()
-
-        animal_variables = AnimalVariables.model_validate(
-            dict(zip(data._fields, data, strict=False))
-        )
-        return animal_variables
-
-    def _get_adopter_data_report_variables(
-        self, adopter_id: int
-    ) -> AdopterVariables:
-        comune_residence = aliased(Comune)
-        comune_birth = aliased(Comune)
-
-        data = self.session.execute(
-            select(
-                Adopter.name,
-                Adopter.surname,
-                Adopter.fiscal_code,
-                Adopter.birth_date,
-                comune_residence.name.label("residence_city"),
-                comune_birth.name.label("birth_city"),
-                Adopter.phone,
-                Adopter.document_number,
+            .join(
+                Adoption,
+                Adoption.animal_entry_id == AnimalEntry.id,
+                isouter=True,
             )
             .join(
-                comune_residence,
-                Adopter.residence_city_code == comune_residence.id,
+                location_comune,
+                Adoption.location_city_code == location_comune.id,
                 isouter=True,
             )
+            .join(Adopter, Adopter.id == Adoption.adopter_id, isouter=True)
             .join(
-                comune_birth,
-                Adopter.birth_city_code == comune_birth.id,
+                residence_comune,
+                Adopter.residence_city_code == residence_comune.id,
                 isouter=True,
             )
-            .where(Adopter.id == adopter_id)
-        ).one()
-        adopter_variables = AdopterVariables.model_validate(
-            dict(zip(data._fields, data, strict=False))
-        )
-
-        return adopter_variables
-
-    def get_adoption_report_variables(self, animal_id: int):
-        (
-            adoption_date,
-            exit_type,
-            notes,
-            adopter_id,
-            location_address,
-            location_city,
-            location_province,
-        ) = self.session.execute(
-            select(
-                AnimalEntry.exit_date,
-                AnimalEntry.exit_type,
-                AnimalEntry.exit_notes,
-                Adoption.adopter_id,
-                Adoption.location_address,
-                Comune.name,
-                Comune.provincia,
+            .join(
+                birth_comune,
+                Adopter.birth_city_code == birth_comune.id,
+                isouter=True,
             )
-            .select_from(AnimalEntry)
+            .join(Structure, Animal.structure_id == Structure.id, isouter=True)
             .join(
-                Adoption,
-                Adoption.animal_entry_id == AnimalEntry.id,
+                structure_comune,
+                Structure.city_id == structure_comune.id,
+                isouter=True,
             )
-            .join(Comune, Adoption.location_city_code == Comune.id)
             .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                Animal.id.in_(animal_ids),
+                Animal.deleted_at.is_(None),
             )
-        ).one()
-
-        if exit_type not in ADOPTER_EXIT_TYPES:
-            raise Exception("last exit is not an adoption")
-
-        adopter = self._get_adopter_data_report_variables(adopter_id)
-        animal_variables = self._get_animal_data_report_variables(animal_id)
-        structure_variables = self._get_structure_report_variables(animal_id)
+            # the last adoption of an entry wins
+            .order_by(Animal.id, Adoption.id)
+        ).all()
 
-        variables = ReportAdoptionVariables(
-            animal=animal_variables,
-            exit_date=adoption_date,
-            adopter=adopter,
-            notes=notes,
-            location_address=location_address,
-            location_city=location_city,
-            location_province=location_province,
-            structure=structure_variables,
-        )
+        return {row.id: row for row in rows}
 
-        return variables
+    @staticmethod
+    def _report_model_values(row, model: str) -> dict:
+        prefix = f"{model}__"
+        return {
+            name.removeprefix(prefix): value
+            for name, value in row._mapping.items()
+            if name.startswith(prefix)
+        }
 
-    def get_variation_report_variables(self, animal_id: int):
-        (
-            variation_date,
-            variation_type,
-            notes,
-            adopter_id,
-            location_address,
-            location_city,
-            location_province,
-        ) = self.session.execute(
-            select(
-                AnimalEntry.exit_date,
-                AnimalEntry.exit_type,
-                AnimalEntry.exit_notes,
-                Adoption.adopter_id,
-                Adoption.location_address,
-                Comune.name.label("location_city"),
-                Comune.provincia.label("location_province"),
-            )
-            .select_from(AnimalEntry)
-            .join(
-                Adoption,
-                Adoption.animal_entry_id == AnimalEntry.id,
-                isouter=True,
-            )
-            .join(
-                Comune, Adoption.location_city_code == Comune.id, isouter=True
+    def _build_report_common_variables(self, row) -> dict:
+        adopter = None
+        if row.exit_type in ADOPTER_EXIT_TYPES and row.adopter_id is not None:
+            adopter = AdopterVariables.model_validate(
+                self._report_model_values(row, "adopter")
             )
-            .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+        structure = None
+        if row.structure_id is not None:
+            structure = StructureVariables.model_validate(
+                self._report_model_values(row, "structure")
             )
-        ).one()
 
-        adopter = (
-            variation_type in ADOPTER_EXIT_TYPES
-            and self._get_adopter_data_report_variables(adopter_id)
-            or None
+        return {
+            "animal": AnimalVariables.model_validate(
+                self._report_model_values(row, "animal")
+            ),
+            "adopter": adopter,
+            "notes": row.exit_notes,
+            "location_address": row.location_address,
+            "location_city": row.location_city,
+            "location_province": row.location_province,
+            "structure": structure,
+        }
+
+    def _is_adoption_row(self, row) -> bool:
+        return (
+            row.exit_type in ADOPTER_EXIT_TYPES and row.adoption_id is not None
         )
 
-        animal_variables = self._get_animal_data_report_variables(animal_id)
-        structure_variables = self._get_structure_report_variables(animal_id)
+    def _build_adoption_report_variables(self, row) -> ReportAdoptionVariables:
+        return ReportAdoptionVariables(
+            exit_date=row.exit_date,
+            **self._build_report_common_variables(row),
+        )
 
-        variables = ReportVariationVariables(
-            variation_type=variation_type,
-            animal=animal_variables,
-            variation_date=variation_date,
-            adopter=adopter,
-            notes=notes,
-            location_address=location_address,
-            location_city=location_city,
-            location_province=location_province,
-            structure=structure_variables,
+    def _build_variation_report_variables(
+        self, row
+    ) -> ReportVariationVariables:
+        return ReportVariationVariables(
+            variation_type=row.exit_type,
+            variation_date=row.exit_date,
+            **self._build_report_common_variables(row),
         )
 
-        return variables
+    def get_adoption_report_variables_batch(
+        self, animal_ids: list[int]
+    ) -> dict[int, ReportAdoptionVariables]:
+        """
+        Adoption report variables of many animals, by animal id. The
+        animals whose current entry is not an adoption are left out.
+        """
+        rows = self._get_report_variables_rows(animal_ids)
+        return {
+            animal_id: self._build_adoption_report_variables(row)
+            for animal_id, row in rows.items()
+            if self._is_adoption_row(row)
+        }
+
+    def get_variation_report_variables_batch(
+        self, animal_ids: list[int]
+    ) -> dict[int, ReportVariationVariables]:
+        """
+        Variation report variables of many animals, by animal id. The
+        animals whose current entry has no exit are left out.
+        """
+        rows = self._get_report_variables_rows(animal_ids)
+        return {
+            animal_id: self._build_variation_report_variables(row)
+            for animal_id, row in rows.items()
+            if row.exit_type is not None
+        }
+
+    def _get_report_variables_row(self, animal_id: int):
+        row = self._get_report_variables_rows([animal_id]).get(animal_id)
+        if row is None:
+            raise NoResultFound(f"animal {animal_id} not found")
+        return row
+
+    def get_adoption_report_variables(self, animal_id: int):
+        row = self._get_report_variables_row(animal_id)
+        if not self._is_adoption_row(row):
+            raise Exception("last exit is not an adoption")
+
+        return self._build_adoption_report_variables(row)
+
+    def get_variation_report_variables(self, animal_id: int):
+        row = self._get_report_variables_row(animal_id)
+
+        return self._build_variation_report_variables(row)
 
     def confirm_temporary_adoption(
         self, animal_id: int, confirmation_date: date, user_id: int | None = None
@@ -1505,8 +1623,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             select(AnimalEntry)
             .join(Animal, Animal.id == AnimalEntry.animal_id)
             .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
                 AnimalEntry.exit_type == ExitType.temporary_adoption,
                 Animal.deleted_at.is_(None),
             )
@@ -1520,15 +1637,13 @@ class SQLAnimalRepository(SQLBaseRepository):
         # Update exit_type to adoption and update exit_date
         self.session.execute(
             update(AnimalEntry)
-            .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
-            )
+            .where(AnimalEntry.id == current_entry.id)
             .values(
                 exit_type=ExitType.adoption,
                 exit_date=confirmation_date,
             )
         )
+        refresh_entry_occupancy(self.session, current_entry.id)
 
         # Also update the adoption completed_at to confirmation_date
         self.session.execute(
@@ -1561,8 +1676,7 @@ class SQLAnimalRepository(SQLBaseRepository):
             select(AnimalEntry)
             .join(Animal, Animal.id == AnimalEntry.animal_id)
             .where(
-                AnimalEntry.animal_id == animal_id,
-                AnimalEntry.current.is_(True),
+                AnimalEntry.id == current_entry_id(animal_id),
                 AnimalEntry.exit_type == ExitType.temporary_adoption,
                 Animal.deleted_at.is_(None),
             )
@@ -1603,17 +1717,36 @@ class SQLAnimalRepository(SQLBaseRepository):
 
         return new_entry_id
 
-    def get_fur_colors(self) -> list[UtilElement]:
-        data = self.session.execute(
-            select(FurColor.id, FurColor.name.label("label"))
-        ).all()
+    def get_suggest_items(
+        self, animal_ids: list[int] | None = None
+    ) -> list[AnimalSuggestItem]:
+        """
+        Data of the suggest index: every animal which is not deleted,
+        or the given ones as seen by the current transaction.
+        """
+        stmt = select(
+            Animal.id,
+            Animal.code,
+            Animal.name,
+            AnimalEntry.origin_city_code,
+            Animal.deleted_at.is_not(None),
+        ).join(AnimalEntry, current_entry_join())
+        session = self.session
+        if animal_ids is None:
+            stmt = stmt.where(Animal.deleted_at.is_(None))
+            session = self.read_session
+        else:
+            stmt = stmt.where(Animal.id.in_(animal_ids))
+
+        return [AnimalSuggestItem(*r) for r in session.execute(stmt)]
+
+    def _stage_suggest_update(self, animal_id: int):
+        stage_suggest_update(self.session, self.get_suggest_items([animal_id]))
 
-        result = [
-            UtilElement.model_validate(dict(zip(d._fields, d, strict=False)))
-            for d in data
-        ]
+    def get_fur_colors(self) -> list[UtilElement]:
+        data = self.session.execute(build_fur_colors_statement()).all()
 
-        return result
+        return [util_element_from_row(d) for d in data]
 
     @validate_call
     def add_fur_color(self, name: FurColorName) -> UtilElement:
@@ -0,0 +1,88 @@
+from hermadata.models import (
+    AnimalEventTypeModel,
+    PaginationResult,
+    UtilElement,
+)
+from hermadata.repositories import SQLAsyncBaseRepository
+from hermadata.repositories.animal.models import (
+    AnimalEntryModel,
+    AnimalModel,
+    AnimalQueryModel,
+    AnimalSearchModel,
+    AnimalSearchResult,
+)
+from hermadata.repositories.animal.statements import (
+    SearchStatements,
+    animal_entry_from_row,
+    animal_model_from_row,
+    build_animal_entries_statement,
+    build_event_types_statement,
+    build_fur_colors_statement,
+    build_get_statement,
+    util_element_from_row,
+)
+
+
+class SQLAsyncAnimalRepository(SQLAsyncBaseRepository):
+    """
+    Read-only async counterpart of `SQLAnimalRepository`, for the
+    endpoints with the most traffic. Both build the same statements.
+    """
+
+    async def search(
+        self,
+        query: AnimalSearchModel,
+        allowed_city_codes: list[str] | None = None,
+    ) -> PaginationResult[AnimalSearchResult]:
+        search = SearchStatements(query, allowed_city_codes)
+
+        rows = (await self.session.execute(search.stmt)).all()
+
+        total = None
+        if search.needs_count(rows):
+            total = (
+                await self.session.execute(search.count_stmt)
+            ).scalar_one()
+
+        return search.page(rows, total)
+
+    async def get(
+        self,
+        query: AnimalQueryModel,
+        allowed_city_codes: list[str] | None = None,
+    ) -> AnimalModel:
+        result = (
+            await self.session.execute(
+                build_get_statement(query, allowed_city_codes)
+            )
+        ).one()
+
+        return animal_model_from_row(result)
+
+    async def get_animal_entries(
+        self, animal_id: int
+    ) -> list[AnimalEntryModel]:
+        entries_data = (
+            await self.session.execute(
+                build_animal_entries_statement(animal_id)
+            )
+        ).all()
+
+        return [animal_entry_from_row(r) for r in entries_data]
+
+    async def get_fur_colors(self) -> list[UtilElement]:
+        data = (await self.session.execute(build_fur_colors_statement())).all()
+
+        return [util_element_from_row(d) for d in data]
+
+    async def get_event_types(self) -> list[AnimalEventTypeModel]:
+        result = (
+            (await self.session.execute(build_event_types_statement()))
+            .scalars()
+            .all()
+        )
+
+        return [
+            AnimalEventTypeModel.model_validate(r, from_attributes=True)
+            for r in result
+        ]
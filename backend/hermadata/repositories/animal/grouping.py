@@ -0,0 +1,70 @@
+"""
+Groups of the extraction reports: the periods, with the same labels in
+SQL and in Python, and the city or the current structure of the animals.
+"""
+
+from datetime import date, timedelta
+from typing import Iterator
+
+from sqlalchemy import ColumnElement, Select, func
+from sqlalchemy.orm import aliased
+
+from hermadata.database.models import Animal, Comune, Structure
+from hermadata.repositories.animal.models import ReportGroupBy
+
+PERIOD_GROUPS = (ReportGroupBy.month, ReportGroupBy.week)
+
+# ISO years and weeks, like date.isocalendar()
+SQL_PERIOD_FORMATS = {
+    ReportGroupBy.month: "%Y-%m",
+    ReportGroupBy.week: "%x-W%v",
+}
+
+
+def period_label(group_by: ReportGroupBy, day: date) -> str:
+    if group_by == ReportGroupBy.month:
+        return f"{day:%Y-%m}"
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def split_days(
+    group_by: ReportGroupBy, from_date: date, to_date: date
+) -> Iterator[tuple[str, int]]:
+    """Days from `from_date` to `to_date` included, in each period"""
+    day = from_date
+    while day <= to_date:
+        if group_by == ReportGroupBy.month:
+            next_day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        else:
+            next_day = day + timedelta(days=7 - day.weekday())
+        yield (
+            period_label(group_by, day),
+            (min(next_day, to_date + timedelta(days=1)) - day).days,
+        )
+        day = next_day
+
+
+def add_group(
+    stmt: Select,
+    group_by: ReportGroupBy,
+    day: ColumnElement,
+    city_code: ColumnElement,
+) -> tuple[Select, ColumnElement, ColumnElement]:
+    """
+    Join what the group needs to `stmt`, which selects from `Animal`,
+    and return it with the key and the label of the group.
+    """
+    if group_by in PERIOD_GROUPS:
+        period = func.date_format(day, SQL_PERIOD_FORMATS[group_by])
+        return stmt, period, period
+
+    if group_by == ReportGroupBy.city:
+        comune = aliased(Comune)
+        stmt = stmt.join(comune, city_code == comune.id, isouter=True)
+        return stmt, city_code, comune.name
+
+    stmt = stmt.join(
+        Structure, Animal.structure_id == Structure.id, isouter=True
+    )
+    return stmt, Animal.structure_id, Structure.name
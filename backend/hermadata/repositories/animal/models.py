@@ -1,3 +1,4 @@
+import re
 from collections import namedtuple
 from datetime import date, datetime
 from enum import Enum
@@ -16,9 +17,20 @@ from pydantic import BaseModel, ConfigDict, Field, StringConstraints
 from sqlalchemy import and_, or_
 from sqlalchemy.orm import InstrumentedAttribute, MappedColumn
 
-from hermadata.constants import EntryType, ExitType, RecurrenceType
+from hermadata.constants import (
+    EntryType,
+    ExitType,
+    RecurrenceType,
+    SearchTotalMode,
+)
 from hermadata.database.models import Animal, AnimalEntry
-from hermadata.models import PaginationQuery, Sex
+from hermadata.errors import InvalidCursorException
+from hermadata.models import (
+    PaginationQuery,
+    Sex,
+    decode_cursor,
+    encode_cursor,
+)
 from hermadata.time_utils import get_today
 
 
@@ -66,6 +78,19 @@ class WhereClauseMapItem(NamedTuple):
     or_group: str | None = None
 
 
+def chip_code_clause(value: str):
+    """
+    Match chip codes ending with the given digits, through the index on
+    `Animal.chip_code_reversed`, or starting with the given value,
+    through the unique index on `Animal.chip_code`.
+    """
+    clauses = [Animal.chip_code.like(f"{value}%")]
+    digits = re.sub(r"\D", "", value)
+    if digits:
+        clauses.append(Animal.chip_code_reversed.like(f"{digits[::-1]}%"))
+    return or_(*clauses)
+
+
 class NewAnimalModel(BaseModel):
     race_id: str
     rescue_city_code: str = Field(pattern=rescue_city_code_PATTERN)
@@ -92,10 +117,9 @@ class AnimalSearchSortField(str, Enum):
     entry_city = "entry_city"
     created_at = "created_at"
 
-    # TODO: this is bugged, rewrite
-
 
 SORT_FIELD_MAP: dict[str, MappedColumn] = {
+    AnimalSearchSortField.name: Animal.name,
     AnimalSearchSortField.entry_date: AnimalEntry.entry_date,
     AnimalSearchSortField.created_at: Animal.created_at,
     AnimalSearchSortField.entry_city: AnimalEntry.origin_city_code,
@@ -124,12 +148,14 @@ class AnimalSearchModel(PaginationQuery):
     dogs: bool | None = None
     deleted: bool | None = False
     structure_id: int | None = None
+    # `next_cursor` of the previous page: when set, the page starts
+    # right after it and `from_index` is ignored
+    after: str | None = None
+    with_total: SearchTotalMode = SearchTotalMode.exact
 
     _where_clause_map: dict[str, WhereClauseMapItem] = {
         "name": WhereClauseMapItem(lambda v: Animal.name.like(f"{v}%")),
-        "chip_code": WhereClauseMapItem(
-            lambda v: Animal.chip_code.like(f"%{v}%")
-        ),
+        "chip_code": WhereClauseMapItem(chip_code_clause),
         "rescue_city_code": WhereClauseMapItem(
             lambda v: AnimalEntry.origin_city_code == v
         ),
@@ -207,22 +233,88 @@ class AnimalSearchModel(PaginationQuery):
                 else Animal.deleted_at.is_(None)
             )
         ),
-        "structure_id": WhereClauseMapItem(
-            lambda v: Animal.structure_id == v
-        ),
+        "structure_id": WhereClauseMapItem(lambda v: Animal.structure_id == v),
     }
 
-    def as_order_by_clause(self) -> MappedColumn | None:
-        if (
-            not (self.sort_field and self.sort_order)
-            and self.sort_field not in SORT_FIELD_MAP
-        ):
-            return Animal.created_at.desc()
-        column: MappedColumn = SORT_FIELD_MAP[self.sort_field]
-        if self.sort_order == 1:
-            return column.asc()
-        if self.sort_order == -1:
-            return column.desc()
+    def sort_key(self) -> tuple[MappedColumn, bool]:
+        """Sort column and whether the order is descending"""
+        column = SORT_FIELD_MAP.get(self.sort_field)
+        if column is None:
+            return Animal.created_at, True
+        return column, self.sort_order == -1
+
+    def as_order_by_clause(self) -> list:
+        # `Animal.id` breaks ties, so that the order is total
+        # and a cursor identifies a single position
+        column, descending = self.sort_key()
+        if descending:
+            return [column.desc(), Animal.id.desc()]
+        return [column.asc(), Animal.id.asc()]
+
+    def total_cache_key(self) -> str | None:
+        """
+        Key of the cached total of the query, None if the total
+        can't be estimated because of free text filters.
+        """
+        if self.name is not None or self.chip_code is not None:
+            return None
+        return self.model_dump_json(
+            exclude={
+                "from_index",
+                "to_index",
+                "sort_field",
+                "sort_order",
+                "after",
+                "with_total",
+            }
+        )
+
+    def page_size(self) -> int | None:
+        if self.to_index is None:
+            return None
+        return self.to_index - (self.from_index or 0)
+
+    def make_cursor(self, sort_value, animal_id: int) -> str:
+        column, descending = self.sort_key()
+        return encode_cursor(str(column), descending, sort_value, animal_id)
+
+    def as_keyset_clause(self):
+        """Where clause which selects the rows after the `after` cursor"""
+        column, descending = self.sort_key()
+        try:
+            sort_column, sort_descending, value, animal_id = decode_cursor(
+                self.after
+            )
+        except ValueError as e:
+            raise InvalidCursorException() from e
+        if (sort_column, sort_descending) != (str(column), descending):
+            # the cursor belongs to a search with another order
+            raise InvalidCursorException()
+
+        python_type = column.type.python_type
+        if value is not None and python_type in (date, datetime):
+            value = python_type.fromisoformat(value)
+
+        after_id = (
+            Animal.id < animal_id if descending else Animal.id > animal_id
+        )
+
+        if not column.expression.nullable:
+            after_value = column < value if descending else column > value
+            return or_(after_value, and_(column == value, after_id))
+
+        # MySQL puts NULLs first in ascending order, last in descending
+        if value is None:
+            clause = and_(column.is_(None), after_id)
+            if not descending:
+                clause = or_(clause, column.is_not(None))
+            return clause
+
+        after_value = column < value if descending else column > value
+        clause = or_(after_value, and_(column == value, after_id))
+        if descending:
+            clause = or_(clause, column.is_(None))
+        return clause
 
     def as_where_clause(self) -> list:
         or_groups: dict[str, list] = {}
@@ -347,6 +439,22 @@ class AnimalSearchResult(BaseModel):
     structure_id: int
 
 
+class AnimalSuggestion(BaseModel):
+    id: int
+    code: str
+    name: str | None = None
+
+
+class AnimalSuggestItem(NamedTuple):
+    """An animal in the suggest index"""
+
+    id: int
+    code: str
+    name: str | None
+    city_code: str | None
+    deleted: bool = False
+
+
 AnimalSearchResultQuery = namedtuple(
     "AnimalSearchResultQuery", AnimalSearchResult.model_fields.keys()
 )
@@ -382,10 +490,24 @@ class ExitCheckResult(BaseModel):
     missing_fields: list[str] = []
 
 
+class ReportGroupBy(str, Enum):
+    month = "month"
+    week = "week"
+    city = "city"
+    structure = "structure"
+
+
 class ExtractionQuery(BaseModel):
+    """
+    Without `city_code`, the report covers every city. With `group_by`,
+    it has a row for each period, city or current structure of the
+    animals instead of one for each animal.
+    """
+
     from_date: date
     to_date: date
-    city_code: str
+    city_code: str | None = None
+    group_by: ReportGroupBy | None = None
 
 
 class AnimalDaysQuery(ExtractionQuery):
@@ -400,6 +522,36 @@ class AnimalExitsQuery(ExtractionQuery):
     exit_type: ExitType | None = None
 
 
+class AnimalPresentQuery(BaseModel):
+    """
+    Animals present on `from_date` or, with `to_date`, at any time of the
+    window. `structure_id` is the structure the animals are in now.
+    """
+
+    from_date: date
+    to_date: date | None = None
+    city_code: str | None = None
+    structure_id: int | None = None
+
+    def window(self) -> tuple[date, date]:
+        return self.from_date, self.to_date or self.from_date
+
+
+class AnimalPresentItem(BaseModel):
+    id: int
+    code: str
+    name: str | None = None
+    chip_code: str | None = None
+    race_id: str
+    structure_id: int
+    entry_id: int
+    entry_date: date
+    entry_type: str
+    origin_city_code: str
+    exit_date: date | None = None
+    exit_type: str | None = None
+
+
 class AnimalDaysItem(BaseModel):
     animal_name: str | None = None
     animal_chip_code: str | None = None
@@ -411,6 +563,12 @@ class AnimalDaysResult(BaseModel):
     total_days: int
 
 
+class ReportGroupItem(BaseModel):
+    # period (2024-01, 2024-W01), city or structure name
+    group: str | None = None
+    total: int
+
+
 class AnimalReportBaseItem(BaseModel):
     animal_race: str
     animal_name: str | None = None
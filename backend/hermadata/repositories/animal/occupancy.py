@@ -0,0 +1,111 @@
+"""
+Maintenance of the `daily_occupancy` table, which has one row for each
+day an animal spent in the shelter during its closed entries.
+
+Open entries are not stored: they are at most one per animal in the
+shelter and their days keep growing, so reports count them from
+`animal_entry`.
+
+Overlapping entries of the same animal count each day once: the day
+belongs to the entry with the lowest id. The days of an animal are
+therefore refreshed all together, so that editing the entry which owns
+a shared day gives it back to the other one.
+"""
+
+from datetime import date, timedelta
+from typing import Iterator
+
+from sqlalchemy import Connection, delete, insert, select
+from sqlalchemy.orm import Session
+
+from hermadata.database.models import AnimalEntry, DailyOccupancy
+
+
+def occupancy_rows(
+    entry_id: int,
+    animal_id: int,
+    city_code: str,
+    entry_date: date,
+    exit_date: date,
+) -> Iterator[dict]:
+    """Days of an entry: from the one after the entry to the exit"""
+    day = entry_date + timedelta(days=1)
+    while day <= exit_date:
+        yield {
+            "city_code": city_code,
+            "day": day,
+            "animal_id": animal_id,
+            "animal_entry_id": entry_id,
+        }
+        day += timedelta(days=1)
+
+
+def _insert(session: Session | Connection, rows: list[dict]):
+    # overlapping entries of the same animal count each day once
+    session.execute(insert(DailyOccupancy).prefix_with("IGNORE"), rows)
+
+
+def _closed_entries_statement():
+    return select(
+        AnimalEntry.id,
+        AnimalEntry.animal_id,
+        AnimalEntry.origin_city_code,
+        AnimalEntry.entry_date,
+        AnimalEntry.exit_date,
+    ).where(
+        AnimalEntry.entry_date.is_not(None),
+        AnimalEntry.exit_date.is_not(None),
+    )
+
+
+def refresh_entry_occupancy(session: Session | Connection, entry_id: int):
+    """Replace the days of the animal of an entry after it changed"""
+    animal_id = session.execute(
+        select(AnimalEntry.animal_id).where(AnimalEntry.id == entry_id)
+    ).scalar_one_or_none()
+    if animal_id is not None:
+        refresh_animal_occupancy(session, animal_id)
+
+
+def refresh_animal_occupancy(session: Session | Connection, animal_id: int):
+    """Replace the days of an animal with the ones of its closed entries"""
+    session.execute(
+        delete(DailyOccupancy).where(DailyOccupancy.animal_id == animal_id)
+    )
+    entries = session.execute(
+        _closed_entries_statement()
+        .where(AnimalEntry.animal_id == animal_id)
+        .order_by(AnimalEntry.id)
+    ).all()
+    rows = [r for entry in entries for r in occupancy_rows(*entry)]
+    if rows:
+        _insert(session, rows)
+
+
+def rebuild_daily_occupancy(
+    session: Session | Connection, batch_size: int = 1000
+) -> int:
+    """Regenerate the whole table, return the number of days inserted"""
+    session.execute(delete(DailyOccupancy))
+
+    total = 0
+    last_id = 0
+    while True:
+        # entries are read in batches by id rather than streamed: the
+        # connection can't run the inserts while a result is pending
+        entries = session.execute(
+            _closed_entries_statement()
+            .where(AnimalEntry.id > last_id)
+            .order_by(AnimalEntry.id)
+            .limit(batch_size)
+        ).all()
+        if not entries:
+            break
+        last_id = entries[-1].id
+
+        rows = [r for entry in entries for r in occupancy_rows(*entry)]
+        if rows:
+            _insert(session, rows)
+            total += len(rows)
+
+    return total
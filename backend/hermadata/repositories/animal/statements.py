@@ -0,0 +1,315 @@
+"""
+Statements and row mappings shared by the sync and async animal
+repositories, so that both return the same data for the same query.
+"""
+
+from sqlalchemy import Row, Select, and_, case, func, select
+
+from hermadata.constants import SearchTotalMode
+from hermadata.database.models import (
+    Adoption,
+    Animal,
+    AnimalEntry,
+    AnimalEventType,
+    Comune,
+    FurColor,
+    Race,
+)
+from hermadata.models import PaginationResult, UtilElement
+from hermadata.repositories.animal.models import (
+    AnimalEntryModel,
+    AnimalGetQuery,
+    AnimalModel,
+    AnimalQueryModel,
+    AnimalSearchModel,
+    AnimalSearchResult,
+    AnimalSearchResultQuery,
+)
+from hermadata.settings import settings
+from hermadata.utils import TTLCache
+
+
+def current_entry_join():
+    return AnimalEntry.id == Animal.current_entry_id
+
+
+def current_entry_id(animal_id: int):
+    """Id of the current entry of an animal, as a scalar subquery"""
+    return (
+        select(Animal.current_entry_id)
+        .where(Animal.id == animal_id)
+        .scalar_subquery()
+    )
+
+
+# totals of the `estimated` searches, shared by the whole process
+search_total_cache = TTLCache(settings.app.search_total_cache_seconds)
+
+
+class SearchStatements:
+    """
+    Statements of a search and how to build its page from their rows.
+
+    The page statement selects one row more than the page size, to know
+    whether there's a next page, then the sort value and, when the total
+    is computed with the page, the `COUNT(*) OVER()` total. The
+    separate `count_stmt` is only needed when the page can't return the
+    total: keyset pages (the cursor filters the window) and pages past
+    the end.
+    """
+
+    def __init__(
+        self,
+        query: AnimalSearchModel,
+        allowed_city_codes: list[str] | None = None,
+    ):
+        self.query = query
+
+        where = query.as_where_clause()
+        if allowed_city_codes:
+            where.append(AnimalEntry.origin_city_code.in_(allowed_city_codes))
+
+        self.cache_key = None
+        self.cached_total = None
+        if query.with_total == SearchTotalMode.estimated:
+            self.cache_key = query.total_cache_key()
+            if self.cache_key is not None:
+                self.cache_key += str(sorted(allowed_city_codes or []))
+                self.cached_total = search_total_cache.get(self.cache_key)
+
+        self.window_total = (
+            query.with_total != SearchTotalMode.off
+            and self.cached_total is None
+            and query.after is None
+        )
+
+        self.count_stmt = (
+            select(func.count("*"))
+            .select_from(Animal)
+            .join(AnimalEntry, current_entry_join())
+            .where(*where)
+        )
+
+        sort_column, _ = query.sort_key()
+        extra_columns = [sort_column.label("sort_value")]
+        if self.window_total:
+            extra_columns.append(func.count().over().label("total"))
+
+        stmt = (
+            select(
+                Animal.id,
+                Animal.code,
+                Animal.name,
+                Animal.chip_code,
+                Animal.race_id,
+                AnimalEntry.entry_date,
+                AnimalEntry.origin_city_code,
+                Comune.name,
+                Comune.provincia,
+                AnimalEntry.entry_type,
+                AnimalEntry.exit_date,
+                AnimalEntry.exit_type,
+                Animal.in_shelter_from,
+                case(
+                    (Animal.in_shelter_from.is_not(None), False),
+                    else_=True,
+                ).label("healthcare_stage"),
+                AnimalEntry.without_chip,
+                Animal.structure_id,
+                *extra_columns,
+            )
+            .select_from(Animal)
+            .join(
+                Adoption,
+                and_(
+                    Adoption.animal_id == Animal.id,
+                    Adoption.returned_at.is_(None),
+                ),
+                isouter=True,
+            )
+            .join(AnimalEntry, current_entry_join())
+            .join(Comune, Comune.id == AnimalEntry.origin_city_code)
+            .where(*where)
+            .order_by(*query.as_order_by_clause())
+        )
+        if query.after is not None:
+            stmt = stmt.where(query.as_keyset_clause())
+        elif query.from_index is not None:
+            stmt = stmt.offset(query.from_index)
+        if query.page_size() is not None:
+            stmt = stmt.limit(query.page_size() + 1)
+        self.stmt = stmt
+
+    def needs_count(self, rows: list[Row]) -> bool:
+        """Whether `count_stmt` must run to know the total"""
+        if (
+            self.query.with_total == SearchTotalMode.off
+            or self.cached_total is not None
+        ):
+            return False
+        if not self.window_total:
+            return True
+        # past the end there are no rows to read the total from
+        return not rows and bool(self.query.from_index)
+
+    def page(
+        self, rows: list[Row], total: int | None = None
+    ) -> PaginationResult[AnimalSearchResult]:
+        """
+        Build the page from the rows of `stmt` and, when `needs_count`,
+        the result of `count_stmt`.
+        """
+        if total is None:
+            if self.cached_total is not None:
+                total = self.cached_total
+            elif self.window_total:
+                total = rows[0].total if rows else 0
+
+        if self.cache_key is not None and self.cached_total is None:
+            search_total_cache.set(self.cache_key, total)
+
+        next_cursor = None
+        page_size = self.query.page_size()
+        if page_size is not None and len(rows) > page_size:
+            rows = rows[:page_size]
+            if rows:
+                last = rows[-1]
+                next_cursor = self.query.make_cursor(last.sort_value, last.id)
+
+        return PaginationResult(
+            items=[search_result_from_row(r) for r in rows],
+            total=total,
+            next_cursor=next_cursor,
+        )
+
+
+def search_result_from_row(row: Row) -> AnimalSearchResult:
+    # the row ends with columns which are not part of the result
+    fields = AnimalSearchResultQuery._fields
+    return AnimalSearchResult.model_validate(
+        AnimalSearchResultQuery(*row[: len(fields)])._asdict(),
+        from_attributes=True,
+    )
+
+
+def build_get_statement(
+    query: AnimalQueryModel,
+    allowed_city_codes: list[str] | None = None,
+) -> Select:
+    where = []
+    if query.id is not None:
+        where.append(Animal.id == query.id)
+    if query.code is not None:
+        where.append(Animal.code == query.code)
+    if query.rescue_date is not None:
+        where.append(Animal.rescue_date == query.rescue_date)
+
+    if query.rescue_city_code is not None:
+        where.append(Animal.rescue_city_code == query.rescue_city_code)
+
+    where.append(Animal.deleted_at.is_(None))
+
+    if allowed_city_codes:
+        where.append(AnimalEntry.origin_city_code.in_(allowed_city_codes))
+
+    return (
+        select(
+            Animal.code,
+            Animal.race_id,
+            AnimalEntry.origin_city_code.label("rescue_city_code"),
+            Animal.breed_id,
+            Animal.chip_code,
+            Animal.chip_code_set,
+            Animal.name,
+            Animal.birth_date,
+            AnimalEntry.entry_date,
+            AnimalEntry.entry_type,
+            Animal.sex,
+            Animal.sterilized,
+            Animal.notes,
+            Animal.img_path,
+            Animal.fur,
+            Animal.color,
+            Animal.size,
+            AnimalEntry.exit_date,
+            AnimalEntry.exit_type,
+            Animal.in_shelter_from,
+            case(
+                (Animal.in_shelter_from.is_not(None), False),
+                else_=True,
+            ).label("healthcare_stage"),
+            AnimalEntry.without_chip,
+            Animal.structure_id,
+        )
+        .where(*where)
+        .join(AnimalEntry, current_entry_join())
+    )
+
+
+def animal_model_from_row(row: Row) -> AnimalModel:
+    return AnimalModel.model_validate(
+        AnimalGetQuery(*row)._asdict(),
+        from_attributes=True,
+    )
+
+
+def build_animal_entries_statement(animal_id: int) -> Select:
+    return (
+        select(
+            AnimalEntry,
+            Animal.name,
+            Animal.race_id,
+            Race.name,
+            Comune.name,
+        )
+        .select_from(AnimalEntry)
+        .join(Animal, AnimalEntry.animal_id == Animal.id)
+        .join(Race, Animal.race_id == Race.id)
+        .join(Comune, Comune.id == AnimalEntry.origin_city_code)
+        .where(
+            AnimalEntry.animal_id == animal_id,
+            Animal.deleted_at.is_(None),
+        )
+        .order_by(AnimalEntry.entry_date.desc())
+    )
+
+
+def animal_entry_from_row(row: Row) -> AnimalEntryModel:
+    (
+        animal_entry,
+        animal_name,
+        animal_race_id,
+        animal_race,
+        origin_city_name,
+    ) = row
+    animal_entry: AnimalEntry
+    return AnimalEntryModel(
+        id=animal_entry.id,
+        animal_id=animal_entry.animal_id,
+        animal_name=animal_name,
+        entry_date=animal_entry.entry_date,
+        exit_date=animal_entry.exit_date,
+        entry_type=animal_entry.entry_type,
+        exit_type=animal_entry.exit_type,
+        origin_city_code=animal_entry.origin_city_code,
+        origin_city_name=origin_city_name,
+        animal_race=animal_race,
+        animal_race_id=animal_race_id,
+        entry_notes=animal_entry.entry_notes,
+        exit_notes=animal_entry.exit_notes,
+        without_chip=animal_entry.without_chip,
+    )
+
+
+def build_fur_colors_statement() -> Select:
+    return select(FurColor.id, FurColor.name.label("label"))
+
+
+def util_element_from_row(row: Row) -> UtilElement:
+    return UtilElement.model_validate(
+        dict(zip(row._fields, row, strict=False))
+    )
+
+
+def build_event_types_statement() -> Select:
+    return select(AnimalEventType)
@@ -0,0 +1,153 @@
+"""
+Per-process prefix index of animal names and codes, for autocomplete.
+
+The index is a sorted list of `(key, animal_id)` searched with bisect.
+It is loaded on startup and kept up to date by the repository, which
+stages the changed animals in the session: they are applied only when
+the session commits. Changes made by other worker processes are picked
+up by reloading the index when it gets older than
+`settings.app.suggest_index_max_age_seconds`.
+"""
+
+import logging
+import time
+from bisect import bisect_left, insort
+from threading import Lock
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from hermadata.repositories.animal.models import (
+    AnimalSuggestion,
+    AnimalSuggestItem,
+)
+from hermadata.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SESSION_INFO_KEY = "animal_suggest_updates"
+
+
+def normalize(value: str) -> str:
+    return value.strip().casefold()
+
+
+class AnimalSuggestIndex:
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.loaded_at: float | None = None
+        self._keys: list[tuple[str, int]] = []
+        self._items: dict[int, AnimalSuggestItem] = {}
+        self._lock = Lock()
+        self._load_lock = Lock()
+
+    @staticmethod
+    def _item_keys(item: AnimalSuggestItem) -> list[tuple[str, int]]:
+        keys = [(normalize(item.code), item.id)]
+        if item.name:
+            keys.append((normalize(item.name), item.id))
+        return keys
+
+    def load(self, items: Iterable[AnimalSuggestItem]):
+        """Replace the whole content of the index"""
+        items = {i.id: i for i in items}
+        keys = sorted(k for i in items.values() for k in self._item_keys(i))
+        with self._lock:
+            self._items = items
+            self._keys = keys
+            self.loaded_at = time.monotonic()
+        logger.info("animal suggest index loaded, %s animals", len(items))
+
+    def ensure_fresh(self, loader: Callable[[], Iterable[AnimalSuggestItem]]):
+        """Load the index with `loader` if empty or older than max age"""
+        if not self.is_stale():
+            return
+        # a single thread reloads, the others keep using the current data
+        if not self._load_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self.is_stale():
+                self.load(loader())
+        finally:
+            self._load_lock.release()
+
+    def is_stale(self) -> bool:
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > self.max_age
+        )
+
+    def _remove(self, animal_id: int):
+        item = self._items.pop(animal_id, None)
+        if item is None:
+            return
+        for key in self._item_keys(item):
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                del self._keys[index]
+
+    def update(self, items: Iterable[AnimalSuggestItem]):
+        """Add or replace animals; deleted ones are removed"""
+        with self._lock:
+            for item in items:
+                self._remove(item.id)
+                if item.deleted:
+                    continue
+                self._items[item.id] = item
+                for key in self._item_keys(item):
+                    insort(self._keys, key)
+
+    def suggest(
+        self,
+        text: str,
+        limit: int = 10,
+        allowed_city_codes: list[str] | None = None,
+    ) -> list[AnimalSuggestion]:
+        """Animals whose name or code starts with `text`, by key order"""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+
+        result: dict[int, AnimalSuggestion] = {}
+        with self._lock:
+            index = bisect_left(self._keys, (prefix,))
+            while index < len(self._keys) and len(result) < limit:
+                key, animal_id = self._keys[index]
+                index += 1
+                if not key.startswith(prefix):
+                    break
+                item = self._items[animal_id]
+                if animal_id in result or (
+                    allowed_city_codes
+                    and item.city_code not in allowed_city_codes
+                ):
+                    continue
+                result[animal_id] = AnimalSuggestion(
+                    id=item.id, code=item.code, name=item.name
+                )
+
+        return list(result.values())
+
+
+animal_suggest_index = AnimalSuggestIndex(
+    max_age=settings.app.suggest_index_max_age_seconds
+)
+
+
+def stage_suggest_update(session: Session, items: list[AnimalSuggestItem]):
+    """Apply the items to the index when `session` commits"""
+    session.info.setdefault(SESSION_INFO_KEY, []).extend(items)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_suggest_updates(session: Session):
+    items = session.info.pop(SESSION_INFO_KEY, None)
+    if items and animal_suggest_index.loaded_at is not None:
+        animal_suggest_index.update(items)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_suggest_updates(session: Session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop(SESSION_INFO_KEY, None)
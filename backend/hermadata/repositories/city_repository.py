@@ -32,7 +32,7 @@ class SQLCityRepository(SQLBaseRepository):
 
     def get_province(self) -> list[ProvinciaModel]:
         query_result = (
-            self.session.execute(select(Provincia).order_by(Provincia.name))
+            self.read_session.execute(select(Provincia).order_by(Provincia.name))
             .scalars()
             .all()
         )
@@ -45,7 +45,7 @@ class SQLCityRepository(SQLBaseRepository):
 
     def get_comuni(self, provincia: str) -> list[ComuneModel]:
         query_result = (
-            self.session.execute(
+            self.read_session.execute(
                 select(Comune)
                 .where(Comune.provincia == provincia)
                 .order_by(Comune.name)
@@ -68,7 +68,7 @@ class SQLCityRepository(SQLBaseRepository):
         return result is not None
 
     def get_comune(self, code: str) -> ComuneModel | None:
-        result = self.session.execute(
+        result = self.read_session.execute(
             select(Comune).where(Comune.id == code)
         ).scalar_one_or_none()
 
@@ -4,8 +4,8 @@ from pydantic import BaseModel, constr
 from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
-from hermadata.constants import DocKindCode, StorageType
-from hermadata.database.models import Document, DocumentKind
+from hermadata.constants import DocKindCode, DocumentTaskKind, StorageType
+from hermadata.database.models import Document, DocumentKind, DocumentTask
 from hermadata.repositories import SQLBaseRepository
 from hermadata.storage.base import StorageInterface
 
@@ -95,8 +95,8 @@ class SQLDocumentRepository(SQLBaseRepository):
         ).scalar_one()
         return DocKindModel.model_validate(kind, from_attributes=True)
 
-    def new_document(self, data: NewDocument) -> int:
-        key = str(uuid4())
+    def new_document(self, data: NewDocument, key: str | None = None) -> int:
+        key = key or str(uuid4())
         doc = Document(
             storage_service=self.selected_storage.value,
             key=key,
@@ -128,3 +128,22 @@ class SQLDocumentRepository(SQLBaseRepository):
         data = self.storage[storage_service].retrieve_file(key)
 
         return data, content_type, filename
+
+    def new_document_task(
+        self,
+        kind: DocumentTaskKind,
+        variables: dict,
+        animal_id: int | None = None,
+        animal_entry_id: int | None = None,
+    ) -> int:
+        """Queue a document to generate after the commit"""
+        task = DocumentTask(
+            kind=kind.value,
+            variables=variables,
+            animal_id=animal_id,
+            animal_entry_id=animal_entry_id,
+        )
+        self.session.add(task)
+        self.session.flush()
+
+        return task.id
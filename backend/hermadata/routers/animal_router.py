@@ -1,7 +1,8 @@
 from datetime import date, datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.exc import NoResultFound
 
@@ -9,8 +10,11 @@ from hermadata.constants import EXCEL_MEDIA_TYPE, ApiErrorCode, Permission
 from hermadata.initializations import (
     get_animal_repository,
     get_animal_service,
+    get_async_animal_repository,
     get_current_user,
     get_document_repository,
+    get_readonly_animal_repository,
+    get_report_job_service,
 )
 from hermadata.models import ApiError, PaginationResult
 from hermadata.permissions import (
@@ -18,11 +22,15 @@ from hermadata.permissions import (
     require_permission,
     require_superuser,
 )
+from hermadata.reports.report_generator import MEDIA_TYPES, ReportFormat
 from hermadata.repositories.animal.animal_repository import (
     EntryNotCompleteException,
     ExistingChipCodeException,
     SQLAnimalRepository,
 )
+from hermadata.repositories.animal.async_animal_repository import (
+    SQLAsyncAnimalRepository,
+)
 from hermadata.repositories.animal.models import (
     AnimalDaysQuery,
     AnimalDocumentModel,
@@ -32,9 +40,12 @@ from hermadata.repositories.animal.models import (
     AnimalExitsQuery,
     AnimalLogModel,
     AnimalModel,
+    AnimalPresentItem,
+    AnimalPresentQuery,
     AnimalQueryModel,
     AnimalSearchModel,
     AnimalSearchResult,
+    AnimalSuggestion,
     CompleteEntryModel,
     ExitCheckResult,
     MoveToShelterRequest,
@@ -45,41 +56,39 @@ from hermadata.repositories.animal.models import (
     UpdateAnimalEntryModel,
     UpdateAnimalModel,
 )
+from hermadata.repositories.animal.suggest_index import animal_suggest_index
 from hermadata.repositories.document_repository import SQLDocumentRepository
 from hermadata.services.animal_service import AnimalService
+from hermadata.services.report_job_service import (
+    ReportJobModel,
+    ReportJobNotDone,
+    ReportJobNotFound,
+    ReportJobQueueFull,
+    ReportJobService,
+    ReportKind,
+    ReportQuery,
+)
 from hermadata.services.user_service import TokenData
+from hermadata.utils import iter_file
 
 router = APIRouter(prefix="/animal")
 
+# async versions of the busiest read endpoints: when enabled, this router
+# is included before `router`, so its routes take precedence
+async_router = APIRouter(prefix="/animal")
+
 
 class ConfirmTemporaryAdoptionRequest(BaseModel):
     confirmation_date: date
 
 
-@router.post("")
-def new_animal_entry(
-    data: NewAnimalModel,
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
-    current_user: Annotated[
-        TokenData, Depends(require_permission(Permission.CREATE_ANIMAL))
-    ],
-) -> str:
-    animal_code = repo.new_animal(data, user_id=current_user.user_id)
-
-    return animal_code
-
-
-@router.get("")
-def get_animal_list():
-    pass
-
-
-@router.get("/search", response_model=PaginationResult[AnimalSearchResult])
-def search_animals(
-    query: Annotated[AnimalSearchModel, Depends(use_cache=False)],
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
-    current_user: Annotated[TokenData, Depends(get_current_user)],
-):
+def check_search_permissions(
+    query: AnimalSearchModel, current_user: TokenData
+) -> list[str] | None:
+    """
+    Raise if the user can't browse the animals the query asks for,
+    otherwise return the city codes the search is restricted to.
+    """
     if (
         query.present
         and check_permission(current_user, Permission.BROWSE_PRESENT_ANIMALS)
@@ -109,22 +118,113 @@ def search_animals(
             status_code=403,
             detail="Insufficient permissions to browse deleted animals",
         )
+
+    return current_user.city_codes or None
+
+
+def check_table_format(format: ReportFormat = ReportFormat.excel):
+    """Formats of the tabular reports"""
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=422, detail=f"format {format.name} not supported"
+        )
+    return format
+
+
+@router.post("")
+def new_animal_entry(
+    data: NewAnimalModel,
+    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
+    current_user: Annotated[
+        TokenData, Depends(require_permission(Permission.CREATE_ANIMAL))
+    ],
+) -> str:
+    animal_code = repo.new_animal(data, user_id=current_user.user_id)
+
+    return animal_code
+
+
+@router.get("")
+def get_animal_list():
+    pass
+
+
+@router.get("/search", response_model=PaginationResult[AnimalSearchResult])
+def search_animals(
+    query: Annotated[AnimalSearchModel, Depends(use_cache=False)],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
     # Here `Depends`is used to use a pydantic model as query params.
-    allowed_city_codes = None
-    if current_user.city_codes:
-        allowed_city_codes = current_user.city_codes
+    allowed_city_codes = check_search_permissions(query, current_user)
 
     result = repo.search(query, allowed_city_codes=allowed_city_codes)
 
     return result
 
 
+@router.get("/suggest", response_model=list[AnimalSuggestion])
+def suggest_animals(
+    q: str,
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+    """Autocomplete of animal names and codes, from the in-memory index"""
+    animal_suggest_index.ensure_fresh(repo.get_suggest_items)
+
+    return animal_suggest_index.suggest(
+        q, limit=limit, allowed_city_codes=current_user.city_codes or None
+    )
+
+
+@router.get("/present", response_model=list[AnimalPresentItem])
+def get_present_animals(
+    query: Annotated[AnimalPresentQuery, Depends()],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
+    current_user: Annotated[
+        TokenData,
+        Depends(require_permission(Permission.BROWSE_NOT_PRESENT_ANIMALS)),
+    ],
+):
+    """Animals present on `from_date`, or during `from_date`-`to_date`"""
+    if query.to_date is not None and query.to_date < query.from_date:
+        raise HTTPException(
+            status_code=422, detail="to_date must not be before from_date"
+        )
+
+    return repo.get_present(
+        query, allowed_city_codes=current_user.city_codes or None
+    )
+
+
 @router.get("/days/report")
 def serve_animal_days_report(
     query: Annotated[AnimalDaysQuery, Depends()],
     service: Annotated[AnimalService, Depends(get_animal_service)],
+    format: Annotated[ReportFormat, Depends(check_table_format)],
+):
+    filename, report = service.days_report(query, format)
+
+    return StreamingResponse(
+        iter_file(report),
+        media_type=MEDIA_TYPES[format],
+        headers={"X-filename": filename},
+    )
+
+
+@router.get("/occupancy/report")
+def serve_animal_occupancy_report(
+    query: Annotated[AnimalDaysQuery, Depends()],
+    service: Annotated[AnimalService, Depends(get_animal_service)],
 ):
-    filename, report = service.days_report(query)
+    filename, report = service.occupancy_report(query)
 
     return Response(
         content=report,
@@ -137,12 +237,13 @@ def serve_animal_days_report(
 def serve_animal_entries_report(
     query: Annotated[AnimalEntriesQuery, Depends()],
     service: Annotated[AnimalService, Depends(get_animal_service)],
+    format: Annotated[ReportFormat, Depends(check_table_format)],
 ):
-    filename, report = service.entries_report(query)
+    filename, report = service.entries_report(query, format)
 
-    return Response(
-        content=report,
-        media_type=EXCEL_MEDIA_TYPE,
+    return StreamingResponse(
+        iter_file(report),
+        media_type=MEDIA_TYPES[format],
         headers={"X-filename": filename},
     )
 
@@ -151,12 +252,107 @@ def serve_animal_entries_report(
 def serve_animal_exits_report(
     query: Annotated[AnimalExitsQuery, Depends()],
     service: Annotated[AnimalService, Depends(get_animal_service)],
+    format: Annotated[ReportFormat, Depends(check_table_format)],
 ):
-    filename, report = service.exits_report(query)
+    filename, report = service.exits_report(query, format)
 
-    return Response(
-        content=report,
-        media_type=EXCEL_MEDIA_TYPE,
+    return StreamingResponse(
+        iter_file(report),
+        media_type=MEDIA_TYPES[format],
+        headers={"X-filename": filename},
+    )
+
+
+def submit_report_job(
+    service: ReportJobService,
+    kind: ReportKind,
+    query: ReportQuery,
+    format: ReportFormat,
+    current_user: TokenData,
+) -> ReportJobModel:
+    try:
+        return service.submit(
+            kind, query, format, user_id=current_user.user_id
+        )
+    except ReportJobQueueFull as e:
+        raise HTTPException(
+            status_code=503, detail="Too many reports in progress"
+        ) from e
+
+
+@router.post(
+    "/days/report/jobs", response_model=ReportJobModel, status_code=202
+)
+def submit_animal_days_report_job(
+    query: Annotated[AnimalDaysQuery, Depends()],
+    service: Annotated[ReportJobService, Depends(get_report_job_service)],
+    format: Annotated[ReportFormat, Depends(check_table_format)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    """Generate the days report in background, see `/report-jobs`"""
+    return submit_report_job(
+        service, ReportKind.days, query, format, current_user
+    )
+
+
+@router.post(
+    "/entries/report/jobs", response_model=ReportJobModel, status_code=202
+)
+def submit_animal_entries_report_job(
+    query: Annotated[AnimalEntriesQuery, Depends()],
+    service: Annotated[ReportJobService, Depends(get_report_job_service)],
+    format: Annotated[ReportFormat, Depends(check_table_format)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    return submit_report_job(
+        service, ReportKind.entries, query, format, current_user
+    )
+
+
+@router.post(
+    "/exits/report/jobs", response_model=ReportJobModel, status_code=202
+)
+def submit_animal_exits_report_job(
+    query: Annotated[AnimalExitsQuery, Depends()],
+    service: Annotated[ReportJobService, Depends(get_report_job_service)],
+    format: Annotated[ReportFormat, Depends(check_table_format)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    return submit_report_job(
+        service, ReportKind.exits, query, format, current_user
+    )
+
+
+@router.get("/report-jobs/{job_id}", response_model=ReportJobModel)
+def get_report_job(
+    job_id: int,
+    service: Annotated[ReportJobService, Depends(get_report_job_service)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    try:
+        return service.get(job_id)
+    except ReportJobNotFound as e:
+        raise HTTPException(status_code=404, detail="No report job") from e
+
+
+@router.get("/report-jobs/{job_id}/download")
+def download_report_job(
+    job_id: int,
+    service: Annotated[ReportJobService, Depends(get_report_job_service)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    try:
+        filename, media_type, content = service.get_result(job_id)
+    except ReportJobNotFound as e:
+        raise HTTPException(status_code=404, detail="No report job") from e
+    except ReportJobNotDone as e:
+        raise HTTPException(
+            status_code=409, detail="Report job not done"
+        ) from e
+
+    return StreamingResponse(
+        iter_file(content),
+        media_type=media_type,
         headers={"X-filename": filename},
     )
 
@@ -164,17 +360,15 @@ def serve_animal_exits_report(
 @router.get("/{animal_id}", response_model=AnimalModel)
 def get_animal(
     animal_id: int,
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
     current_user: Annotated[TokenData, Depends(get_current_user)],
 ):
     try:
-        allowed_city_codes = None
-        if current_user.city_codes:
-            allowed_city_codes = current_user.city_codes
-
         animal_data = repo.get(
             AnimalQueryModel(id=animal_id),
-            allowed_city_codes=allowed_city_codes,
+            allowed_city_codes=current_user.city_codes or None,
         )
     except NoResultFound as e:
         raise HTTPException(status_code=404, detail="No animal found") from e
@@ -246,7 +440,9 @@ def add_animal_log(
 @router.get("/{animal_id}/document", response_model=list[AnimalDocumentModel])
 def get_animal_documents(
     animal_id: int,
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
 ):
     docs = repo.get_documents(animal_id)
 
@@ -328,7 +524,9 @@ def add_entry(
 @router.get("/{animal_id}/entries", response_model=list[AnimalEntryModel])
 def get_animal_entries(
     animal_id: int,
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
 ):
     result = repo.get_animal_entries(animal_id)
 
@@ -472,3 +670,60 @@ def move_animal_to_structure(
 # See TODO_ANIMAL_IMAGE_UPLOAD.md for implementation details
 # @router.post("/{animal_id}/image", response_model=int)
 # @router.put("/{animal_id}/image", response_model=None)
+
+
+# the index is in memory: the sync endpoint is fine, it's registered
+# here too so that `/{animal_id}` doesn't shadow it
+async_router.get("/suggest", response_model=list[AnimalSuggestion])(
+    suggest_animals
+)
+# same for the sync-only present animals
+async_router.get("/present", response_model=list[AnimalPresentItem])(
+    get_present_animals
+)
+
+
+@async_router.get(
+    "/search", response_model=PaginationResult[AnimalSearchResult]
+)
+async def async_search_animals(
+    query: Annotated[AnimalSearchModel, Depends(use_cache=False)],
+    repo: Annotated[
+        SQLAsyncAnimalRepository, Depends(get_async_animal_repository)
+    ],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    allowed_city_codes = check_search_permissions(query, current_user)
+
+    return await repo.search(query, allowed_city_codes=allowed_city_codes)
+
+
+@async_router.get("/{animal_id}", response_model=AnimalModel)
+async def async_get_animal(
+    animal_id: int,
+    repo: Annotated[
+        SQLAsyncAnimalRepository, Depends(get_async_animal_repository)
+    ],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    try:
+        animal_data = await repo.get(
+            AnimalQueryModel(id=animal_id),
+            allowed_city_codes=current_user.city_codes or None,
+        )
+    except NoResultFound as e:
+        raise HTTPException(status_code=404, detail="No animal found") from e
+
+    return animal_data
+
+
+@async_router.get(
+    "/{animal_id}/entries", response_model=list[AnimalEntryModel]
+)
+async def async_get_animal_entries(
+    animal_id: int,
+    repo: Annotated[
+        SQLAsyncAnimalRepository, Depends(get_async_animal_repository)
+    ],
+):
+    return await repo.get_animal_entries(animal_id)
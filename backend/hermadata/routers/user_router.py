@@ -5,8 +5,8 @@ from fastapi.security import OAuth2PasswordRequestForm
 
 from hermadata.constants import Permission
 from hermadata.initializations import (
-    get_activity_repository,
     get_current_user,
+    get_readonly_activity_repository,
     get_user_repository,
     get_user_service,
 )
@@ -58,7 +58,9 @@ def get_all_users(
 @router.get("/activity", response_model=PaginationResult[ActivityModel])
 def get_user_activity(
     query: Annotated[ActivityFilterQuery, Depends()],
-    repo: Annotated[SQLActivityRepository, Depends(get_activity_repository)],
+    repo: Annotated[
+        SQLActivityRepository, Depends(get_readonly_activity_repository)
+    ],
     current_user: Annotated[TokenData, Depends(get_current_user)],
 ):
     """Get animal logs activity for all users."""
@@ -16,27 +16,40 @@ from hermadata.constants import (
 from hermadata.database.models import AnimalEventType
 from hermadata.initializations import (
     get_animal_repository,
-    get_city_repository,
+    get_async_animal_repository,
+    get_readonly_animal_repository,
+    get_readonly_city_repository,
+    report_generator,
 )
 from hermadata.models import (
     AnimalEventTypeModel,
     EntryTypeElement,
     UtilElement,
 )
+from hermadata.permissions import require_superuser
 from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
+from hermadata.repositories.animal.async_animal_repository import (
+    SQLAsyncAnimalRepository,
+)
 from hermadata.repositories.animal.models import FurColorName
 from hermadata.repositories.city_repository import (
     ComuneModel,
     ProvinciaModel,
     SQLCityRepository,
 )
+from hermadata.services.user_service import TokenData
 
 router = APIRouter(prefix="/util")
 
+# see `animal_router.async_router`
+async_router = APIRouter(prefix="/util")
+
 
 @router.get("/events", response_model=list[AnimalEventTypeModel])
 def get_animal_event_types(
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
 ):
     stmt = select(AnimalEventType)
     result = repo.session.execute(stmt).scalars().all()
@@ -45,7 +58,7 @@ def get_animal_event_types(
 
 @router.get("/province", response_model=list[ProvinciaModel])
 def get_province(
-    repo: Annotated[SQLCityRepository, Depends(get_city_repository)],
+    repo: Annotated[SQLCityRepository, Depends(get_readonly_city_repository)],
 ):
     province = repo.get_province()
     return province
@@ -54,7 +67,7 @@ def get_province(
 @router.get("/comuni", response_model=list[ComuneModel])
 def get_comuni(
     provincia: str,
-    repo: Annotated[SQLCityRepository, Depends(get_city_repository)],
+    repo: Annotated[SQLCityRepository, Depends(get_readonly_city_repository)],
 ):
     comuni = repo.get_comuni(provincia=provincia)
     return comuni
@@ -63,7 +76,7 @@ def get_comuni(
 @router.get("/comune/{code}", response_model=ComuneModel | None)
 def get_comune(
     code: str,
-    repo: Annotated[SQLCityRepository, Depends(get_city_repository)],
+    repo: Annotated[SQLCityRepository, Depends(get_readonly_city_repository)],
 ):
     return repo.get_comune(code)
 
@@ -113,7 +126,9 @@ def get_animal_stages():
 
 @router.get("/fur-color", response_model=list[UtilElement])
 def get_animal_fur_colors(
-    repo: Annotated[SQLAnimalRepository, Depends(get_animal_repository)],
+    repo: Annotated[
+        SQLAnimalRepository, Depends(get_readonly_animal_repository)
+    ],
 ):
     colors = repo.get_fur_colors()
 
@@ -132,3 +147,35 @@ def add_fur_color(
     color = repo.add_fur_color(data.name)
 
     return color
+
+
+@router.get("/report-cache")
+def get_report_cache_stats(
+    current_user: Annotated[TokenData, Depends(require_superuser)],
+):
+    """
+    Hits and misses of the PDF render caches of this worker process, or of
+    its render pool, and of the PDF cache
+    """
+    return {
+        name: {**stats._asdict(), "hit_ratio": stats.hit_ratio}
+        for name, stats in report_generator.render_cache_stats().items()
+    }
+
+
+@async_router.get("/events", response_model=list[AnimalEventTypeModel])
+async def async_get_animal_event_types(
+    repo: Annotated[
+        SQLAsyncAnimalRepository, Depends(get_async_animal_repository)
+    ],
+):
+    return await repo.get_event_types()
+
+
+@async_router.get("/fur-color", response_model=list[UtilElement])
+async def async_get_animal_fur_colors(
+    repo: Annotated[
+        SQLAsyncAnimalRepository, Depends(get_async_animal_repository)
+    ],
+):
+    return await repo.get_fur_colors()
@@ -3,11 +3,16 @@ from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.orm import Session
 
-from hermadata.constants import DocKindCode, ExitType
+from hermadata.constants import DocKindCode, DocumentTaskKind, ExitType
 from hermadata.dependancies import get_db_session
+from hermadata.reports.intervals import summarize
 from hermadata.reports.report_generator import (
+    ReportAdoptionVariables,
     ReportAnimalEntryVariables,
+    ReportDefaultVariables,
+    ReportFormat,
     ReportGenerator,
+    ReportVariationVariables,
 )
 from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
 from hermadata.repositories.animal.models import (
@@ -25,9 +30,18 @@ from hermadata.repositories.document_repository import (
     NewDocument,
     SQLDocumentRepository,
 )
+from hermadata.services.document_outbox import stage_document_task
 from hermadata.storage.base import StorageInterface
 from datetime import date
 
+# template variables of each kind of document
+DOCUMENT_VARIABLES: dict[DocumentTaskKind, type[ReportDefaultVariables]] = {
+    DocumentTaskKind.entry_report: ReportAnimalEntryVariables,
+    DocumentTaskKind.adoption_report: ReportAdoptionVariables,
+    DocumentTaskKind.temporary_adoption_report: ReportAdoptionVariables,
+    DocumentTaskKind.variation_report: ReportVariationVariables,
+}
+
 
 class AnimalService:
     def __init__(
@@ -36,11 +50,14 @@ class AnimalService:
         document_repository: SQLDocumentRepository,
         report_generator: ReportGenerator,
         storage: StorageInterface,
+        deferred_documents: bool = False,
     ) -> None:
         self.animal_repository = animal_repository
         self.document_repository = document_repository
         self.report_generator = report_generator
         self.storage = storage
+        # generate the PDFs after the commit, see `document_outbox`
+        self.deferred_documents = deferred_documents
 
         self.document_kind_ids: dict[DocKindCode, int] = {}
 
@@ -87,20 +104,89 @@ class AnimalService:
     ):
         self.animal_repository.complete_entry(animal_id, data, user_id)
 
+    def _document(
+        self,
+        kind: DocumentTaskKind,
+        variables: ReportDefaultVariables,
+        animal_id: int,
+        animal_entry_id: int | None = None,
+    ):
+        """Generate a document now, or queue it if deferred"""
+        if not self.deferred_documents:
+            self._store_document(kind, animal_id, variables)
+            return
+
+        # the document shows the data of now, not of when the task runs
+        task_id = self.document_repository.new_document_task(
+            kind,
+            variables=variables.model_dump(mode="json"),
+            animal_id=animal_id,
+            animal_entry_id=animal_entry_id,
+        )
+        stage_document_task(self.document_repository.session, task_id)
+
+    def generate_document(
+        self,
+        kind: DocumentTaskKind,
+        animal_id: int,
+        variables: dict,
+        key: str | None = None,
+    ):
+        """
+        Generate the document of a task from its variables, storing it
+        with `key` if given.
+        """
+        self._store_document(
+            kind,
+            animal_id,
+            DOCUMENT_VARIABLES[kind].model_validate(variables),
+            key,
+        )
+
+    def _store_document(
+        self,
+        kind: DocumentTaskKind,
+        animal_id: int,
+        variables: ReportDefaultVariables,
+        key: str | None = None,
+    ):
+        match kind:
+            case DocumentTaskKind.entry_report:
+                self._store_entry_report(animal_id, variables, key)
+            case DocumentTaskKind.adoption_report:
+                self._store_adoption_report(animal_id, variables, key=key)
+            case DocumentTaskKind.temporary_adoption_report:
+                self._store_adoption_report(
+                    animal_id, variables, temporary=True, key=key
+                )
+            case DocumentTaskKind.variation_report:
+                self._store_variation_report(animal_id, variables, key)
+
     def generate_entry_report(self, entry_id: int):
         entry = self.animal_repository.get_animal_entry(entry_id)
 
-        report = self.report_generator.build_animal_entry_report(
+        self._document(
+            DocumentTaskKind.entry_report,
             ReportAnimalEntryVariables(
                 city=entry.origin_city_name,
                 animal_name=entry.animal_name,
                 animal_type=entry.animal_race,
                 entry_date=entry.entry_date,
-            )
+            ),
+            animal_id=entry.animal_id,
+            animal_entry_id=entry_id,
         )
 
-        filename = f"ingresso_{entry.animal_name}_"
-        f"{entry.entry_date.strftime('%Y-%m-%d')}"
+    def _store_entry_report(
+        self,
+        animal_id: int,
+        variables: ReportAnimalEntryVariables,
+        key: str | None = None,
+    ):
+        report = self.report_generator.build_animal_entry_report(variables)
+
+        filename = f"ingresso_{variables.animal_name}_"
+        f"{variables.entry_date.strftime('%Y-%m-%d')}"
 
         document_id = self.document_repository.new_document(
             NewDocument(
@@ -108,11 +194,12 @@ class AnimalService:
                 data=report,
                 mimetype="application/pdf",
                 is_uploaded=False,
-            )
+            ),
+            key=key,
         )
 
         self.animal_repository.new_document(
-            entry.animal_id,
+            animal_id,
             NewAnimalDocument(
                 document_id=document_id,
                 document_kind_code=DocKindCode.comunicazione_ingresso,
@@ -132,31 +219,74 @@ class AnimalService:
 
         self.generate_variation_report(animal_id)
 
-    def days_report(self, query: AnimalDaysQuery):
-        animal_days = self.animal_repository.count_animal_days(query)
+    def days_report(
+        self,
+        query: AnimalDaysQuery,
+        format: ReportFormat = ReportFormat.excel,
+    ):
+        """Return the filename and the report, as a temporary file"""
+        if query.group_by:
+            return self.report_generator.write_grouped_report(
+                "giorni",
+                "Giorni",
+                query,
+                self.animal_repository.group_animal_days(query),
+                format,
+            )
         filename, report = (
-            self.report_generator.generate_animal_days_count_report(
-                query, animal_days
+            self.report_generator.write_animal_days_count_report(
+                query, self.animal_repository.iter_animal_days(query), format
             )
         )
         return filename, report
 
-    def entries_report(self, query: AnimalEntriesQuery):
-        entries = self.animal_repository.count_animal_entries(query)
+    def occupancy_report(self, query: AnimalDaysQuery):
+        summary = summarize(
+            *self.animal_repository.get_entry_intervals(query),
+            from_date=query.from_date,
+            to_date=query.to_date,
+        )
+        filename, report = self.report_generator.generate_occupancy_report(
+            query, summary
+        )
+        return filename, report
 
-        filename, report = (
-            self.report_generator.generate_animal_entries_report(
-                query, entries
+    def entries_report(
+        self,
+        query: AnimalEntriesQuery,
+        format: ReportFormat = ReportFormat.excel,
+    ):
+        """Return the filename and the report, as a temporary file"""
+        if query.group_by:
+            return self.report_generator.write_grouped_report(
+                "ingressi",
+                "Ingressi",
+                query,
+                self.animal_repository.group_animal_entries(query),
+                format,
             )
+        filename, report = self.report_generator.write_animal_entries_report(
+            query, self.animal_repository.iter_animal_entries(query), format
         )
 
         return filename, report
 
-    def exits_report(self, query: AnimalExitsQuery):
-        entries = self.animal_repository.count_animal_exits(query)
-
-        filename, report = self.report_generator.generate_animal_exits_report(
-            query, entries
+    def exits_report(
+        self,
+        query: AnimalExitsQuery,
+        format: ReportFormat = ReportFormat.excel,
+    ):
+        """Return the filename and the report, as a temporary file"""
+        if query.group_by:
+            return self.report_generator.write_grouped_report(
+                "uscite",
+                "Uscite",
+                query,
+                self.animal_repository.group_animal_exits(query),
+                format,
+            )
+        filename, report = self.report_generator.write_animal_exits_report(
+            query, self.animal_repository.iter_animal_exits(query), format
         )
 
         return filename, report
@@ -169,6 +299,21 @@ class AnimalService:
         if temporary:
             variables.title = "DOCUMENTO DI ADOZIONE TEMPORANEA"
 
+        self._document(
+            DocumentTaskKind.temporary_adoption_report
+            if temporary
+            else DocumentTaskKind.adoption_report,
+            variables,
+            animal_id=animal_id,
+        )
+
+    def _store_adoption_report(
+        self,
+        animal_id: int,
+        variables: ReportAdoptionVariables,
+        temporary: bool = False,
+        key: str | None = None,
+    ):
         pdf = self.report_generator.build_adoption_report(variables)
 
         doc_title = (
@@ -184,7 +329,8 @@ class AnimalService:
                 data=pdf,
                 mimetype="application/pdf",
                 is_uploaded=False,
-            )
+            ),
+            key=key,
         )
 
         self.animal_repository.new_document(
@@ -204,27 +350,9 @@ class AnimalService:
             animal_id, confirmation_date, user_id
         )
 
-        pdf = self.report_generator.build_adoption_report(variables)
-
-        new_document_id = self.document_repository.new_document(
-            data=NewDocument(
-                storage_service=self.document_repository.selected_storage,
-                filename=f"adozione_{variables.animal.chip_code}.pdf",
-                data=pdf,
-                mimetype="application/pdf",
-                is_uploaded=False,
-            )
-        )
-
-        self.animal_repository.new_document(
-            animal_id=animal_id,
-            data=NewAnimalDocument(
-                document_id=new_document_id,
-                document_kind_code=DocKindCode.adozione,
-                title=f"Adozione {variables.animal.chip_code}",
-            ),
+        self._document(
+            DocumentTaskKind.adoption_report, variables, animal_id=animal_id
         )
-
         self.generate_variation_report(animal_id)
 
     def undo_temporary_adoption(
@@ -238,6 +366,16 @@ class AnimalService:
             animal_id=animal_id
         )
 
+        self._document(
+            DocumentTaskKind.variation_report, variables, animal_id=animal_id
+        )
+
+    def _store_variation_report(
+        self,
+        animal_id: int,
+        variables: ReportVariationVariables,
+        key: str | None = None,
+    ):
         pdf = self.report_generator.build_variation_report(variables)
 
         new_document_id = self.document_repository.new_document(
@@ -247,7 +385,8 @@ class AnimalService:
                 data=pdf,
                 mimetype="application/pdf",
                 is_uploaded=False,
-            )
+            ),
+            key=key,
         )
 
         self.animal_repository.new_document(
@@ -0,0 +1,207 @@
+"""
+Documents generated after the commit (outbox).
+
+With `settings.app.deferred_documents`, the animal service doesn't render
+the PDFs of exits, adoptions and entries inside the request transaction:
+it adds `document_task` rows in it and stages their ids in the session.
+When the session commits, the staged tasks are handed to `DocumentOutbox`
+worker threads, each task generating its documents in its own
+transaction, which also marks the task done. The template variables are
+taken when the task is created, so that the document shows the data of
+the request, not the data of when it runs.
+
+A task which fails is retried later, with an exponential delay, up to
+`settings.app.document_tasks_max_attempts` times. Due retries, and tasks
+lost by a process which stopped before running them, are picked up by a
+thread which polls the table. Tasks are taken with SKIP LOCKED, so that
+every process can run the poller. The file of an attempt which failed
+after storing it is deleted, since its document row is rolled back.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Callable
+from uuid import uuid4
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from hermadata.constants import (
+    DocumentTaskKind,
+    DocumentTaskStatus,
+    StorageType,
+)
+from hermadata.database.models import DocumentTask
+from hermadata.repositories.document_repository import StorageMap
+
+if TYPE_CHECKING:
+    from hermadata.services.animal_service import AnimalService
+
+logger = logging.getLogger(__name__)
+
+SESSION_INFO_KEY = "document_tasks"
+
+# pending, and not waiting for a retry
+IS_DUE = (
+    DocumentTask.status == DocumentTaskStatus.pending.value,
+    DocumentTask.next_attempt_at <= func.now(),
+)
+
+
+def stage_document_task(session: Session, task_id: int):
+    """Run the task when `session` commits"""
+    session.info.setdefault(SESSION_INFO_KEY, []).append(task_id)
+
+
+class DocumentOutbox:
+    def __init__(
+        self,
+        session_maker: Callable[[], sessionmaker],
+        animal_service_factory: Callable[[Session], "AnimalService"],
+        storage: StorageMap,
+        selected_storage: StorageType,
+        max_workers: int,
+        max_attempts: int,
+        retry_seconds: int,
+        poll_seconds: int,
+    ):
+        self.session_maker = session_maker
+        self.animal_service_factory = animal_service_factory
+        self.storage = storage
+        self.selected_storage = selected_storage
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.poll_seconds = poll_seconds
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._poller: Thread | None = None
+        self._stopped = Event()
+        self._lock = Lock()
+
+    def start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="document-task",
+            )
+            self._stopped.clear()
+            self._poller = Thread(
+                target=self._poll, name="document-task-poller", daemon=True
+            )
+            self._poller.start()
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+        logger.info("document outbox started")
+
+    def stop(self):
+        """Stop taking tasks and wait for the running ones"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            poller, self._poller = self._poller, None
+        if executor is None:
+            return
+        event.remove(Session, "after_commit", self._after_commit)
+        event.remove(Session, "after_soft_rollback", self._after_rollback)
+        self._stopped.set()
+        # the tasks not started yet are run again by the next poll
+        executor.shutdown(wait=True, cancel_futures=True)
+        poller.join()
+
+    def _after_commit(self, session: Session):
+        task_ids = session.info.pop(SESSION_INFO_KEY, None)
+        if task_ids:
+            self.submit(task_ids)
+
+    def _after_rollback(self, session: Session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop(SESSION_INFO_KEY, None)
+
+    def submit(self, task_ids: list[int]):
+        with self._lock:
+            if self._executor is None:
+                return
+            for task_id in task_ids:
+                self._executor.submit(self.run, task_id)
+
+    def _poll(self):
+        while not self._stopped.wait(self.poll_seconds):
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("document tasks poll failed")
+
+    def run_due(self, limit: int = 100) -> int:
+        """Run the pending tasks whose time has come, return how many"""
+        with self.session_maker()() as session:
+            task_ids = (
+                session.execute(
+                    select(DocumentTask.id)
+                    .where(*IS_DUE)
+                    .order_by(DocumentTask.next_attempt_at)
+                    .limit(limit)
+                )
+                .scalars()
+                .all()
+            )
+
+        return sum(self.run(task_id) for task_id in task_ids)
+
+    def run(self, task_id: int) -> bool:
+        """
+        Generate the documents of a task, if it's pending and not taken by
+        another thread or process. Return whether it was done.
+        """
+        with self.session_maker().begin() as session:
+            task = session.execute(
+                select(DocumentTask)
+                .where(DocumentTask.id == task_id, *IS_DUE)
+                .with_for_update(skip_locked=True)
+            ).scalar_one_or_none()
+            if task is None:
+                return False
+
+            task.attempts += 1
+            key = str(uuid4())
+            try:
+                # the task stays locked while its documents are generated
+                with session.begin_nested():
+                    service = self.animal_service_factory(session)
+                    service.generate_document(
+                        DocumentTaskKind(task.kind),
+                        animal_id=task.animal_id,
+                        variables=task.variables,
+                        key=key,
+                    )
+            except Exception as e:
+                logger.exception("document task %s failed", task_id)
+                self._delete_file(key)
+                self._retry_later(task, str(e) or repr(e))
+                return False
+
+            task.status = DocumentTaskStatus.done.value
+            task.done_at = func.now()
+
+        logger.info("document task %s done", task_id)
+        return True
+
+    def _delete_file(self, key: str):
+        try:
+            self.storage[self.selected_storage].delete_file(key)
+        except Exception:
+            logger.exception("cannot delete the document file %s", key)
+
+    def _retry_later(self, task: DocumentTask, error: str):
+        task.last_error = error[:255]
+        if task.attempts >= self.max_attempts:
+            task.status = DocumentTaskStatus.failed.value
+            logger.error("document task %s failed for good", task.id)
+            return
+
+        delay = self.retry_seconds * 2 ** (task.attempts - 1)
+        task.next_attempt_at = func.timestampadd(
+            text("SECOND"), delay, func.now()
+        )
@@ -0,0 +1,334 @@
+"""
+Reports generated in background.
+
+A job is a row of `report_job`: it is created committed before being
+queued, so that every worker process can see its status, and its result
+is put in the storage, like the documents. Each process runs its jobs in
+a bounded thread pool. Identical requests (same kind, format and query)
+made while a job is pending or running get that job, thanks to the
+unique `active_key` column, cleared when the job ends.
+
+A job of a process which died stays running: it stops blocking the
+identical requests after `settings.app.report_jobs_timeout_seconds`.
+"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from enum import Enum
+from threading import Lock
+from typing import BinaryIO, Callable
+from uuid import uuid4
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from hermadata.constants import ReportJobStatus, StorageType
+from hermadata.database.models import ReportJob
+from hermadata.reports.report_generator import MEDIA_TYPES, ReportFormat
+from hermadata.repositories.animal.models import (
+    AnimalDaysQuery,
+    AnimalEntriesQuery,
+    AnimalExitsQuery,
+)
+from hermadata.repositories.document_repository import StorageMap
+from hermadata.services.animal_service import AnimalService
+
+logger = logging.getLogger(__name__)
+
+
+class ReportKind(str, Enum):
+    days = "days"
+    entries = "entries"
+    exits = "exits"
+
+
+# AnimalService method generating each kind of report
+REPORT_METHODS: dict[ReportKind, str] = {
+    ReportKind.days: "days_report",
+    ReportKind.entries: "entries_report",
+    ReportKind.exits: "exits_report",
+}
+
+ReportQuery = AnimalDaysQuery | AnimalEntriesQuery | AnimalExitsQuery
+
+
+class ReportJobModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: ReportKind
+    format: ReportFormat
+    status: ReportJobStatus
+    filename: str | None = None
+    error: str | None = None
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class ReportJobQueueFull(Exception):
+    pass
+
+
+class ReportJobNotFound(Exception):
+    pass
+
+
+class ReportJobNotDone(Exception):
+    pass
+
+
+def job_key(kind: ReportKind, query: ReportQuery, format: ReportFormat):
+    data = json.dumps(
+        [kind.value, format.name, query.model_dump(mode="json")],
+        sort_keys=True,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class ReportJobService:
+    def __init__(
+        self,
+        session_maker: Callable[[], sessionmaker],
+        read_session_maker: Callable[[], sessionmaker],
+        animal_service_factory: Callable[[Session], AnimalService],
+        storage: StorageMap,
+        selected_storage: StorageType,
+        max_workers: int,
+        max_pending: int,
+        timeout_seconds: int,
+    ):
+        # session makers are resolved on use: the engines are created
+        # by the application lifespan
+        self.session_maker = session_maker
+        self.read_session_maker = read_session_maker
+        self.animal_service_factory = animal_service_factory
+        self.storage = storage
+        self.selected_storage = selected_storage
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._futures: dict[int, Future] = {}
+        self._lock = Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="report-job",
+                )
+            return self._executor
+
+    def submit(
+        self,
+        kind: ReportKind,
+        query: ReportQuery,
+        format: ReportFormat,
+        user_id: int | None = None,
+    ) -> ReportJobModel:
+        """
+        Queue the report, or return the pending or running job of an
+        identical request.
+        """
+        key = job_key(kind, query, format)
+        SessionMaker = self.session_maker()
+
+        with SessionMaker.begin() as session:
+            existing = self._get_active(session, key)
+            if existing is not None:
+                return existing
+        with self._lock:
+            pending = len(self._futures)
+        if pending >= self.max_pending:
+            raise ReportJobQueueFull()
+
+        try:
+            with SessionMaker.begin() as session:
+                job = ReportJob(
+                    kind=kind.value,
+                    format=format.value,
+                    query=query.model_dump(mode="json"),
+                    status=ReportJobStatus.pending.value,
+                    active_key=key,
+                    created_by=user_id,
+                )
+                session.add(job)
+                session.flush()
+                session.refresh(job)
+                result = ReportJobModel.model_validate(job)
+        except IntegrityError:
+            # queued by another request in the meantime, on the unique
+            # active_key; any other integrity error is raised
+            with SessionMaker.begin() as session:
+                existing = self._get_active(session, key)
+            if existing is None:
+                raise
+            return existing
+
+        executor = self.executor
+        with self._lock:
+            self._futures[result.id] = executor.submit(
+                self._run, result.id, kind, query, format
+            )
+        logger.info("report job %s queued: %s %s", result.id, kind, format)
+
+        return result
+
+    def _get_active(self, session: Session, key: str) -> ReportJobModel | None:
+        row = session.execute(
+            select(
+                ReportJob,
+                func.timestampdiff(
+                    text("SECOND"), ReportJob.created_at, func.now()
+                ),
+            ).where(ReportJob.active_key == key)
+        ).one_or_none()
+        if row is None:
+            return None
+
+        job, age = row
+        if age > self.timeout_seconds:
+            logger.warning("report job %s timed out", job.id)
+            self._finish(
+                session, job.id, ReportJobStatus.failed, error="timed out"
+            )
+            return None
+
+        return ReportJobModel.model_validate(job)
+
+    def _finish(
+        self, session: Session, job_id: int, status: ReportJobStatus, **values
+    ):
+        session.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job_id)
+            .values(
+                status=status.value,
+                active_key=None,
+                finished_at=func.now(),
+                **values,
+            )
+        )
+
+    def _run(
+        self,
+        job_id: int,
+        kind: ReportKind,
+        query: ReportQuery,
+        format: ReportFormat,
+    ):
+        SessionMaker = self.session_maker()
+        try:
+            with SessionMaker.begin() as session:
+                session.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == job_id)
+                    .values(
+                        status=ReportJobStatus.running.value,
+                        started_at=func.now(),
+                    )
+                )
+
+            with self.read_session_maker()() as read_session:
+                service = self.animal_service_factory(read_session)
+                filename, report = getattr(service, REPORT_METHODS[kind])(
+                    query, format
+                )
+            key = str(uuid4())
+            with report:
+                self.storage[self.selected_storage].store_fileobj(key, report)
+        except Exception as e:
+            logger.exception("report job %s failed", job_id)
+            with SessionMaker.begin() as session:
+                self._finish(
+                    session,
+                    job_id,
+                    ReportJobStatus.failed,
+                    error=(str(e) or repr(e))[:255],
+                )
+        else:
+            with SessionMaker.begin() as session:
+                self._finish(
+                    session,
+                    job_id,
+                    ReportJobStatus.done,
+                    storage_service=self.selected_storage.value,
+                    key=key,
+                    filename=filename,
+                )
+            logger.info("report job %s done", job_id)
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+
+    def get(self, job_id: int) -> ReportJobModel:
+        with self.session_maker()() as session:
+            job = session.get(ReportJob, job_id)
+            if job is None:
+                raise ReportJobNotFound()
+            return ReportJobModel.model_validate(job)
+
+    def get_result(self, job_id: int) -> tuple[str, str, BinaryIO]:
+        """
+        Return filename, media type and content of a done job, as a file
+        to read and close
+        """
+        with self.session_maker()() as session:
+            job = session.get(ReportJob, job_id)
+            if job is None:
+                raise ReportJobNotFound()
+            if job.status != ReportJobStatus.done.value:
+                raise ReportJobNotDone()
+            storage = self.storage[StorageType(job.storage_service)]
+            content = storage.open_file(job.key)
+            if content is None:
+                raise ReportJobNotFound()
+
+            return (
+                job.filename,
+                MEDIA_TYPES[ReportFormat(job.format)],
+                content,
+            )
+
+    def wait(self, job_id: int, timeout: float | None = None):
+        """Wait for a job queued by this process to end"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout)
+
+    def shutdown(self):
+        """
+        Wait for the running jobs and mark the ones not started yet as
+        failed, so that identical requests don't wait for them.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            cancelled = [
+                job_id
+                for job_id, future in self._futures.items()
+                if future.cancel()
+            ]
+            for job_id in cancelled:
+                del self._futures[job_id]
+        if executor is None:
+            return
+        executor.shutdown(wait=True)
+        if cancelled:
+            with self.session_maker().begin() as session:
+                for job_id in cancelled:
+                    self._finish(
+                        session,
+                        job_id,
+                        ReportJobStatus.failed,
+                        error="interrupted",
+                    )
@@ -10,8 +10,31 @@ ENV_PATH = os.getenv("ENV_PATH")
 
 class DBSettings(BaseSettings):
     url: str
+    # read replica url: when set, read-only queries are routed to it
+    replica_url: str | None = None
+    # after a write, the client reads from the primary for this long
+    read_primary_after_write_seconds: int = 10
+    # serve the hottest read endpoints from an asyncio (aiomysql) engine
+    async_enabled: bool = False
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: int = 30
+    pool_pre_ping: bool = True
     pool_recycle: int = 3600
 
+    def engine_options(self) -> dict:
+        """Options to pass as is to `create_engine`"""
+        return self.model_dump(
+            include={
+                "pool_size",
+                "max_overflow",
+                "pool_timeout",
+                "pool_pre_ping",
+                "pool_recycle",
+            }
+        )
+
 
 class S3StorageSettings(BaseSettings):
     bucket: str
@@ -37,6 +60,45 @@ class AppSettings(BaseSettings):
     preferred_provinces: list[str] | None = None
     preferred_cities: list[str] | None = None
     timezone: str = "UTC"
+    # how long an estimated search total is reused
+    search_total_cache_seconds: int = 60
+    # the animal suggest index is reloaded when older than this, to get
+    # the changes made by the other worker processes
+    suggest_index_max_age_seconds: int = 300
+    # background report jobs: reports generated at the same time by each
+    # worker process, and jobs accepted before refusing new ones
+    report_jobs_max_workers: int = 2
+    report_jobs_max_pending: int = 20
+    # a pending or running job older than this is considered lost
+    report_jobs_timeout_seconds: int = 3600
+    # generate the documents of exits, adoptions and entries after the
+    # commit, in background, instead of inside the request transaction
+    deferred_documents: bool = False
+    document_tasks_max_workers: int = 1
+    document_tasks_max_attempts: int = 5
+    # delay before the first retry, doubled at each attempt
+    document_tasks_retry_seconds: int = 30
+    # how often the due retries and the lost tasks are looked for
+    document_tasks_poll_seconds: int = 60
+
+
+class ReportSettings(BaseSettings):
+    # worker processes rendering the PDF reports; with 0 they're
+    # rendered in the request thread
+    render_workers: int = 0
+    # how long a request waits for a PDF rendered by the pool
+    render_timeout_seconds: int = 60
+    # rendered PDFs kept by content in the selected storage, evicting the
+    # least recently used; with 0 every PDF is rendered
+    pdf_cache_max_bytes: int = 0
+    # cached PDFs not used for this long are deleted: they contain the
+    # date of the document, so they're not served on the next days
+    pdf_cache_max_age_seconds: int = 86400
+    # how often the cached PDFs are listed from the storage
+    pdf_cache_sync_seconds: int = 300
+    # directory of the compiled Jinja templates, by default one in the
+    # system temporary directory
+    template_cache_dir: str | None = None
 
 
 class Settings(BaseSettings):
@@ -45,6 +107,7 @@ class Settings(BaseSettings):
     storage: StorageSettings
     auth: AuthSettings
     app: AppSettings = Field(default_factory=AppSettings)
+    report: ReportSettings = Field(default_factory=ReportSettings)
     model_config = SettingsConfigDict(
         env_file=ENV_PATH,
         env_file_encoding="utf-8",
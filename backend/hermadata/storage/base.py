@@ -1,4 +1,12 @@
 from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+
+class StoredFile(NamedTuple):
+    key: str
+    size: int
+    # timestamp of the last write
+    modified: float
 
 
 class StorageInterface(ABC):
@@ -6,10 +14,19 @@ class StorageInterface(ABC):
     def store_file(self, file_name, content):
         pass
 
+    @abstractmethod
+    def store_fileobj(self, file_name, fileobj):
+        pass
+
     @abstractmethod
     def retrieve_file(self, key: str):
         pass
 
+    @abstractmethod
+    def open_file(self, key: str):
+        """The file to read in chunks, None if it doesn't exist"""
+        pass
+
     @abstractmethod
     def delete_file(self, key: str):
         pass
@@ -18,6 +35,10 @@ class StorageInterface(ABC):
     def list_files(self):
         pass
 
+    @abstractmethod
+    def list_stored_files(self, prefix: str) -> list[StoredFile]:
+        pass
+
     @abstractmethod
     def clear_storage(self):
         pass
@@ -2,7 +2,7 @@ import logging
 import os
 import shutil
 
-from hermadata.storage.base import StorageInterface
+from hermadata.storage.base import StorageInterface, StoredFile
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +17,12 @@ class DiskStorage(StorageInterface):
             file.write(content)
         logger.debug(f"File '{file_name}' stored at '{file_path}'.")
 
+    def store_fileobj(self, file_name, fileobj):
+        file_path = os.path.join(self.base_path, file_name)
+        with open(file_path, "wb") as file:
+            shutil.copyfileobj(fileobj, file)
+        logger.debug(f"File '{file_name}' stored at '{file_path}'.")
+
     def retrieve_file(self, key):
         file_path = os.path.join(self.base_path, key)
         if os.path.exists(file_path):
@@ -28,6 +34,14 @@ class DiskStorage(StorageInterface):
             logger.warning(f"File '{key}' not found.")
             return None
 
+    def open_file(self, key):
+        file_path = os.path.join(self.base_path, key)
+        try:
+            return open(file_path, "rb")
+        except FileNotFoundError:
+            logger.warning(f"File '{key}' not found.")
+            return None
+
     def delete_file(self, file_name):
         file_path = os.path.join(self.base_path, file_name)
         if os.path.exists(file_path):
@@ -41,6 +55,17 @@ class DiskStorage(StorageInterface):
         print(f"Files in storage: {files}")
         return files
 
+    def list_stored_files(self, prefix):
+        files = []
+        with os.scandir(self.base_path) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.is_file():
+                    stat = entry.stat()
+                    files.append(
+                        StoredFile(entry.name, stat.st_size, stat.st_mtime)
+                    )
+        return files
+
     def clear_storage(self):
         shutil.rmtree(self.base_path)
         os.makedirs(self.base_path)
@@ -3,7 +3,7 @@ import logging
 import boto3
 from botocore.exceptions import ClientError
 
-from hermadata.storage.base import StorageInterface
+from hermadata.storage.base import StorageInterface, StoredFile
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +25,17 @@ class S3Storage(StorageInterface):
             logger.error(f"Failed to store file '{file_name}': {e}")
             raise e
 
+    def store_fileobj(self, file_name, fileobj):
+        try:
+            # multipart upload, in chunks
+            self.s3.upload_fileobj(fileobj, self.bucket_name, file_name)
+            logger.info(
+                f"File '{file_name}' stored in S3 bucket '{self.bucket_name}'."
+            )
+        except ClientError as e:
+            logger.error(f"Failed to store file '{file_name}': {e}")
+            raise e
+
     def retrieve_file(self, file_name):
         try:
             response = self.s3.get_object(
@@ -46,6 +57,23 @@ class S3Storage(StorageInterface):
             logger.error(f"Failed to retrieve file '{file_name}': {e}")
             return None
 
+    def open_file(self, file_name):
+        try:
+            response = self.s3.get_object(
+                Bucket=self.bucket_name, Key=file_name
+            )
+            # read from the connection as it's consumed
+            return response["Body"]
+        except self.s3.exceptions.NoSuchKey:
+            logger.warning(
+                f"File '{file_name}' not found in S3 bucket "
+                f"'{self.bucket_name}'."
+            )
+            return None
+        except ClientError as e:
+            logger.error(f"Failed to open file '{file_name}': {e}")
+            return None
+
     def delete_file(self, file_name):
         try:
             self.s3.delete_object(Bucket=self.bucket_name, Key=file_name)
@@ -70,6 +98,28 @@ class S3Storage(StorageInterface):
             )
             return []
 
+    def list_stored_files(self, prefix):
+        try:
+            files = []
+            paginator = self.s3.get_paginator("list_objects_v2")
+            for page in paginator.paginate(
+                Bucket=self.bucket_name, Prefix=prefix
+            ):
+                files.extend(
+                    StoredFile(
+                        obj["Key"],
+                        obj["Size"],
+                        obj["LastModified"].timestamp(),
+                    )
+                    for obj in page.get("Contents", [])
+                )
+            return files
+        except ClientError as e:
+            logger.error(
+                f"Failed to list files in bucket '{self.bucket_name}': {e}"
+            )
+            return []
+
     def clear_storage(self):
         try:
             objects = self.s3.list_objects_v2(Bucket=self.bucket_name).get(
@@ -1,3 +1,7 @@
+import time
+from threading import Lock
+from typing import Any, BinaryIO, Hashable, Iterator
+
 from sqlalchemy import Interval, func
 
 from hermadata.constants import RecurrenceType
@@ -14,3 +18,45 @@ def recurrence_to_sql_interval(type_: RecurrenceType, amount: int) -> Interval:
     return func.interval(
         f"{amount} {INTERVAL_MAP[type_] + ('s' if amount > 1 else '')}"
     )
+
+
+class TTLCache:
+    """
+    Thread safe mapping whose entries expire `ttl` seconds after they are
+    set. When full, the oldest entry is dropped.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.max_size:
+                del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def iter_file(fp: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Read a file in chunks, then close it"""
+    with fp:
+        while chunk := fp.read(chunk_size):
+            yield chunk
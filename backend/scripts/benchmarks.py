@@ -0,0 +1,159 @@
+"""
+Benchmarks on random data.
+
+    intervals:       the vectorized interval computations against the
+                     per-entry Python loop the animal days report used
+    report-formats:  generation time and size of the exits report in
+                     every tabular format
+    render-cache:    PDF render time of a document with and without the
+                     render cache
+
+Usage:
+    python -m scripts.benchmarks intervals [--entries 50000]
+    python -m scripts.benchmarks report-formats [--rows 100000]
+    python -m scripts.benchmarks render-cache
+
+from the backend directory: the per-entry loop and the random entries
+are the ones of the tests (`tests/utils.py`).
+"""
+
+import argparse
+import random
+import timeit
+from datetime import date, timedelta
+
+from hermadata.reports.intervals import summarize
+from tests.utils import count_days_loop, random_entries
+
+FROM_DATE = date(2020, 1, 1)
+TO_DATE = date(2024, 12, 31)
+
+
+def benchmark_intervals(args):
+    random.seed(0)
+    data = random_entries(args.entries, args.animals, FROM_DATE, TO_DATE)
+
+    expected = count_days_loop(*data, FROM_DATE, TO_DATE)
+    summary = summarize(*data, FROM_DATE, TO_DATE)
+    assert (
+        dict(
+            zip(
+                summary.animal_ids.tolist(),
+                summary.animal_days.tolist(),
+                strict=True,
+            )
+        )
+        == expected
+    )
+
+    for name, run in (
+        ("loop", lambda: count_days_loop(*data, FROM_DATE, TO_DATE)),
+        ("numpy", lambda: summarize(*data, FROM_DATE, TO_DATE)),
+    ):
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f"{name:>8}: {best * 1000:8.1f} ms")
+
+
+def benchmark_report_formats(args):
+    # the report generator loads weasyprint, only needed here
+    from hermadata.reports.report_generator import (
+        EXIT_TYPE_LABELS,
+        MEDIA_TYPES,
+        ReportGenerator,
+    )
+    from hermadata.repositories.animal.models import (
+        AnimalExitsItem,
+        AnimalExitsQuery,
+    )
+
+    random.seed(0)
+    query = AnimalExitsQuery(
+        from_date=FROM_DATE, to_date=TO_DATE, city_code="H501"
+    )
+    items = [
+        AnimalExitsItem(
+            animal_race=random.choice(["Cane", "Gatto"]),
+            animal_name=f"animal {i}",
+            animal_chip_code=f"380.260.{i:09d}",
+            animal_birth_date=FROM_DATE - timedelta(random.randint(0, 5000)),
+            animal_sex=random.choice(["M", "F"]),
+            exit_date=FROM_DATE + timedelta(random.randint(0, 1800)),
+            exit_type=random.choice(list(EXIT_TYPE_LABELS)),
+        )
+        for i in range(args.rows)
+    ]
+    generator = ReportGenerator(jinja_env=None)
+
+    for format in MEDIA_TYPES:
+        size = 0
+
+        def run(format=format):
+            nonlocal size
+            _, fp = generator.write_animal_exits_report(query, items, format)
+            with fp:
+                size = len(fp.read())
+
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(
+            f"{format.name:>8}: {best * 1000:8.1f} ms {size / 1024:10.1f} KiB"
+        )
+
+
+def benchmark_render_cache(args):
+    # weasyprint, only needed here
+    import os
+
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    from hermadata.reports import render_pool
+    from hermadata.reports.render_pool import RenderCache
+    from hermadata.reports.report_generator import ReportAnimalEntryVariables
+
+    jinja_env = Environment(
+        loader=FileSystemLoader(
+            os.path.join(os.path.dirname(render_pool.__file__), "templates")
+        ),
+        autoescape=select_autoescape(),
+    )
+    html = jinja_env.get_template("animal_entry.jinja").render(
+        **ReportAnimalEntryVariables(
+            city="Test",
+            animal_name="Gino",
+            animal_type="Gatto",
+            entry_date=FROM_DATE,
+        ).model_dump()
+    )
+    render_cache = RenderCache()
+    render_cache.render(html)
+
+    for name, run in (
+        ("uncached", lambda: RenderCache().render(html)),
+        ("cached", lambda: render_cache.render(html)),
+    ):
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f"{name:>8}: {best * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks on random data")
+    parser.add_argument("--repeat", type=int, default=5)
+    subparsers = parser.add_subparsers(required=True)
+
+    intervals = subparsers.add_parser("intervals")
+    intervals.add_argument("--entries", type=int, default=50000)
+    intervals.add_argument("--animals", type=int, default=5000)
+    intervals.set_defaults(run=benchmark_intervals)
+
+    report_formats = subparsers.add_parser("report-formats")
+    report_formats.add_argument("--rows", type=int, default=100000)
+    report_formats.set_defaults(run=benchmark_report_formats)
+
+    render_cache = subparsers.add_parser("render-cache")
+    render_cache.set_defaults(run=benchmark_render_cache)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,10 @@
 import os
 
-from sqlalchemy import create_engine, select, update
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select, update
 
 from hermadata.constants import StorageType
 from hermadata.database.models import Document
-from hermadata.dependancies import get_s3_storage
+from hermadata.dependancies import get_s3_storage, get_session_maker
 from hermadata.settings import settings
 
 
@@ -13,7 +12,7 @@ def upload_pdfs_to_s3():
     directory_path = settings.storage.disk.base_path
     # Create an instance of the S3Storage class
     s3_storage = get_s3_storage()
-    db_session = sessionmaker(create_engine(**settings.db.model_dump()))
+    db_session = get_session_maker()
 
     with db_session() as session:
         keys = session.execute(
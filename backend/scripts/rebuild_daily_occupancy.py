@@ -0,0 +1,34 @@
+"""
+Regenerate the daily_occupancy table from the animal entries.
+
+Usage:
+    ENV_PATH=.dev.env python scripts/rebuild_daily_occupancy.py
+"""
+
+import argparse
+
+from hermadata.dependancies import get_session_maker
+from hermadata.repositories.animal.occupancy import rebuild_daily_occupancy
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Regenerate the daily_occupancy table."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of animal entries read at a time (default: 1000)",
+    )
+    args = parser.parse_args()
+
+    Session = get_session_maker()
+    with Session.begin() as session:
+        days = rebuild_daily_occupancy(session, batch_size=args.batch_size)
+
+    print(f"daily_occupancy rebuilt: {days} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,67 @@
 """
-Render a PDF report from the database.
+Render PDF reports from the database.
 
 Usage:
     ENV_PATH=.dev.env python scripts/render_report.py <report_type> <entry_id> [output_path]
+    ENV_PATH=.dev.env python scripts/render_report.py <report_type>
+        (--ids <ids> | --from-date <date> --to-date <date>) [batch options]
 
 Arguments:
     report_type: variation | adoption | animal_entry | chip_assignment | custody
     entry_id:    the animal entry ID to retrieve data for
     output_path: optional output file path (default: <report_type>_<entry_id>.pdf)
 
+Batch options:
+    --ids:        comma separated entry IDs, or @file with one ID per line
+    --from-date, --to-date:
+                  the entries which began (animal_entry, chip_assignment) or
+                  ended (variation, adoption, custody) in the period
+    --city-code:  only the entries from a city
+    --workers:    worker processes (default: the number of CPUs)
+    --output-dir: directory of the files (default: current directory)
+    --storage:    put the files in the selected storage instead, with keys
+                  <report_type>_<entry_id>.pdf
+
+Each worker process opens its own database pool and keeps one
+ReportGenerator, so WeasyPrint and the stylesheets are loaded once per
+worker. The throughput is printed at the end.
+
 Examples:
     ENV_PATH=.dev.env python scripts/render_report.py variation 42
     ENV_PATH=.dev.env python scripts/render_report.py adoption 42 output.pdf
+    ENV_PATH=.dev.env python scripts/render_report.py adoption
+        --from-date 2025-01-01 --to-date 2025-12-31 --output-dir out
 """
 
 import argparse
+import multiprocessing
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
 
-from sqlalchemy import and_, create_engine, select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
 
+from hermadata.constants import ExitType, StorageType
 from hermadata.database.models import Animal, AnimalEntry
-from hermadata.dependancies import get_jinja_env
+from hermadata.dependancies import (
+    dispose_db,
+    get_disk_storage,
+    get_jinja_env,
+    get_s3_storage,
+    get_session_maker,
+)
 from hermadata.reports.report_generator import (
     ReportAnimalEntryVariables,
     ReportChipAssignmentVariables,
     ReportCustodyVariables,
     ReportGenerator,
 )
-from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
+from hermadata.repositories.animal.animal_repository import (
+    ADOPTER_EXIT_TYPES,
+    SQLAnimalRepository,
+)
 from hermadata.settings import settings
 
 REPORT_TYPES = [
@@ -40,6 +72,26 @@ REPORT_TYPES = [
     "custody",
 ]
 
+# repository method loading the variables of many animals in one
+# statement, and generator method rendering them
+BATCH_VARIABLES = {
+    "variation": (
+        "get_variation_report_variables_batch",
+        "build_variation_report",
+    ),
+    "adoption": (
+        "get_adoption_report_variables_batch",
+        "build_adoption_report",
+    ),
+}
+
+# the batch selects these reports by exit date, the others by entry date
+EXIT_REPORT_TYPES = {
+    "variation": None,
+    "adoption": ADOPTER_EXIT_TYPES,
+    "custody": [ExitType.custody],
+}
+
 
 def get_animal_id_from_entry(session, entry_id: int) -> int:
     animal_id = session.execute(
@@ -86,10 +138,7 @@ def render_custody(session, rg, animal_id):
         select(Animal.name, Animal.chip_code, AnimalEntry.exit_date)
         .join(
             AnimalEntry,
-            and_(
-                AnimalEntry.animal_id == Animal.id,
-                AnimalEntry.current.is_(True),
-            ),
+            AnimalEntry.id == Animal.current_entry_id,
         )
         .where(Animal.id == animal_id)
     ).one()
@@ -101,32 +150,199 @@ def render_custody(session, rg, animal_id):
     return rg.build_custody_report(variables)
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Render a PDF report from the database."
+def render(session, repo, rg, report_type: str, entry_id: int) -> bytes:
+    if report_type == "animal_entry":
+        return render_animal_entry(repo, rg, entry_id)
+
+    animal_id = get_animal_id_from_entry(session, entry_id)
+    if report_type == "variation":
+        return render_variation(repo, rg, animal_id)
+    if report_type == "adoption":
+        return render_adoption(repo, rg, animal_id)
+    if report_type == "chip_assignment":
+        return render_chip_assignment(session, rg, animal_id)
+    if report_type == "custody":
+        return render_custody(session, rg, animal_id)
+    raise ValueError(f"unknown report type {report_type}")
+
+
+def load_batch_variables(
+    session, repo, report_type: str, entry_ids: list[int]
+) -> dict:
+    """
+    Variables of the reports of the entries, loaded together when the
+    report type allows it. The missing entries are rendered one by one.
+    """
+    if report_type not in BATCH_VARIABLES:
+        return {}
+
+    animal_ids = dict(
+        session.execute(
+            select(AnimalEntry.id, AnimalEntry.animal_id).where(
+                AnimalEntry.id.in_(entry_ids)
+            )
+        ).all()
     )
-    parser.add_argument(
-        "report_type",
-        choices=REPORT_TYPES,
-        help="Type of report to generate",
+    method, _ = BATCH_VARIABLES[report_type]
+    variables = getattr(repo, method)(list(set(animal_ids.values())))
+
+    return {
+        entry_id: variables[animal_id]
+        for entry_id, animal_id in animal_ids.items()
+        if animal_id in variables
+    }
+
+
+def select_entry_ids(
+    session,
+    report_type: str,
+    from_date: date | None,
+    to_date: date | None,
+    city_code: str | None,
+) -> list[int]:
+    stmt = select(AnimalEntry.id).order_by(AnimalEntry.id)
+    if report_type in EXIT_REPORT_TYPES:
+        column = AnimalEntry.exit_date
+        stmt = stmt.where(AnimalEntry.exit_date.is_not(None))
+        exit_types = EXIT_REPORT_TYPES[report_type]
+        if exit_types:
+            stmt = stmt.where(AnimalEntry.exit_type.in_(exit_types))
+    else:
+        column = AnimalEntry.entry_date
+    if from_date:
+        stmt = stmt.where(column >= from_date)
+    if to_date:
+        stmt = stmt.where(column <= to_date)
+    if city_code:
+        stmt = stmt.where(AnimalEntry.origin_city_code == city_code)
+
+    return list(session.execute(stmt).scalars())
+
+
+def parse_ids(value: str) -> list[int]:
+    if value.startswith("@"):
+        with open(value[1:]) as f:
+            return [int(line) for line in f if line.strip()]
+    return [int(i) for i in value.split(",") if i.strip()]
+
+
+# state of a batch worker process
+_worker: dict = {}
+
+
+def _init_worker(report_type: str, output_dir: str | None, storage: bool):
+    _worker["session_maker"] = get_session_maker()
+    _worker["rg"] = ReportGenerator(get_jinja_env())
+    _worker["repo"] = SQLAnimalRepository()
+    _worker["report_type"] = report_type
+    _worker["output_dir"] = output_dir
+    _worker["storage"] = (
+        {
+            StorageType.disk: get_disk_storage,
+            StorageType.aws_s3: get_s3_storage,
+        }[settings.storage.selected]()
+        if storage
+        else None
     )
-    parser.add_argument(
-        "entry_id",
-        type=int,
-        help="Animal entry ID to retrieve data for",
+
+
+def _render_batch(entry_ids: list[int]) -> list[tuple[int, int, str | None]]:
+    """Render and write the reports, return id, size and error of each"""
+    report_type = _worker["report_type"]
+    repo = _worker["repo"]
+    rg = _worker["rg"]
+    results = []
+    with _worker["session_maker"]() as session:
+        repo(session)
+        try:
+            variables = load_batch_variables(
+                session, repo, report_type, entry_ids
+            )
+        except Exception:
+            # one by one, to find the failing ones
+            session.rollback()
+            variables = {}
+        for entry_id in entry_ids:
+            filename = f"{report_type}_{entry_id}.pdf"
+            try:
+                if entry_id in variables:
+                    _, build = BATCH_VARIABLES[report_type]
+                    pdf = getattr(rg, build)(variables[entry_id])
+                else:
+                    pdf = render(session, repo, rg, report_type, entry_id)
+                if _worker["storage"] is not None:
+                    _worker["storage"].store_file(filename, pdf)
+                else:
+                    path = os.path.join(_worker["output_dir"], filename)
+                    with open(path, "wb") as f:
+                        f.write(pdf)
+            except Exception as e:
+                session.rollback()
+                results.append((entry_id, 0, str(e) or repr(e)))
+            else:
+                results.append((entry_id, len(pdf), None))
+
+    return results
+
+
+def run_batch(args, entry_ids: list[int]) -> int:
+    """Render the reports of `entry_ids`, return the number of failures"""
+    if not args.storage:
+        os.makedirs(args.output_dir, exist_ok=True)
+    workers = min(args.workers, len(entry_ids)) or 1
+    chunks = [
+        entry_ids[i : i + args.chunk_size]
+        for i in range(0, len(entry_ids), args.chunk_size)
+    ]
+    print(
+        f"Rendering {len(entry_ids)} {args.report_type} reports "
+        f"with {workers} workers"
     )
-    parser.add_argument(
-        "output_path",
-        nargs="?",
-        default=None,
-        help="Output file path (default: <report_type>_<entry_id>.pdf)",
+
+    done = failed = size = 0
+    start = time.perf_counter()
+    # spawned, not forked, like the render pool of the server
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.report_type, args.output_dir, args.storage),
+    ) as executor:
+        for results in executor.map(_render_batch, chunks):
+            for entry_id, pdf_size, error in results:
+                if error is None:
+                    done += 1
+                    size += pdf_size
+                else:
+                    failed += 1
+                    print(f"Entry {entry_id} failed: {error}", file=sys.stderr)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{done + failed}/{len(entry_ids)} "
+                f"({done / elapsed:.1f} docs/s)",
+                end="\r",
+                flush=True,
+            )
+
+    elapsed = time.perf_counter() - start
+    destination = (
+        f"{settings.storage.selected.value} storage"
+        if args.storage
+        else args.output_dir
     )
-    args = parser.parse_args()
+    print(
+        f"\n{done} reports saved to {destination} in {elapsed:.1f}s: "
+        f"{done / elapsed:.1f} docs/s, {size / elapsed / 2**20:.2f} MiB/s, "
+        f"{failed} failed"
+    )
+
+    return failed
 
+
+def run_single(args):
     output_path = args.output_path or f"{args.report_type}_{args.entry_id}.pdf"
 
-    engine = create_engine(**settings.db.model_dump())
-    Session = sessionmaker(engine)
+    Session = get_session_maker()
     session = Session()
 
     repo = SQLAnimalRepository()
@@ -135,19 +351,7 @@ def main():
     rg = ReportGenerator(get_jinja_env())
 
     try:
-        if args.report_type == "animal_entry":
-            pdf = render_animal_entry(repo, rg, args.entry_id)
-        else:
-            animal_id = get_animal_id_from_entry(session, args.entry_id)
-
-            if args.report_type == "variation":
-                pdf = render_variation(repo, rg, animal_id)
-            elif args.report_type == "adoption":
-                pdf = render_adoption(repo, rg, animal_id)
-            elif args.report_type == "chip_assignment":
-                pdf = render_chip_assignment(session, rg, animal_id)
-            elif args.report_type == "custody":
-                pdf = render_custody(session, rg, animal_id)
+        pdf = render(session, repo, rg, args.report_type, args.entry_id)
     except Exception as e:
         print(f"Error generating report: {e}", file=sys.stderr)
         session.close()
@@ -161,5 +365,80 @@ def main():
     print(f"Report saved to {output_path} ({len(pdf)} bytes)")
 
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render PDF reports from the database."
+    )
+    parser.add_argument(
+        "report_type",
+        choices=REPORT_TYPES,
+        help="Type of report to generate",
+    )
+    parser.add_argument(
+        "entry_id",
+        type=int,
+        nargs="?",
+        default=None,
+        help="Animal entry ID to retrieve data for",
+    )
+    parser.add_argument(
+        "output_path",
+        nargs="?",
+        default=None,
+        help="Output file path (default: <report_type>_<entry_id>.pdf)",
+    )
+    batch = parser.add_argument_group("batch")
+    batch.add_argument(
+        "--ids",
+        type=parse_ids,
+        help="Comma separated entry IDs, or @file with one ID per line",
+    )
+    batch.add_argument("--from-date", type=date.fromisoformat)
+    batch.add_argument("--to-date", type=date.fromisoformat)
+    batch.add_argument("--city-code")
+    batch.add_argument("--workers", type=int, default=os.cpu_count())
+    batch.add_argument(
+        "--chunk-size",
+        type=int,
+        default=20,
+        help="Reports rendered by a worker in one session",
+    )
+    output = batch.add_mutually_exclusive_group()
+    output.add_argument("--output-dir", default=".")
+    output.add_argument(
+        "--storage",
+        action="store_true",
+        help="Put the reports in the selected storage",
+    )
+    args = parser.parse_args()
+
+    if args.entry_id is not None:
+        run_single(args)
+        return
+
+    if args.ids is not None:
+        entry_ids = args.ids
+    elif args.from_date or args.to_date or args.city_code:
+        with get_session_maker()() as session:
+            entry_ids = select_entry_ids(
+                session,
+                args.report_type,
+                args.from_date,
+                args.to_date,
+                args.city_code,
+            )
+        # the workers open their own connections
+        dispose_db()
+    else:
+        parser.error("give an entry_id, --ids or a date range")
+
+    if not entry_ids:
+        print("No entries to render")
+        return
+
+    if run_batch(args, entry_ids):
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
@@ -10,7 +10,15 @@ from alembic import command
 from alembic.config import Config
 from fastapi.testclient import TestClient
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from sqlalchemy import Engine, create_engine, delete, insert, select, text
+from sqlalchemy import (
+    Engine,
+    create_engine,
+    delete,
+    insert,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.orm import Session, sessionmaker
 
 from hermadata import __version__
@@ -24,7 +32,9 @@ from hermadata.database.models import (
     AnimalEntry,
     AnimalLog,
     Breed,
+    DailyOccupancy,
     Document,
+    DocumentTask,
     FurColor,
     MedicalActivity,
     MedicalActivityRecord,
@@ -56,6 +66,7 @@ from hermadata.repositories.structure_repository import SQLStructureRepository
 from hermadata.repositories.activity_repository import SQLActivityRepository
 from hermadata.services.adopter_service import AdopterService
 from hermadata.services.animal_service import AnimalService
+from hermadata.services.report_job_service import ReportJobService
 from hermadata.services.user_service import RegisterUserModel, UserService
 from hermadata.storage.disk_storage import DiskStorage
 from tests.utils import random_chip_code
@@ -75,6 +86,9 @@ TABLES = [
     "fur_color",
     "animal",
     "structure",
+    "report_job",
+    "document_task",
+    "daily_occupancy",
 ]
 
 
@@ -294,6 +308,34 @@ def animal_service(
     )
 
 
+@pytest.fixture(scope="function")
+def report_job_service(
+    DBSessionMaker: sessionmaker,
+    document_repository,
+    report_generator,
+    disk_storage,
+) -> Generator[ReportJobService, ReportJobService, None]:
+    # the jobs run in their own sessions: they don't see the data of the
+    # test session until it is committed
+    service = ReportJobService(
+        session_maker=lambda: DBSessionMaker,
+        read_session_maker=lambda: DBSessionMaker,
+        animal_service_factory=lambda session: AnimalService(
+            animal_repository=SQLAnimalRepository()(session),
+            document_repository=document_repository,
+            report_generator=report_generator,
+            storage=disk_storage,
+        ),
+        storage={StorageType.disk: disk_storage},
+        selected_storage=StorageType.disk,
+        max_workers=2,
+        max_pending=2,
+        timeout_seconds=3600,
+    )
+    yield service
+    service.shutdown()
+
+
 @pytest.fixture()
 def adopter_service(
     adopter_repository: SQLAdopterRepository,
@@ -436,13 +478,19 @@ def make_user(
 
 
 @pytest.fixture(scope="function")
-def app(db_session):
+def app(db_session, report_job_service):
     def get_db_session_override():
         yield db_session
 
     from hermadata.constants import Permission
-    from hermadata.dependancies import get_db_session
-    from hermadata.initializations import get_current_user
+    from hermadata.dependancies import (
+        get_db_session,
+        get_readonly_db_session,
+    )
+    from hermadata.initializations import (
+        get_current_user,
+        get_report_job_service,
+    )
     from hermadata.main import build_app
     from hermadata.services.user_service import TokenData
 
@@ -458,7 +506,11 @@ def app(db_session):
     app = build_app()
 
     app.dependency_overrides[get_db_session] = get_db_session_override
+    app.dependency_overrides[get_readonly_db_session] = get_db_session_override
     app.dependency_overrides[get_current_user] = get_current_user_override
+    app.dependency_overrides[get_report_job_service] = lambda: (
+        report_job_service
+    )
 
     test_app = TestClient(app)
 
@@ -470,6 +522,10 @@ def empty_db(db_session: Session):
     db_session.execute(delete(MedicalActivityRecord))
     db_session.execute(delete(MedicalActivity))
     db_session.execute(delete(Adoption))
+    db_session.execute(delete(DailyOccupancy))
+    db_session.execute(delete(DocumentTask))
+    # animal.current_entry_id references the entries
+    db_session.execute(update(Animal).values(current_entry_id=None))
     db_session.execute(delete(AnimalEntry))
     db_session.execute(delete(AnimalLog))
     db_session.execute(delete(AnimalDocument))
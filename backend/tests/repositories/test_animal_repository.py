@@ -5,14 +5,22 @@ import pytest
 from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
-from hermadata.constants import AnimalFur, EntryType, ExitType, RecurrenceType
+from hermadata.constants import (
+    AnimalFur,
+    EntryType,
+    ExitType,
+    RecurrenceType,
+    SearchTotalMode,
+)
 from hermadata.database.models import (
     Animal,
     AnimalEntry,
     Breed,
+    DailyOccupancy,
     FurColor,
     MedicalActivityRecord,
 )
+from hermadata.errors import InvalidCursorException
 from hermadata.models import UtilElement
 from hermadata.repositories.animal.animal_repository import (
     AnimalModel,
@@ -28,8 +36,12 @@ from hermadata.repositories.animal.models import (
     MedicalActivityModel,
     NewAnimalModel,
     NewEntryModel,
+    ReportGroupBy,
+    ReportGroupItem,
+    UpdateAnimalEntryModel,
     UpdateAnimalModel,
 )
+from hermadata.repositories.animal.occupancy import refresh_entry_occupancy
 from hermadata.repositories.breed_repository import (
     NewBreedModel,
     SQLBreedRepository,
@@ -175,6 +187,105 @@ def test_search(animal_repository: SQLAnimalRepository, make_animal):
     assert "A117" in [i.rescue_city_code for i in result.items]
 
 
+@pytest.mark.parametrize(
+    "sort_field,sort_order",
+    [(None, None), ("name", 1), ("entry_date", -1), ("entry_city", 1)],
+)
+def test_search_cursor(
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+    sort_field,
+    sort_order,
+):
+    now = datetime.now(tz=timezone.utc) - timedelta(seconds=10)
+    for city_code in ["A074", "A117", "A109", "A074", "A117"]:
+        make_animal(
+            NewAnimalModel(
+                entry_type="R",
+                rescue_city_code=city_code,
+                race_id="C",
+                structure_id=1,
+            )
+        )
+
+    filters = {
+        "race_id": "C",
+        "from_created_at": now,
+        "sort_field": sort_field,
+        "sort_order": sort_order,
+    }
+    expected = animal_repository.search(AnimalSearchModel(**filters))
+
+    ids = []
+    after = None
+    while True:
+        page = animal_repository.search(
+            AnimalSearchModel(from_index=0, to_index=2, after=after, **filters)
+        )
+        assert page.total == expected.total
+        ids.extend(i.id for i in page.items)
+        after = page.next_cursor
+        if after is None:
+            break
+
+    assert ids == [i.id for i in expected.items]
+
+
+def test_search_total(animal_repository: SQLAnimalRepository, make_animal):
+    now = datetime.now(tz=timezone.utc) - timedelta(seconds=10)
+    for _ in range(3):
+        make_animal()
+
+    query = {"from_created_at": now, "from_index": 0, "to_index": 2}
+
+    exact = animal_repository.search(AnimalSearchModel(**query))
+    assert exact.total == 3
+    assert len(exact.items) == 2
+
+    past_the_end = animal_repository.search(
+        AnimalSearchModel(**{**query, "from_index": 10, "to_index": 12})
+    )
+    assert past_the_end.total == 3
+    assert past_the_end.items == []
+
+    off = animal_repository.search(
+        AnimalSearchModel(with_total=SearchTotalMode.off, **query)
+    )
+    assert off.total is None
+    assert off.items == exact.items
+
+    estimated = AnimalSearchModel(
+        with_total=SearchTotalMode.estimated, **query
+    )
+    assert animal_repository.search(estimated).total == 3
+    make_animal()
+    # the cached total is reused
+    assert animal_repository.search(estimated).total == 3
+
+
+def test_search_invalid_cursor(animal_repository: SQLAnimalRepository):
+    with pytest.raises(InvalidCursorException):
+        animal_repository.search(AnimalSearchModel(after="not a cursor"))
+
+    cursor = AnimalSearchModel(sort_field="name", sort_order=1).make_cursor(
+        "A", 1
+    )
+    with pytest.raises(InvalidCursorException):
+        animal_repository.search(AnimalSearchModel(after=cursor))
+
+
+def test_search_chip_code(animal_repository: SQLAnimalRepository, make_animal):
+    animal_id = make_animal()
+    chip_code = random_chip_code()
+    animal_repository.update(animal_id, UpdateAnimalModel(chip_code=chip_code))
+    digits = chip_code.replace(".", "")
+
+    for value in [digits[-6:], digits[-4:], chip_code[-7:], chip_code[:7]]:
+        result = animal_repository.search(AnimalSearchModel(chip_code=value))
+
+        assert animal_id in [i.id for i in result.items]
+
+
 def test_update(db_session: Session, animal_repository: SQLAnimalRepository):
     new_entry_data = NewAnimalModel(
         entry_type="R",
@@ -269,6 +380,11 @@ def test_add_entry(
     assert len(entries) == 2
     assert entries[0].current is False
 
+    current_entry_id = db_session.execute(
+        select(Animal.current_entry_id).where(Animal.id == animal_id)
+    ).scalar_one()
+    assert current_entry_id == entries[1].id
+
 
 def test_count_days(
     db_session: Session,
@@ -418,6 +534,155 @@ def test_count_days_same_day(
     assert days
 
 
+def test_daily_occupancy(
+    empty_db,
+    db_session: Session,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+    complete_animal_data,
+):
+    animal_id = make_animal()
+    complete_animal_data(animal_id)
+    entry_id = animal_repository.complete_entry(
+        animal_id, CompleteEntryModel(entry_date=date(2021, 3, 1))
+    )
+
+    def occupancy_days():
+        return (
+            db_session.execute(
+                select(DailyOccupancy.day)
+                .where(DailyOccupancy.animal_entry_id == entry_id)
+                .order_by(DailyOccupancy.day)
+            )
+            .scalars()
+            .all()
+        )
+
+    # open entries are counted from animal_entry
+    assert occupancy_days() == []
+
+    animal_repository.exit(
+        animal_id,
+        AnimalExit(exit_date=date(2021, 3, 5), exit_type=ExitType.death),
+    )
+    assert occupancy_days() == [date(2021, 3, d) for d in range(2, 6)]
+
+    animal_repository.update_animal_entry(
+        entry_id, UpdateAnimalEntryModel(exit_date=date(2021, 3, 3))
+    )
+    assert occupancy_days() == [date(2021, 3, 2), date(2021, 3, 3)]
+
+    animal_repository.rebuild_daily_occupancy()
+    assert occupancy_days() == [date(2021, 3, 2), date(2021, 3, 3)]
+
+    result = animal_repository.count_animal_days(
+        AnimalDaysQuery(
+            from_date=date(2021, 3, 3),
+            to_date=date(2021, 3, 31),
+            city_code="H501",
+        )
+    )
+    assert result.total_days == 1
+
+
+def test_daily_occupancy_overlapping_entries(
+    empty_db,
+    db_session: Session,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+    complete_animal_data,
+):
+    animal_id = make_animal()
+    complete_animal_data(animal_id)
+    first_id = animal_repository.complete_entry(
+        animal_id, CompleteEntryModel(entry_date=date(2021, 3, 1))
+    )
+    animal_repository.exit(
+        animal_id,
+        AnimalExit(exit_date=date(2021, 3, 10), exit_type=ExitType.death),
+    )
+    animal_repository.add_entry(
+        animal_id,
+        NewEntryModel(rescue_city_code="H501", entry_type=EntryType.rescue),
+    )
+    second_id = animal_repository.complete_entry(
+        animal_id, CompleteEntryModel(entry_date=date(2021, 3, 15))
+    )
+    animal_repository.exit(
+        animal_id,
+        AnimalExit(exit_date=date(2021, 3, 20), exit_type=ExitType.death),
+    )
+
+    def occupancy_days():
+        return db_session.execute(
+            select(DailyOccupancy.day, DailyOccupancy.animal_entry_id)
+            .where(DailyOccupancy.animal_id == animal_id)
+            .order_by(DailyOccupancy.day)
+        ).all()
+
+    # the second entry now overlaps the first one from the 6th to the 10th
+    animal_repository.update_animal_entry(
+        second_id, UpdateAnimalEntryModel(entry_date=date(2021, 3, 5))
+    )
+    assert occupancy_days() == [
+        (date(2021, 3, d), first_id if d <= 10 else second_id)
+        for d in range(2, 21)
+    ]
+
+    # the days the first entry no longer has go back to the second one
+    animal_repository.update_animal_entry(
+        first_id, UpdateAnimalEntryModel(exit_date=date(2021, 3, 7))
+    )
+    expected = [
+        (date(2021, 3, d), first_id if d <= 7 else second_id)
+        for d in range(2, 21)
+    ]
+    assert occupancy_days() == expected
+
+    animal_repository.rebuild_daily_occupancy()
+    assert occupancy_days() == expected
+
+    result = animal_repository.count_animal_days(
+        AnimalDaysQuery(
+            from_date=date(2021, 3, 1),
+            to_date=date(2021, 3, 31),
+            city_code="H501",
+        )
+    )
+    assert result.total_days == 19
+
+
+def test_exit_refreshes_occupancy(
+    monkeypatch,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+    complete_animal_data,
+):
+    animal_id = make_animal()
+    complete_animal_data(animal_id)
+    entry_id = animal_repository.complete_entry(
+        animal_id, CompleteEntryModel(entry_date=date(2021, 3, 1))
+    )
+    refreshed = []
+
+    def refresh(session, animal_entry_id):
+        refreshed.append(animal_entry_id)
+        return refresh_entry_occupancy(session, animal_entry_id)
+
+    monkeypatch.setattr(
+        "hermadata.repositories.animal.animal_repository"
+        ".refresh_entry_occupancy",
+        refresh,
+    )
+
+    animal_repository.exit(
+        animal_id,
+        AnimalExit(exit_date=date(2021, 3, 5), exit_type=ExitType.death),
+    )
+
+    assert refreshed == [entry_id]
+
+
 def test_count_exits(
     empty_db,
     make_animal,
@@ -476,6 +741,58 @@ def test_count_exits(
     assert result.items[1].exit_date == date(2024, 3, 1)
 
 
+def test_group_by_month(
+    empty_db,
+    make_animal,
+    animal_repository: SQLAnimalRepository,
+    complete_animal_data,
+):
+    for entry_date, exit_date in (
+        (date(2024, 1, 1), date(2024, 1, 3)),
+        (date(2024, 1, 1), date(2024, 3, 1)),
+        (date(2024, 2, 20), None),
+    ):
+        animal_id = make_animal()
+        animal_repository.complete_entry(
+            animal_id, CompleteEntryModel(entry_date=entry_date)
+        )
+        complete_animal_data(animal_id)
+        if exit_date:
+            animal_repository.exit(
+                animal_id,
+                AnimalExit(exit_date=exit_date, exit_type=ExitType.death),
+            )
+    period = {
+        "from_date": date(2024, 1, 1),
+        "to_date": date(2024, 3, 31),
+        "city_code": "H501",
+        "group_by": ReportGroupBy.month,
+    }
+
+    exits = animal_repository.group_animal_exits(AnimalExitsQuery(**period))
+
+    assert exits == [
+        ReportGroupItem(group="2024-01", total=1),
+        ReportGroupItem(group="2024-03", total=1),
+    ]
+
+    days = animal_repository.group_animal_days(AnimalDaysQuery(**period))
+
+    # the open entry counts from 2024-02-21 to the end of the period
+    assert days == [
+        ReportGroupItem(group="2024-01", total=2 + 30),
+        ReportGroupItem(group="2024-02", total=29 + 9),
+        ReportGroupItem(group="2024-03", total=1 + 31),
+    ]
+    del period["group_by"]
+    assert (
+        sum(d.total for d in days)
+        == animal_repository.count_animal_days(
+            AnimalDaysQuery(**period)
+        ).total_days
+    )
+
+
 def test_add_medical_activity_and_records(
     make_animal, make_vet, animal_repository: SQLAnimalRepository
 ):
@@ -551,6 +868,38 @@ def test_get_variation_report_variables(
     assert variables.animal.fur_color == fur_color.label
 
 
+def test_get_variation_report_variables_batch(
+    empty_db, make_animal, animal_repository: SQLAnimalRepository
+):
+    animal_ids = [make_animal() for _ in range(3)]
+    for animal_id in animal_ids[:2]:
+        animal_repository.complete_entry(
+            animal_id,
+            data=CompleteEntryModel(entry_date=datetime.now().date()),
+        )
+        animal_repository.exit(
+            animal_id,
+            data=AnimalExit(
+                exit_date=datetime.now().date(),
+                exit_type=ExitType.disappeared,
+            ),
+        )
+
+    variables = animal_repository.get_variation_report_variables_batch(
+        animal_ids
+    )
+
+    # the third animal has not exited
+    assert set(variables) == set(animal_ids[:2])
+    single = animal_repository.get_variation_report_variables
+    for animal_id in animal_ids[:2]:
+        assert variables[animal_id] == single(animal_id)
+        assert variables[animal_id].variation_type == ExitType.disappeared
+    assert (
+        animal_repository.get_adoption_report_variables_batch(animal_ids) == {}
+    )
+
+
 @pytest.mark.skip(reason="Not implemented yet")
 def test_get_pending_therapies(
     empty_db, make_animal, animal_repository: SQLAnimalRepository
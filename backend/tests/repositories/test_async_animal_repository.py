@@ -0,0 +1,66 @@
+import asyncio
+
+from sqlalchemy.orm import Session
+
+from hermadata.dependancies import dispose_async_db, get_async_session_maker
+from hermadata.repositories.animal.animal_repository import (
+    AnimalSearchModel,
+    SQLAnimalRepository,
+)
+from hermadata.repositories.animal.async_animal_repository import (
+    SQLAsyncAnimalRepository,
+)
+from hermadata.repositories.animal.models import AnimalQueryModel
+
+
+def run(method_name: str, *args, **kwargs):
+    """
+    Call a `SQLAsyncAnimalRepository` method in a new event loop.
+    The async engine is disposed at the end, as its connections belong
+    to the loop.
+    """
+
+    async def main():
+        try:
+            async with get_async_session_maker()() as session:
+                repo = SQLAsyncAnimalRepository()(session)
+                return await getattr(repo, method_name)(*args, **kwargs)
+        finally:
+            await dispose_async_db()
+
+    return asyncio.run(main())
+
+
+def test_async_search(
+    db_session: Session,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+):
+    make_animal()
+    db_session.commit()
+
+    query = AnimalSearchModel(from_index=0, to_index=10)
+
+    result = run("search", query)
+
+    assert result == animal_repository.search(query)
+
+
+def test_async_get(
+    db_session: Session,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+):
+    animal_id = make_animal()
+    db_session.commit()
+
+    query = AnimalQueryModel(id=animal_id)
+
+    assert run("get", query) == animal_repository.get(query)
+    assert run("get_animal_entries", animal_id) == (
+        animal_repository.get_animal_entries(animal_id)
+    )
+
+
+def test_async_event_types():
+    assert run("get_event_types")
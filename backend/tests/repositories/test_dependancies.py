@@ -1,2 +1,80 @@
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from starlette.requests import Request
+
+from hermadata.database.models import FurColor
+from hermadata.dependancies import (
+    dispose_db,
+    get_engine,
+    get_readonly_db_session,
+    get_readonly_session_maker,
+    get_replica_db_session,
+    get_session_maker,
+    init_db,
+    reads_from_primary,
+)
+
+
 def test_get_document_repository():
     pass
+
+
+def test_session_maker_is_shared():
+    assert get_session_maker() is get_session_maker()
+    assert get_session_maker().kw["bind"] is get_engine()
+
+
+def test_engine_pool_settings(test_settings):
+    engine = get_engine()
+
+    assert engine.pool.size() == test_settings.db.pool_size
+    assert engine.pool._recycle == test_settings.db.pool_recycle
+    assert engine.pool._pre_ping is test_settings.db.pool_pre_ping
+
+
+def test_dispose_db():
+    engine = init_db()
+
+    dispose_db()
+
+    assert get_engine() is not engine
+
+
+def test_readonly_db_session():
+    session = next(get_readonly_db_session(get_readonly_session_maker()))
+
+    assert session.execute(select(FurColor.id)).all() is not None
+
+    with pytest.raises(DBAPIError):
+        session.execute(insert(FurColor).values(name="READ ONLY"))
+
+    session.close()
+
+
+def make_request(method: str = "GET", headers: dict = None) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": method,
+            "headers": [
+                (k.lower().encode(), v.encode())
+                for k, v in (headers or {}).items()
+            ],
+        }
+    )
+
+
+def test_reads_from_primary():
+    assert not reads_from_primary(make_request())
+    assert reads_from_primary(make_request("POST"))
+    assert reads_from_primary(make_request(headers={"X-Read-Primary": "1"}))
+    assert reads_from_primary(
+        make_request(headers={"Cookie": "hermadata_read_primary=1"})
+    )
+
+
+def test_replica_db_session_without_replica(db_session):
+    session = next(get_replica_db_session(make_request(), db_session))
+
+    assert session is db_session
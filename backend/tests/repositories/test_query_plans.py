@@ -0,0 +1,131 @@
+"""
+EXPLAIN the statements of the hottest repository methods and check that
+MySQL can serve them with the composite indexes on animal and
+animal_entry. `possible_keys` is checked rather than the chosen `key`:
+on the small test tables a full scan may well be the cheapest plan.
+"""
+
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from hermadata.repositories.animal.animal_repository import (
+    AnimalSearchModel,
+    SQLAnimalRepository,
+)
+from hermadata.repositories.animal.models import (
+    AnimalDaysQuery,
+    AnimalPresentQuery,
+    AnimalQueryModel,
+)
+
+
+@contextmanager
+def captured_selects(session: Session):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def possible_keys(session: Session, statements) -> dict[str, set[str]]:
+    """Candidate indexes of every table, over all the statements"""
+    keys: dict[str, set[str]] = {}
+    for statement, parameters in statements:
+        plan = (
+            session.connection()
+            .exec_driver_sql(f"EXPLAIN {statement}", parameters)
+            .mappings()
+            .all()
+        )
+        for row in plan:
+            keys.setdefault(row["table"], set()).update(
+                (row["possible_keys"] or "").split(",")
+            )
+    return keys
+
+
+@pytest.mark.parametrize(
+    "call,expected",
+    [
+        (
+            lambda repo, animal_id: repo.search(
+                AnimalSearchModel(from_index=0, to_index=10)
+            ),
+            {
+                "animal": "ix_animal_deleted_at_created_at",
+                "animal_entry": "PRIMARY",
+            },
+        ),
+        (
+            lambda repo, animal_id: repo.get(AnimalQueryModel(id=animal_id)),
+            {"animal_entry": "PRIMARY"},
+        ),
+        (
+            lambda repo, animal_id: repo.get_animal_entries(animal_id),
+            {"animal_entry": "ix_animal_entry_animal_id_current"},
+        ),
+        (
+            lambda repo, animal_id: repo.count_animal_days(
+                AnimalDaysQuery(
+                    from_date=date(2024, 1, 1),
+                    to_date=date(2024, 12, 31),
+                    city_code="H501",
+                )
+            ),
+            {
+                "animal_entry": "ix_animal_entry_origin_city_code_entry_date",
+                "daily_occupancy": "PRIMARY",
+            },
+        ),
+        (
+            lambda repo, animal_id: repo.get_present(
+                AnimalPresentQuery(from_date=date(2024, 6, 1))
+            ),
+            {
+                "animal_entry": "ix_animal_entry_entry_date",
+                "daily_occupancy": "ix_daily_occupancy_day",
+            },
+        ),
+        (
+            lambda repo, animal_id: repo.get_present(
+                AnimalPresentQuery(
+                    from_date=date(2024, 6, 1),
+                    to_date=date(2024, 6, 30),
+                    city_code="H501",
+                )
+            ),
+            {
+                "animal_entry": "ix_animal_entry_origin_city_code_entry_date",
+                "daily_occupancy": "PRIMARY",
+            },
+        ),
+    ],
+)
+def test_hot_queries_use_indexes(
+    db_session: Session,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+    call,
+    expected: dict[str, str],
+):
+    animal_id = make_animal()
+
+    with captured_selects(db_session) as statements:
+        call(animal_repository, animal_id)
+
+    keys = possible_keys(db_session, statements)
+
+    for table, index in expected.items():
+        assert index in keys.get(table, set()), (table, keys)
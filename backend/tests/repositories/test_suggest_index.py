@@ -0,0 +1,67 @@
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
+from hermadata.repositories.animal.models import (
+    AnimalSuggestItem,
+    UpdateAnimalModel,
+)
+from hermadata.repositories.animal.suggest_index import (
+    AnimalSuggestIndex,
+    animal_suggest_index,
+)
+
+
+def test_suggest():
+    index = AnimalSuggestIndex(max_age=60)
+    index.load(
+        [
+            AnimalSuggestItem(1, "C0001", "Fido", "H501"),
+            AnimalSuggestItem(2, "C0002", "Fuffy", "A074"),
+            AnimalSuggestItem(3, "G0003", None, "H501"),
+        ]
+    )
+
+    assert [s.id for s in index.suggest("f")] == [1, 2]
+    assert [s.id for s in index.suggest("FU")] == [2]
+    assert [s.id for s in index.suggest("c0")] == [1, 2]
+    assert [s.id for s in index.suggest("f", limit=1)] == [1]
+    assert [s.id for s in index.suggest("", limit=1)] == []
+    assert [s.id for s in index.suggest("f", allowed_city_codes=["A074"])] == [
+        2
+    ]
+
+    index.update(
+        [
+            AnimalSuggestItem(1, "C0001", "Rex", "H501"),
+            AnimalSuggestItem(2, "C0002", "Fuffy", "A074", deleted=True),
+        ]
+    )
+
+    assert index.suggest("f") == []
+    assert [s.name for s in index.suggest("r")] == ["Rex"]
+
+
+def test_suggest_index_updated_on_commit(
+    db_session: Session,
+    animal_repository: SQLAnimalRepository,
+    make_animal,
+):
+    animal_suggest_index.load(animal_repository.get_suggest_items())
+
+    animal_id = make_animal()
+    name = f"SUGGEST {uuid4().hex}"
+    animal_repository.update(animal_id, UpdateAnimalModel(name=name))
+
+    # staged until the transaction commits
+    assert animal_suggest_index.suggest(name) == []
+
+    db_session.commit()
+
+    assert [s.id for s in animal_suggest_index.suggest(name)] == [animal_id]
+
+    animal_repository.soft_delete_animal(animal_id)
+    db_session.commit()
+
+    assert animal_suggest_index.suggest(name) == []
@@ -14,6 +14,7 @@ from hermadata.database.models import (
     AnimalEntry,
     DocumentKind,
 )
+from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
 from hermadata.repositories.animal.models import (
     AnimalExit,
     CompleteEntryModel,
@@ -541,6 +542,35 @@ def test_new_animal_document(
     assert document_kind.code == DocKindCode.documento_identita.value
 
 
+def test_get_present_animals(
+    app: TestClient,
+    empty_db,
+    make_animal,
+    animal_repository: SQLAnimalRepository,
+):
+    animal_id = make_animal()
+    animal_repository.complete_entry(
+        animal_id, CompleteEntryModel(entry_date=date(2024, 3, 1))
+    )
+
+    result = app.get("/animal/present", params={"from_date": "2024-03-10"})
+
+    assert result.status_code == 200
+    assert [a["id"] for a in result.json()] == [animal_id]
+
+    result = app.get(
+        "/animal/present",
+        params={
+            "from_date": "2024-01-01",
+            "to_date": "2024-02-28",
+            "city_code": "H501",
+        },
+    )
+
+    assert result.status_code == 200
+    assert result.json() == []
+
+
 def test_get_animal_days_report(
     app: TestClient,
     empty_db,
@@ -558,6 +588,102 @@ def test_get_animal_days_report(
     assert result.status_code == 200
 
 
+def test_get_animal_occupancy_report(app: TestClient, empty_db):
+    result = app.get(
+        "/animal/occupancy/report",
+        params={
+            "from_date": "2024-01-01",
+            "to_date": "2024-12-31",
+            "city_code": "H501",
+        },
+    )
+
+    assert result.status_code == 200
+    assert result.headers["X-filename"].startswith("presenze_")
+
+
+@pytest.mark.parametrize(
+    "format,media_type", [("csv", "text/csv"), ("xls", "application/vnd")]
+)
+def test_get_animal_exits_report_format(
+    app: TestClient, empty_db, format: str, media_type: str
+):
+    result = app.get(
+        "/animal/exits/report",
+        params={
+            "from_date": "2024-01-01",
+            "to_date": "2024-12-31",
+            "city_code": "H501",
+            "format": format,
+        },
+    )
+
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith(media_type)
+    assert result.headers["X-filename"].endswith(
+        ".csv" if format == "csv" else ".xlsx"
+    )
+
+
+@pytest.mark.parametrize("report", ["days", "entries", "exits"])
+def test_get_animal_report_group_by(app: TestClient, empty_db, report: str):
+    result = app.get(
+        f"/animal/{report}/report",
+        params={
+            "from_date": "2024-01-01",
+            "to_date": "2024-12-31",
+            "group_by": "month",
+            "format": "json",
+        },
+    )
+
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("application/json")
+    assert result.json() == []
+
+
+def test_get_animal_report_pdf_format(app: TestClient):
+    result = app.get(
+        "/animal/exits/report",
+        params={
+            "from_date": "2024-01-01",
+            "to_date": "2024-12-31",
+            "city_code": "H501",
+            "format": "application/pdf",
+        },
+    )
+
+    assert result.status_code == 422
+
+
+def test_animal_report_job(app: TestClient, report_job_service):
+    params = {
+        "from_date": "2024-01-01",
+        "to_date": "2024-12-31",
+        "city_code": "H501",
+        "format": "csv",
+    }
+    result = app.post("/animal/exits/report/jobs", params=params)
+
+    assert result.status_code == 202
+    job = result.json()
+    assert job["kind"] == "exits"
+    assert job["format"] == "csv"
+
+    report_job_service.wait(job["id"], timeout=30)
+
+    result = app.get(f"/animal/report-jobs/{job['id']}")
+    assert result.status_code == 200
+    assert result.json()["status"] == "D"
+
+    result = app.get(f"/animal/report-jobs/{job['id']}/download")
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("text/csv")
+    assert result.headers["X-filename"].endswith(".csv")
+
+    assert app.get("/animal/report-jobs/0").status_code == 404
+
+
 def test_get_animal_entries_report(app: TestClient, empty_db):
     result = app.get(
         "/animal/entries/report",
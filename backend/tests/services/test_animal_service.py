@@ -177,8 +177,9 @@ def test_days_report(
     filename, report = animal_service.days_report(query)
 
     assert filename is not None
-    assert report is not None
-    assert isinstance(report, bytes)
+    # xlsx files are zip archives
+    with report:
+        assert report.read(2) == b"PK"
 
 
 def test_entries_report(
@@ -198,8 +199,9 @@ def test_entries_report(
     filename, report = animal_service.entries_report(query)
 
     assert filename is not None
-    assert report is not None
-    assert isinstance(report, bytes)
+    # xlsx files are zip archives
+    with report:
+        assert report.read(2) == b"PK"
 
 
 def test_exits_report(
@@ -219,8 +221,9 @@ def test_exits_report(
     filename, report = animal_service.exits_report(query)
 
     assert filename is not None
-    assert report is not None
-    assert isinstance(report, bytes)
+    # xlsx files are zip archives
+    with report:
+        assert report.read(2) == b"PK"
 
 
 def test_temporary_adoption_exit_generates_document(
@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+from hermadata.constants import (
+    DocKindCode,
+    DocumentTaskKind,
+    DocumentTaskStatus,
+    ExitType,
+)
+from hermadata.database.models import (
+    AnimalDocument,
+    DocumentKind,
+    DocumentTask,
+)
+from hermadata.repositories.animal.animal_repository import SQLAnimalRepository
+from hermadata.repositories.animal.models import AnimalExit, CompleteEntryModel
+from hermadata.repositories.document_repository import SQLDocumentRepository
+from hermadata.services.animal_service import AnimalService
+from hermadata.services.document_outbox import (
+    SESSION_INFO_KEY,
+    DocumentOutbox,
+)
+
+
+@pytest.fixture
+def exited_animal(
+    make_animal, make_adopter, complete_animal_data, animal_service
+):
+    """Exit an animal with deferred documents, return its id"""
+    animal_id = make_animal()
+    animal_service.complete_entry(
+        animal_id,
+        data=CompleteEntryModel(
+            entry_date=datetime.now().date() - timedelta(days=10)
+        ),
+    )
+    complete_animal_data(animal_id)
+
+    animal_service.deferred_documents = True
+    animal_service.exit(
+        animal_id,
+        data=AnimalExit(
+            exit_date=datetime.now().date(),
+            exit_type=ExitType.adoption,
+            adopter_id=make_adopter(),
+            location_address="Via test",
+            location_city_code="H501",
+        ),
+    )
+
+    return animal_id
+
+
+def document_codes(session: Session, animal_id: int) -> list[str]:
+    return (
+        session.execute(
+            select(DocumentKind.code)
+            .join(AnimalDocument)
+            .where(AnimalDocument.animal_id == animal_id)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def make_outbox(
+    db_session: Session, animal_service: AnimalService, **kwargs
+) -> DocumentOutbox:
+    # tasks run in savepoints of the test transaction, in this thread
+    session_maker = sessionmaker(
+        bind=db_session.connection(), join_transaction_mode="create_savepoint"
+    )
+
+    document_repository = animal_service.document_repository
+
+    def animal_service_factory(session: Session) -> AnimalService:
+        return AnimalService(
+            animal_repository=SQLAnimalRepository()(session),
+            document_repository=SQLDocumentRepository(
+                session,
+                selected_storage=document_repository.selected_storage,
+                storage=document_repository.storage,
+            ),
+            report_generator=animal_service.report_generator,
+            storage=animal_service.storage,
+        )
+
+    return DocumentOutbox(
+        session_maker=lambda: session_maker,
+        animal_service_factory=kwargs.pop(
+            "animal_service_factory", animal_service_factory
+        ),
+        storage=document_repository.storage,
+        selected_storage=document_repository.selected_storage,
+        max_workers=1,
+        max_attempts=kwargs.pop("max_attempts", 3),
+        retry_seconds=60,
+        poll_seconds=60,
+    )
+
+
+def test_deferred_exit(db_session: Session, exited_animal: int):
+    assert document_codes(db_session, exited_animal) == []
+
+    tasks = db_session.execute(
+        select(
+            DocumentTask.kind, DocumentTask.status, DocumentTask.variables
+        ).where(DocumentTask.animal_id == exited_animal)
+    ).all()
+    assert sorted((kind, status) for kind, status, _ in tasks) == [
+        (DocumentTaskKind.adoption_report.value, "P"),
+        (DocumentTaskKind.variation_report.value, "P"),
+    ]
+    for _, _, variables in tasks:
+        assert variables["animal"]["chip_code"]
+    # run when the request session commits
+    assert len(db_session.info[SESSION_INFO_KEY]) == 2
+
+
+def test_run_document_tasks(
+    db_session: Session, exited_animal: int, animal_service: AnimalService
+):
+    outbox = make_outbox(db_session, animal_service)
+
+    assert outbox.run_due() == 2
+    assert sorted(document_codes(db_session, exited_animal)) == sorted(
+        [DocKindCode.adozione.value, DocKindCode.variazione.value]
+    )
+    tasks = (
+        db_session.execute(
+            select(DocumentTask).where(DocumentTask.animal_id == exited_animal)
+        )
+        .scalars()
+        .all()
+    )
+    for task in tasks:
+        db_session.refresh(task)
+        assert task.status == DocumentTaskStatus.done.value
+        assert task.attempts == 1
+        # done tasks are not run again
+        assert outbox.run(task.id) is False
+
+
+def test_retry_document_task(
+    db_session: Session, exited_animal: int, animal_service: AnimalService
+):
+    def failing_factory(session):
+        raise RuntimeError("render failed")
+
+    outbox = make_outbox(
+        db_session,
+        animal_service,
+        animal_service_factory=failing_factory,
+        max_attempts=2,
+    )
+    task = db_session.execute(
+        select(DocumentTask).where(
+            DocumentTask.animal_id == exited_animal,
+            DocumentTask.kind == DocumentTaskKind.variation_report.value,
+        )
+    ).scalar_one()
+
+    assert outbox.run(task.id) is False
+    db_session.refresh(task)
+    assert task.status == DocumentTaskStatus.pending.value
+    assert task.attempts == 1
+    assert task.last_error == "render failed"
+    # waiting for the retry
+    assert outbox.run(task.id) is False
+
+    db_session.execute(
+        DocumentTask.__table__.update()
+        .where(DocumentTask.id == task.id)
+        .values(next_attempt_at=datetime.now() - timedelta(days=1))
+    )
+    assert outbox.run(task.id) is False
+    db_session.refresh(task)
+    assert task.status == DocumentTaskStatus.failed.value
+    assert task.attempts == 2
+
+
+def test_document_task_variables(
+    db_session: Session,
+    exited_animal: int,
+    animal_service: AnimalService,
+    monkeypatch,
+):
+    def fail(*args, **kwargs):
+        raise AssertionError("variables read when the task runs")
+
+    # the documents are rendered from the variables of the exit
+    for method in (
+        "get_adoption_report_variables",
+        "get_variation_report_variables",
+    ):
+        monkeypatch.setattr(SQLAnimalRepository, method, fail)
+    outbox = make_outbox(db_session, animal_service)
+
+    assert outbox.run_due() == 2
+
+
+def test_failed_document_task_file_deleted(
+    db_session: Session,
+    exited_animal: int,
+    animal_service: AnimalService,
+    disk_storage,
+    monkeypatch,
+):
+    def fail(*args, **kwargs):
+        raise RuntimeError("cannot attach the document")
+
+    # the file is stored, then attaching it to the animal fails
+    monkeypatch.setattr(SQLAnimalRepository, "new_document", fail)
+    outbox = make_outbox(db_session, animal_service)
+    files = set(disk_storage.list_files())
+
+    assert outbox.run_due() == 0
+    assert set(disk_storage.list_files()) == files
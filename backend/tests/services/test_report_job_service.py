@@ -0,0 +1,117 @@
+from datetime import date
+from threading import Event
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from hermadata.constants import ReportJobStatus
+from hermadata.reports.report_generator import ReportFormat
+from hermadata.repositories.animal.models import (
+    AnimalDaysQuery,
+    AnimalExitsQuery,
+)
+from hermadata.services.report_job_service import (
+    ReportJobNotDone,
+    ReportJobNotFound,
+    ReportJobQueueFull,
+    ReportJobService,
+    ReportKind,
+)
+
+
+def exits_query(city_code: str = "H501") -> AnimalExitsQuery:
+    return AnimalExitsQuery(
+        from_date=date(2024, 1, 1),
+        to_date=date(2024, 12, 31),
+        city_code=city_code,
+    )
+
+
+def test_report_job(report_job_service: ReportJobService):
+    job = report_job_service.submit(
+        ReportKind.exits, exits_query(), ReportFormat.csv, user_id=1
+    )
+    assert job.status in (ReportJobStatus.pending, ReportJobStatus.running)
+
+    # identical requests share the job while it's not done
+    same = report_job_service.submit(
+        ReportKind.exits, exits_query(), ReportFormat.csv
+    )
+    other = report_job_service.submit(
+        ReportKind.exits, exits_query(), ReportFormat.excel
+    )
+    assert same.id == job.id
+    assert other.id != job.id
+
+    report_job_service.wait(job.id, timeout=30)
+
+    job = report_job_service.get(job.id)
+    assert job.status == ReportJobStatus.done
+    assert job.filename.endswith(".csv")
+
+    filename, media_type, content = report_job_service.get_result(job.id)
+    assert filename == job.filename
+    assert media_type == "text/csv"
+    with content:
+        assert content.read().startswith("Tipo".encode())
+
+    # once done, the same request generates the report again
+    again = report_job_service.submit(
+        ReportKind.exits, exits_query(), ReportFormat.csv
+    )
+    assert again.id != job.id
+
+
+@pytest.fixture
+def blocked_report_job_service(report_job_service: ReportJobService):
+    """Jobs don't run until the event is set"""
+    release = Event()
+    factory = report_job_service.animal_service_factory
+
+    def blocked_factory(session):
+        release.wait(30)
+        return factory(session)
+
+    report_job_service.animal_service_factory = blocked_factory
+    yield report_job_service, release
+    release.set()
+
+
+def test_report_job_bounded(blocked_report_job_service):
+    report_job_service, release = blocked_report_job_service
+    query = AnimalDaysQuery(
+        from_date=date(2024, 1, 1), to_date=date(2024, 12, 31)
+    )
+    jobs = [
+        report_job_service.submit(ReportKind.days, query, format)
+        for format in (ReportFormat.csv, ReportFormat.excel)
+    ]
+    with pytest.raises(ReportJobNotDone):
+        report_job_service.get_result(jobs[0].id)
+    with pytest.raises(ReportJobQueueFull):
+        report_job_service.submit(
+            ReportKind.exits, exits_query(), ReportFormat.csv
+        )
+
+    release.set()
+    for job in jobs:
+        report_job_service.wait(job.id, timeout=30)
+        assert report_job_service.get(job.id).status == ReportJobStatus.done
+
+
+def test_report_job_not_found(report_job_service: ReportJobService):
+    with pytest.raises(ReportJobNotFound):
+        report_job_service.get(0)
+    with pytest.raises(ReportJobNotFound):
+        report_job_service.get_result(0)
+
+
+def test_report_job_integrity_error(report_job_service: ReportJobService):
+    # not a conflict with an active job: raised, not retried
+    with pytest.raises(IntegrityError):
+        report_job_service.submit(
+            ReportKind.exits,
+            exits_query("H502"),
+            ReportFormat.csv,
+            user_id=10**9,
+        )
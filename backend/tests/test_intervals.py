@@ -0,0 +1,54 @@
+import random
+from datetime import date, timedelta
+
+from hermadata.reports.intervals import summarize
+from tests.utils import count_days_loop, random_entries
+
+
+def test_summarize():
+    summary = summarize(
+        [1, 1, 2],
+        [date(2020, 1, 1), date(2020, 1, 15), date(2020, 1, 10)],
+        [date(2020, 1, 10), date(2020, 2, 10), None],
+        date(2020, 1, 1),
+        date(2020, 2, 29),
+    )
+
+    assert summary.animal_ids.tolist() == [1, 2]
+    assert summary.animal_days.tolist() == [9 + 26, 50]
+    assert summary.total_days == 85
+
+    assert len(summary.days) == 60
+    assert summary.occupancy[0] == 0
+    # 2020-01-10: exit day of the first entry, animal 2 is not counted yet
+    assert summary.occupancy[9] == 1
+    assert summary.occupancy[10] == 1
+    assert summary.occupancy[15] == 2
+
+    assert summary.months.tolist() == [date(2020, 1, 1), date(2020, 2, 1)]
+    assert summary.month_days.tolist() == [9 + 16 + 21, 10 + 29]
+
+
+def test_summarize_empty():
+    summary = summarize([], [], [], date(2020, 1, 1), date(2020, 1, 31))
+
+    assert summary.total_days == 0
+    assert summary.occupancy.sum() == 0
+
+
+def test_summarize_matches_loop():
+    random.seed(1)
+    data = random_entries(2000, 300, date(2020, 1, 1), date(2024, 12, 31))
+    from_date = date(2021, 3, 1)
+    to_date = from_date + timedelta(days=500)
+
+    summary = summarize(*data, from_date, to_date)
+
+    assert dict(
+        zip(
+            summary.animal_ids.tolist(),
+            summary.animal_days.tolist(),
+            strict=True,
+        )
+    ) == count_days_loop(*data, from_date, to_date)
+    assert summary.month_days.sum() == summary.total_days
@@ -1,9 +1,17 @@
+import json
+import os
+import threading
+import time
 from datetime import date, datetime, timedelta
 from io import BytesIO
 
+import pytest
+from jinja2 import DictLoader, Environment, TemplateSyntaxError
 from openpyxl import load_workbook
 
 from hermadata.constants import EntryType, ExitType
+from hermadata.reports.pdf_cache import PDFCache
+from hermadata.reports.render_pool import RenderCache, RenderPool
 from hermadata.reports.report_generator import (
     AdopterVariables,
     AnimalVariables,
@@ -21,8 +29,11 @@ from hermadata.repositories.animal.models import (
     AnimalEntriesItem,
     AnimalEntriesQuery,
     AnimalReportResult,
+    ReportGroupBy,
+    ReportGroupItem,
 )
 from hermadata.settings import Settings
+from hermadata.storage.disk_storage import DiskStorage
 
 
 def test_animal_entry_report(
@@ -44,6 +55,125 @@ def test_animal_entry_report(
     assert pdf
 
 
+def test_animal_entry_report_render_pool(jinja_env):
+    render_pool = RenderPool(workers=1, timeout=60)
+    report_generator = ReportGenerator(jinja_env, render_pool=render_pool)
+    variables = ReportAnimalEntryVariables(
+        city="Test",
+        animal_name="Gino",
+        animal_type="Gatto",
+        entry_date=date(2020, 2, 1),
+    )
+    try:
+        pdf = report_generator.build_animal_entry_report(variables)
+    finally:
+        render_pool.shutdown()
+
+    assert pdf.startswith(b"%PDF")
+    # parsed when the worker started, reused for the render
+    stats = report_generator.render_cache_stats()
+    assert stats["stylesheets"] == (1, 1)
+    assert stats["font_config"] == (0, 1)
+
+
+def test_render_cache_stats():
+    render_cache = RenderCache()
+    for _ in range(3):
+        render_cache.get_stylesheets()
+        render_cache.get_font_config()
+
+    # a font configuration per thread
+    thread = threading.Thread(target=render_cache.get_font_config)
+    thread.start()
+    thread.join()
+
+    stats = render_cache.stats()
+    assert stats["stylesheets"] == (2, 1)
+    assert stats["font_config"] == (2, 2)
+
+
+def test_load_templates(report_generator: ReportGenerator):
+    assert report_generator.load_templates() == len(
+        report_generator.jinja_env.list_templates()
+    )
+
+    broken = ReportGenerator(
+        Environment(loader=DictLoader({"broken.jinja": "{% if x %}"}))
+    )
+    with pytest.raises(TemplateSyntaxError):
+        broken.load_templates()
+
+
+def test_pdf_cache(jinja_env, tmp_path):
+    storage = DiskStorage(str(tmp_path))
+    report_generator = ReportGenerator(
+        jinja_env, pdf_cache=PDFCache(storage, max_bytes=10**6)
+    )
+    variables = [
+        ReportAnimalEntryVariables(
+            city="Test",
+            animal_name=name,
+            animal_type="Gatto",
+            entry_date=date(2020, 2, 1),
+        )
+        for name in ("Gino", "Pino")
+    ]
+
+    first = report_generator.build_animal_entry_report(variables[0])
+    again = report_generator.build_animal_entry_report(
+        variables[0].model_copy()
+    )
+    other = report_generator.build_animal_entry_report(variables[1])
+
+    assert again == first
+    assert other != first
+    stats = report_generator.render_cache_stats()
+    assert stats["pdf"] == (1, 2)
+    assert stats["stylesheets"].misses + stats["stylesheets"].hits == 2
+    assert len(storage.list_files()) == 2
+
+    # only the most recently used PDF fits
+    report_generator.pdf_cache.max_bytes = len(other)
+    report_generator.build_animal_entry_report(variables[1])
+
+    assert report_generator.pdf_cache.size == len(other)
+    assert len(storage.list_files()) == 1
+
+
+def test_pdf_cache_storage_listing(tmp_path, monkeypatch):
+    storage = DiskStorage(str(tmp_path))
+    storage.store_file("other.pdf", b"not cached")
+    # stored by another process, or before a restart
+    PDFCache(storage, max_bytes=100).put("pdf-cache-old.pdf", b"o" * 10)
+    PDFCache(storage, max_bytes=100).put("pdf-cache-new.pdf", b"n" * 10)
+    day_ago = time.time() - 86400 - 60
+    os.utime(tmp_path / "pdf-cache-old.pdf", (day_ago, day_ago))
+
+    pdf_cache = PDFCache(storage, max_bytes=15, max_age_seconds=86400)
+    pdf_cache.sync()
+
+    # expired
+    assert sorted(storage.list_files()) == [
+        "other.pdf",
+        "pdf-cache-new.pdf",
+    ]
+    assert pdf_cache.size == 10
+    assert pdf_cache.get("pdf-cache-new.pdf") == b"n" * 10
+
+    def retrieve_file(key):
+        raise AssertionError(f"{key} retrieved")
+
+    # misses don't read the storage
+    monkeypatch.setattr(storage, "retrieve_file", retrieve_file)
+    assert pdf_cache.get("pdf-cache-missing.pdf") is None
+    assert pdf_cache.stats() == (1, 1)
+
+    # the file of the other process is evicted to make room
+    pdf_cache.put("pdf-cache-put.pdf", b"p" * 10)
+    assert sorted(storage.list_files()) == ["other.pdf", "pdf-cache-put.pdf"]
+    assert pdf_cache.size == 10
+
+
 def test_chip_assignment_report(
     report_generator: ReportGenerator, test_settings
 ):
@@ -138,6 +268,73 @@ def test_animal_entries_report(empty_db, report_generator: ReportGenerator):
     assert rows[1][4].value == "M"
 
 
+def test_animal_days_report_formats(report_generator: ReportGenerator):
+    query = AnimalDaysQuery(
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 2, 1),
+        city_code="H501",
+    )
+    items = [
+        AnimalDaysItem(
+            animal_name="Test", animal_chip_code=None, animal_days=5
+        )
+    ]
+
+    filename, fp = report_generator.write_animal_days_count_report(
+        query, items, ReportFormat.csv
+    )
+    with fp:
+        report = fp.read().decode()
+
+    assert filename.endswith(".csv")
+    # the total is only in excel reports
+    assert report.splitlines() == ["Nome,Chip,Giorni", "Test,,5"]
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    filename, fp = report_generator.write_animal_days_count_report(
+        query, items, ReportFormat.parquet
+    )
+    with fp:
+        table = pq.read_table(fp)
+
+    assert filename.endswith(".parquet")
+    assert table.to_pylist() == [{"Nome": "Test", "Chip": None, "Giorni": 5}]
+
+
+def test_grouped_report(report_generator: ReportGenerator):
+    query = AnimalEntriesQuery(
+        from_date=date(2024, 1, 1),
+        to_date=date(2024, 12, 31),
+        group_by=ReportGroupBy.month,
+    )
+    items = [
+        ReportGroupItem(group="2024-01", total=3),
+        ReportGroupItem(group="2024-02", total=4),
+    ]
+
+    filename, fp = report_generator.write_grouped_report(
+        "ingressi", "Ingressi", query, items, ReportFormat.json
+    )
+    with fp:
+        report = json.load(fp)
+
+    assert filename == "ingressi_month_2024-01-01_2024-12-31.json"
+    assert report == [
+        {"Mese": "2024-01", "Ingressi": 3},
+        {"Mese": "2024-02", "Ingressi": 4},
+    ]
+
+    filename, fp = report_generator.write_grouped_report(
+        "ingressi", "Ingressi", query, items, ReportFormat.excel
+    )
+    with fp:
+        rows = list(load_workbook(fp).active.values)
+
+    assert filename.endswith(".xlsx")
+    assert rows[0] == ("Mese", "Ingressi")
+    assert rows[-1] == ("Totale", 7)
+
+
 def test_variation_report(report_generator: ReportGenerator):
     variables = ReportVariationVariables(
         animal=AnimalVariables(
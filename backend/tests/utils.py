@@ -1,5 +1,42 @@
+import random
+from datetime import date, timedelta
 from random import randint
 
 
 def random_chip_code():
     return ".".join([str(randint(0, 999)).zfill(3) for _ in range(5)])
+
+
+def count_days_loop(
+    animal_ids: list[int],
+    entry_dates: list[date],
+    exit_dates: list[date | None],
+    from_date: date,
+    to_date: date,
+) -> dict[int, int]:
+    """Per-animal days, one entry at a time, as the days report did"""
+    result: dict[int, int] = {}
+    for animal_id, entry_date, exit_date in zip(
+        animal_ids, entry_dates, exit_dates, strict=True
+    ):
+        result.setdefault(animal_id, 0)
+        entry = max(entry_date + timedelta(days=1), from_date)
+        exit = (exit_date and min(exit_date, to_date) or to_date) + timedelta(
+            days=1
+        )
+        result[animal_id] += max((exit - entry).days, 0)
+    return result
+
+
+def random_entries(entries: int, animals: int, from_date: date, to_date: date):
+    period_days = (to_date - from_date).days
+    animal_ids, entry_dates, exit_dates = [], [], []
+    for _ in range(entries):
+        entry_date = from_date + timedelta(random.randint(0, period_days))
+        exit_date = None
+        if random.random() < 0.9:
+            exit_date = entry_date + timedelta(random.randint(0, 400))
+        animal_ids.append(random.randint(1, animals))
+        entry_dates.append(entry_date)
+        exit_dates.append(exit_date)
+    return animal_ids, entry_dates, exit_dates